@@ -6,7 +6,9 @@ Point d'entrée avec structure MVC
 import os
 import sys
 import logging
+from datetime import datetime
 from flask import Flask
+from werkzeug.middleware.proxy_fix import ProxyFix
 from dotenv import load_dotenv
 
 # charger .env tôt
@@ -19,7 +21,12 @@ from controller.routes import register_routes, register_filters
 from model.services import InterestService
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
-from security_middleware import apply_security_headers
+from security_middleware import apply_security_headers, init_request_monitoring
+from model.activity_tracker import init_activity_tracking
+from model.query_stats import init_query_stats
+from model.metrics import init_metrics
+from session_store import init_session_store
+from security_blocking import init_auto_block
 
 # Scheduler pour le nettoyage automatique
 scheduler = BackgroundScheduler()
@@ -58,7 +65,14 @@ def create_app(config_object=None):
         app.config['DB_NAME'] = os.getenv('DB_NAME', 'meet_db')
 
         app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-        app.config['UPLOAD_FOLDER'] = 'static/uploads'
+        app.config['UPLOAD_FOLDER'] = os.getenv('UPLOAD_FOLDER', 'static/uploads')
+        
+        # Stockage des photos (voir config.py pour les options S3)
+        app.config['STORAGE_BACKEND'] = os.getenv('STORAGE_BACKEND', 'local')
+        for key in ('UPLOAD_BASE_URL', 'S3_BUCKET', 'S3_ENDPOINT_URL', 'S3_REGION', 'S3_ACCESS_KEY_ID',
+                    'S3_SECRET_ACCESS_KEY', 'S3_PREFIX', 'S3_PUBLIC_BASE_URL', 'S3_URL_EXPIRES'):
+            if os.getenv(key):
+                app.config[key] = os.getenv(key)
         app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
         
         # Configuration production
@@ -81,12 +95,37 @@ def create_app(config_object=None):
                 app.logger.setLevel(logging.INFO)
                 app.logger.info('Meet startup')
     
+    # Adresse du client derrière le reverse proxy : seuls les TRUSTED_PROXIES derniers
+    # éléments de X-Forwarded-For sont pris en compte (0 ou non défini : en-tête ignoré,
+    # non défini : pas de blocage automatique par IP, voir init_auto_block)
+    trusted_proxies = int(app.config.get('TRUSTED_PROXIES', os.getenv('TRUSTED_PROXIES')) or 0)
+    if trusted_proxies:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=trusted_proxies)
+    
+    # Métriques Prometheus (latence mesurée dès le début de la requête)
+    init_metrics(app)
+    
+    # Refus des clients bloqués, avant tout autre traitement (y compris le rate limiting)
+    init_auto_block(app)
+    
+    # Analyse des corps de requête suspects, avant la lecture des formulaires
+    init_request_monitoring(app)
+    
     # Initialiser les extensions
     init_extensions(app)
     
+    # Sessions côté serveur (voir SESSION_BACKEND)
+    init_session_store(app)
+    
     # Appliquer les middlewares de sécurité
     apply_security_headers(app)
     
+    # Nombre et durée des requêtes SQL de chaque requête HTTP
+    init_query_stats(app)
+    
+    # Dernière activité des utilisateurs connectés (écrite par lots)
+    init_activity_tracking(app)
+    
     # Enregistrer les routes et filtres
     register_routes(app)
     register_filters(app)
@@ -106,10 +145,10 @@ def create_app(config_object=None):
     def scheduled_cleanup():
         with app.app_context():
             try:
-                from model.services import cleanup_expired_messages, cleanup_expired_notifications
+                from model.services import MessageService, NotificationService
                 
-                messages_deleted = cleanup_expired_messages()
-                notifications_deleted = cleanup_expired_notifications()
+                messages_deleted = MessageService.cleanup_expired_messages()
+                notifications_deleted = NotificationService.cleanup_expired_notifications()
                 
                 if messages_deleted > 0 or notifications_deleted > 0:
                     logger.info(f"Nettoyage automatique: {messages_deleted} messages et {notifications_deleted} notifications supprimés")
@@ -117,17 +156,154 @@ def create_app(config_object=None):
             except Exception as e:
                 logger.error(f"Erreur lors du nettoyage automatique: {e}")
     
-    # Démarrer le scheduler de nettoyage automatique
+    # Réconciliation périodique des compteurs d'administration
+    def scheduled_stats_reconcile():
+        with app.app_context():
+            try:
+                from model.stats_service import StatsService
+                StatsService.reconcile()
+            except Exception as e:
+                logger.error(f"Erreur lors de la réconciliation des compteurs: {e}")
+    
+    # Agrégation journalière de l'activité pour l'analytique
+    def scheduled_activity_rollup():
+        with app.app_context():
+            try:
+                from model.stats_service import ActivityRollupService
+                ActivityRollupService.rollup()
+            except Exception as e:
+                logger.error(f"Erreur lors de l'agrégation de l'activité: {e}")
+    
+    # Rafraîchissement des compteurs par utilisateur (classements)
+    def scheduled_user_stats_refresh():
+        with app.app_context():
+            try:
+                from model.stats_service import UserStatsService
+                UserStatsService.refresh()
+            except Exception as e:
+                logger.error(f"Erreur lors du rafraîchissement des compteurs utilisateurs: {e}")
+    
+    # Tâches d'administration interrompues par l'arrêt d'un worker
+    def scheduled_stale_jobs_sweep():
+        with app.app_context():
+            try:
+                from model.admin_service import AdminService
+                AdminService.fail_stale_jobs(app.config.get('ADMIN_JOB_STALE_MINUTES', 10))
+            except Exception as e:
+                logger.error(f"Erreur lors de la détection des tâches interrompues: {e}")
+    
+    # Suppression des photos qui ne sont plus référencées
+    def scheduled_photo_gc():
+        with app.app_context():
+            try:
+                from model.photo_service import PhotoService
+                PhotoService.collect_garbage(grace_hours=app.config.get('PHOTO_GC_GRACE_HOURS', 24))
+            except Exception as e:
+                logger.error(f"Erreur lors du nettoyage des photos: {e}")
+    
+    # Reprise des traitements de photos perdus (worker arrêté, pool inutilisable)
+    def scheduled_photo_recovery():
+        try:
+            from model.image_pipeline import ImagePipeline
+            ImagePipeline.recover_stalled(app, timeout_minutes=app.config.get('PHOTO_PROCESSING_TIMEOUT_MINUTES', 15))
+        except Exception as e:
+            logger.error(f"Erreur lors de la reprise des traitements photo: {e}")
+    
+    # Écriture groupée des dates de dernière activité
+    def scheduled_last_active_flush():
+        with app.app_context():
+            try:
+                from model.activity_tracker import ActivityTracker
+                ActivityTracker.flush()
+            except Exception as e:
+                logger.error(f"Erreur lors de l'écriture des dates d'activité: {e}")
+    
+    # Suppression des sessions expirées
+    def scheduled_session_cleanup():
+        try:
+            from session_store import cleanup_sessions
+            removed = cleanup_sessions(app)
+            if removed:
+                logger.info(f"Nettoyage des sessions: {removed} sessions expirées supprimées")
+        except Exception as e:
+            logger.error(f"Erreur lors du nettoyage des sessions: {e}")
+    
+    # Démarrer le scheduler de nettoyage automatique. Les tâches sur la base et les fichiers
+    # partagés ne tournent que dans un seul processus (SCHEDULER_ENABLED, voir gunicorn.conf.py) ;
+    # le vidage du tampon d'activité, propre à chaque processus, tourne partout
+    shared_jobs = app.config.get('SCHEDULER_ENABLED', os.getenv('SCHEDULER_ENABLED', '1') != '0')
     if not scheduler.running:
         scheduler.add_job(
-            func=scheduled_cleanup,
-            trigger=IntervalTrigger(hours=1),  # Toutes les heures
-            id='cleanup_job',
-            name='Nettoyage automatique des messages et notifications',
+            func=scheduled_last_active_flush,
+            trigger=IntervalTrigger(seconds=app.config.get('LAST_ACTIVE_FLUSH_SECONDS', 15)),
+            id='last_active_flush_job',
+            name='Écriture des dates de dernière activité',
             replace_existing=True
         )
+        if shared_jobs:
+            scheduler.add_job(
+                func=scheduled_cleanup,
+                trigger=IntervalTrigger(hours=1),  # Toutes les heures
+                id='cleanup_job',
+                name='Nettoyage automatique des messages et notifications',
+                replace_existing=True
+            )
+            scheduler.add_job(
+                func=scheduled_stats_reconcile,
+                trigger=IntervalTrigger(minutes=app.config.get('STATS_RECONCILE_MINUTES', 15)),
+                id='stats_reconcile_job',
+                name='Réconciliation des compteurs du tableau de bord',
+                replace_existing=True
+            )
+            scheduler.add_job(
+                func=scheduled_activity_rollup,
+                trigger=IntervalTrigger(minutes=app.config.get('ACTIVITY_ROLLUP_MINUTES', 30)),
+                # Premier passage dès le démarrage (rattrapage après un arrêt), hors requête HTTP
+                next_run_time=datetime.now(),
+                id='activity_rollup_job',
+                name="Agrégation journalière de l'activité",
+                replace_existing=True
+            )
+            scheduler.add_job(
+                func=scheduled_user_stats_refresh,
+                trigger=IntervalTrigger(minutes=app.config.get('USER_STATS_REFRESH_MINUTES', 60)),
+                id='user_stats_refresh_job',
+                name='Rafraîchissement des compteurs par utilisateur',
+                replace_existing=True
+            )
+            scheduler.add_job(
+                func=scheduled_stale_jobs_sweep,
+                trigger=IntervalTrigger(minutes=5),
+                id='stale_jobs_sweep_job',
+                name="Détection des tâches d'administration interrompues",
+                replace_existing=True
+            )
+            scheduler.add_job(
+                func=scheduled_photo_gc,
+                trigger=IntervalTrigger(hours=app.config.get('PHOTO_GC_HOURS', 6)),
+                id='photo_gc_job',
+                name='Nettoyage des photos non référencées',
+                replace_existing=True
+            )
+            scheduler.add_job(
+                func=scheduled_photo_recovery,
+                trigger=IntervalTrigger(minutes=5),
+                id='photo_recovery_job',
+                name='Reprise des traitements de photos perdus',
+                replace_existing=True
+            )
+            scheduler.add_job(
+                func=scheduled_session_cleanup,
+                trigger=IntervalTrigger(hours=1),
+                id='session_cleanup_job',
+                name='Suppression des sessions expirées',
+                replace_existing=True
+            )
         scheduler.start()
-        logger.info("Scheduler de nettoyage automatique démarré")
+        if shared_jobs:
+            logger.info("Scheduler de nettoyage automatique démarré")
+        else:
+            logger.info("Scheduler démarré sans les tâches partagées (SCHEDULER_ENABLED=0)")
     
     logger.info("Application Meet créée avec succès")
     return app
@@ -0,0 +1,9 @@
+"""
+Bancs d'essai de l'application Meet
+Chaque module s'exécute avec `python -m benchmarks.<module>` :
+
+- dataset : jeu de données synthétique reproductible (SQLite ou MySQL)
+- scenarios : scénarios des services sur ce jeu de données, résultats JSON comparables entre commits
+- password_hashing : latence du hachage des mots de passe
+- security_validation : détection de contenu interdit
+"""
@@ -0,0 +1,111 @@
+"""
+Banc d'essai du hachage des mots de passe
+Mesure la latence des connexions (p50/p95/p99) et les rejets pour surcharge
+selon la méthode de hachage, la taille du pool et la profondeur de file
+
+Exemple :
+    python -m benchmarks.password_hashing --methods scrypt:16384:8:1,scrypt:32768:8:1 \\
+        --workers 0,2,4 --clients 32 --logins 400
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from werkzeug.security import generate_password_hash
+
+from model import password_service
+from model.password_service import PasswordService, PasswordServiceBusy
+
+PASSWORD = 'Passw0rd!benchmark'
+
+
+def percentile(values, pct):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def run(app, method, workers, max_pending, clients, logins):
+    """Simule `logins` connexions réparties sur `clients` threads"""
+    app.config.update(PASSWORD_HASH_METHOD=method, PASSWORD_HASH_WORKERS=workers,
+                      PASSWORD_HASH_MAX_PENDING=max_pending)
+    password_service.shutdown()
+    user = SimpleNamespace(id=0, password_hash=generate_password_hash(PASSWORD, method=method))
+
+    latencies = []
+    rejected = 0
+    lock = threading.Lock()
+    remaining = iter(range(logins))
+
+    def client():
+        nonlocal rejected
+        with app.app_context():
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        return
+                start = time.perf_counter()
+                try:
+                    PasswordService.verify(user, PASSWORD)
+                    elapsed = time.perf_counter() - start
+                    with lock:
+                        latencies.append(elapsed)
+                except PasswordServiceBusy:
+                    with lock:
+                        rejected += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - started
+    password_service.shutdown()
+
+    return {
+        'method': method,
+        'workers': workers,
+        'ok': len(latencies),
+        'rejected': rejected,
+        'throughput': len(latencies) / duration,
+        'p50': percentile(latencies, 50) * 1000,
+        'p95': percentile(latencies, 95) * 1000,
+        'p99': percentile(latencies, 99) * 1000,
+        'mean': (statistics.mean(latencies) * 1000) if latencies else float('nan'),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--methods', default='scrypt:16384:8:1,scrypt:32768:8:1,pbkdf2:sha256:600000',
+                        help='méthodes Werkzeug séparées par des virgules')
+    parser.add_argument('--workers', default='0,2',
+                        help='tailles de pool séparées par des virgules (0 = hachage dans le thread de la requête)')
+    parser.add_argument('--max-pending', type=int, default=16, help='profondeur maximale de la file')
+    parser.add_argument('--clients', type=int, default=16, help='connexions simultanées')
+    parser.add_argument('--logins', type=int, default=200, help='nombre total de connexions')
+    args = parser.parse_args(argv)
+
+    app = Flask(__name__)
+    print(f"{'méthode':<24} {'pool':>4} {'ok':>6} {'rejets':>6} {'conn/s':>8} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for method in args.methods.split(','):
+        for workers in (int(w) for w in args.workers.split(',')):
+            result = run(app, method, workers, args.max_pending, args.clients, args.logins)
+            print(f"{result['method']:<24} {result['workers']:>4} {result['ok']:>6} {result['rejected']:>6} "
+                  f"{result['throughput']:>8.1f} {result['p50']:>8.1f} {result['p95']:>8.1f} {result['p99']:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
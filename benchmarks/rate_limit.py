@@ -0,0 +1,90 @@
+"""
+Banc d'essai du stockage SQLite du rate limiting
+Mesure le débit et la latence (p50/p95/p99) des vérifications en fenêtre
+glissante avec plusieurs processus, ainsi que le dépassement de limite, avec
+et sans écriture groupée (flush_interval = 0 : une transaction par requête)
+
+Exemple :
+    python -m benchmarks.rate_limit --processes 1,4,8 --flush-intervals 0,0.5 --hits 2000 --limit 1000
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rate_limit_storage import SQLiteStorage
+
+
+def percentile(values, pct):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def worker(path, flush_interval, keys, hits, limit, start):
+    """Un worker : `hits` vérifications réparties sur `keys` clés, à partir de l'instant `start`"""
+    storage = SQLiteStorage(f'sqlite:///{path}', flush_interval=flush_interval)
+    latencies = []
+    accepted = 0
+    while time.time() < start:
+        time.sleep(0.001)
+    for i in range(hits):
+        began = time.perf_counter()
+        if storage.acquire_entry(f'bench/{i % keys}', limit, 3600):
+            accepted += 1
+        latencies.append(time.perf_counter() - began)
+    storage.flush()
+    return latencies, accepted
+
+
+def run(processes, flush_interval, keys, hits, limit):
+    with tempfile.TemporaryDirectory(prefix='meet-ratelimit-') as directory:
+        path = os.path.join(directory, 'ratelimit.sqlite3')
+        SQLiteStorage(f'sqlite:///{path}')
+        start = time.time() + 0.5
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.starmap(worker, [(path, flush_interval, keys, hits, limit, start)] * processes)
+        duration = time.time() - start
+
+    latencies = [latency for result, _ in results for latency in result]
+    accepted = sum(count for _, count in results)
+    allowed = keys * min(limit, processes * hits // keys)
+    return {
+        'processes': processes,
+        'flush_interval': flush_interval,
+        'throughput': len(latencies) / duration,
+        'p50': percentile(latencies, 50) * 1000,
+        'p95': percentile(latencies, 95) * 1000,
+        'p99': percentile(latencies, 99) * 1000,
+        'overshoot': accepted - allowed,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', default='1,4', help='nombres de workers séparés par des virgules')
+    parser.add_argument('--flush-intervals', default='0,0.5',
+                        help='intervalles d\'écriture groupée séparés par des virgules (0 = exact)')
+    parser.add_argument('--keys', type=int, default=10, help='clés distinctes (clients)')
+    parser.add_argument('--hits', type=int, default=2000, help='vérifications par worker')
+    parser.add_argument('--limit', type=int, default=1000, help='limite par clé et par heure')
+    args = parser.parse_args(argv)
+
+    print(f"{'workers':>7} {'flush s':>7} {'vérif/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'dépassement':>11}")
+    for processes in (int(p) for p in args.processes.split(',')):
+        for flush_interval in (float(f) for f in args.flush_intervals.split(',')):
+            result = run(processes, flush_interval, args.keys, args.hits, args.limit)
+            print(f"{result['processes']:>7} {result['flush_interval']:>7} {result['throughput']:>9.0f} "
+                  f"{result['p50']:>8.3f} {result['p95']:>8.3f} {result['p99']:>8.3f} {result['overshoot']:>11}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,267 @@
+"""
+Scénarios de performance des services sur le jeu de données synthétique
+Mesure la latence (p50/p95) et le nombre de requêtes SQL de chaque scénario ;
+les résultats sont écrits en JSON pour être comparés d'un commit à l'autre.
+Les services s'exécutent avec l'heure figée à la date d'ancrage du jeu de
+données : les mesures ne dépendent pas du jour où elles sont prises
+
+Exemple :
+    python -m benchmarks.scenarios --users 2000 --output avant.json
+    git checkout ma-branche
+    python -m benchmarks.scenarios --users 2000 --output apres.json --compare avant.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlalchemy
+from sqlalchemy import func
+from sqlalchemy.engine import make_url
+
+from benchmarks.dataset import DEFAULT_ANCHOR, create_benchmark_app, frozen_clock, load, parse_anchor
+from model.database import db
+from model.models import User, Like
+from model.query_stats import collect_queries
+from model.services import UserService, LikeService, MessageService, MatchService
+from model.admin_service import AdminService
+from model.export_service import ExportService
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, pct):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def sample_users(rng, count):
+    """Utilisateurs actifs tirés au hasard, plus les plus likés (les cas les plus coûteux)"""
+    active = [row.id for row in db.session.query(User.id).filter(User.is_active == True).order_by(User.id)]
+    popular = [row.liked_id for row in db.session.query(Like.liked_id)
+               .group_by(Like.liked_id).order_by(func.count(Like.id).desc(), Like.liked_id).limit(max(1, count // 4))]
+    chosen = popular + rng.sample(active, min(len(active), count - len(popular)))
+    return chosen[:count]
+
+
+def unliked_pairs(rng, count):
+    """Paires compatibles (liker, liké) sans like existant, pour create_like"""
+    users = db.session.query(User.id, User.gender, User.interested_in).filter(User.is_active == True).all()
+    by_gender = {}
+    for user in users:
+        by_gender.setdefault(user.gender, []).append(user.id)
+    pairs = []
+    seen = set()
+    while len(pairs) < count:
+        liker = rng.choice(users)
+        candidates = by_gender.get(liker.interested_in)
+        if not candidates:
+            continue
+        liked_id = rng.choice(candidates)
+        key = (liker.id, liked_id)
+        if liked_id == liker.id or key in seen or \
+                Like.query.filter_by(liker_id=liker.id, liked_id=liked_id).first() is not None:
+            continue
+        seen.add(key)
+        pairs.append(key)
+    return pairs
+
+
+def _export_ndjson():
+    return sum(len(block) for block in ExportService.stream(format='ndjson'))
+
+
+# Nom -> (préparation des arguments, appel mesuré). Les scénarios qui modifient la base sont en dernier.
+SCENARIOS = {
+    'get_suggested_users': (
+        lambda rng, n: [(db.session.get(User, user_id),) for user_id in sample_users(rng, n)],
+        lambda user: UserService.get_suggested_users(user),
+    ),
+    'get_user_conversations': (
+        lambda rng, n: [(user_id,) for user_id in sample_users(rng, n)],
+        MessageService.get_user_conversations,
+    ),
+    'get_user_matches': (
+        lambda rng, n: [(user_id,) for user_id in sample_users(rng, n)],
+        MatchService.get_user_matches,
+    ),
+    'get_received_likes': (
+        lambda rng, n: [(user_id,) for user_id in sample_users(rng, n)],
+        MatchService.get_received_likes,
+    ),
+    'admin_dashboard_stats': (lambda rng, n: [()] * n, AdminService.get_dashboard_stats),
+    'admin_activity_stats': (lambda rng, n: [()] * n, AdminService.get_activity_stats),
+    'admin_top_users': (lambda rng, n: [()] * n, AdminService.get_top_users),
+    'admin_export_ndjson': (lambda rng, n: [()] * max(1, n // 10), _export_ndjson),
+    'create_like': (lambda rng, n: unliked_pairs(rng, n), LikeService.create_like),
+}
+
+
+def run_scenario(name, rng, repeat):
+    prepare, call = SCENARIOS[name]
+    arguments = prepare(rng, repeat)
+    db.session.remove()
+
+    # Un appel de chauffe, non mesuré (caches du SGBD, compilation des requêtes)
+    if name != 'create_like':
+        call(*_reload(arguments[0]))
+        db.session.remove()
+
+    durations = []
+    queries = []
+    for args in arguments:
+        args = _reload(args)
+        with collect_queries() as stats:
+            started = time.perf_counter()
+            call(*args)
+            durations.append(time.perf_counter() - started)
+        queries.append(stats.count)
+        # Chaque appel part d'une session vide, comme une nouvelle requête HTTP
+        db.session.remove()
+
+    return {
+        'calls': len(durations),
+        'mean_ms': round(statistics.mean(durations) * 1000, 3),
+        'p50_ms': round(percentile(durations, 50) * 1000, 3),
+        'p95_ms': round(percentile(durations, 95) * 1000, 3),
+        'min_ms': round(min(durations) * 1000, 3),
+        'max_ms': round(max(durations) * 1000, 3),
+        'queries_mean': round(statistics.mean(queries), 1),
+        'queries_max': max(queries),
+    }
+
+
+def _reload(args):
+    """Recharge les utilisateurs passés en argument dans la session courante"""
+    return tuple(db.session.get(User, arg.id) if isinstance(arg, User) else arg for arg in args)
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def compare(baseline, results, threshold):
+    """Affiche l'évolution de chaque scénario ; retourne les scénarios en régression"""
+    regressions = []
+    print(f"{'scénario':<24} {'p50 avant':>10} {'p50 après':>10} {'ratio':>7} {'SQL avant':>10} {'SQL après':>10}")
+    for name, after in results['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if before is None:
+            print(f"{name:<24} {'-':>10} {after['p50_ms']:>10.2f} {'-':>7} {'-':>10} {after['queries_mean']:>10}")
+            continue
+        ratio = after['p50_ms'] / before['p50_ms'] if before['p50_ms'] else float('inf')
+        flag = '  <-- régression' if ratio > threshold or after['queries_mean'] > before['queries_mean'] else ''
+        if flag:
+            regressions.append(name)
+        print(f"{name:<24} {before['p50_ms']:>10.2f} {after['p50_ms']:>10.2f} {ratio:>6.2f}x "
+              f"{before['queries_mean']:>10} {after['queries_mean']:>10}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', help="URI SQLAlchemy (par défaut : base SQLite temporaire)")
+    parser.add_argument('--users', type=int, default=1000, help="nombre d'utilisateurs générés")
+    parser.add_argument('--seed', type=int, default=42, help='graine du jeu de données et des tirages')
+    parser.add_argument('--repeat', type=int, default=20, help='appels mesurés par scénario')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='scénarios séparés par des virgules')
+    parser.add_argument('--anchor-date', type=parse_anchor, default=DEFAULT_ANCHOR,
+                        help="instant de référence du jeu de données, identique à celui de la génération "
+                             f"avec --skip-generate (défaut : {DEFAULT_ANCHOR.isoformat()})")
+    parser.add_argument('--reset', action='store_true', help='vide une base existante avant de la remplir')
+    parser.add_argument('--skip-generate', action='store_true', help='réutilise le jeu de données déjà en base')
+    parser.add_argument('--output', help='fichier JSON des résultats (sinon sortie standard)')
+    parser.add_argument('--compare', help='résultats JSON de référence')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='ratio de p50 au-delà duquel un scénario est signalé en régression')
+    parser.add_argument('--fail-on-regression', action='store_true', help='code de sortie 1 en cas de régression')
+    args = parser.parse_args(argv)
+
+    names = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"scénarios inconnus: {', '.join(unknown)}")
+    # Ordre fixe : les scénarios qui écrivent passent après ceux qui lisent
+    names = [name for name in SCENARIOS if name in names]
+
+    temporary = None
+    database = args.database
+    if database is None:
+        temporary = tempfile.TemporaryDirectory(prefix='meet-bench-')
+        database = 'sqlite:///' + os.path.join(temporary.name, 'benchmark.sqlite3')
+
+    app = create_benchmark_app(database)
+    try:
+        dataset = None
+        if not args.skip_generate:
+            dataset = load(app, users=args.users, seed=args.seed, reset=args.reset, now=args.anchor_date)
+
+        rng = random.Random(args.seed + 1)
+        scenarios = {}
+        with app.app_context(), frozen_clock(args.anchor_date):
+            for name in names:
+                scenarios[name] = run_scenario(name, rng, args.repeat)
+                print(f"{name:<24} p50 {scenarios[name]['p50_ms']:>9.2f} ms  "
+                      f"p95 {scenarios[name]['p95_ms']:>9.2f} ms  SQL {scenarios[name]['queries_mean']:>7}",
+                      file=sys.stderr)
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        if temporary is not None:
+            temporary.cleanup()
+
+    commit, dirty = git_revision()
+    results = {
+        'meta': {
+            'commit': commit,
+            'dirty': dirty,
+            'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlalchemy': sqlalchemy.__version__,
+            'database': make_url(database).get_backend_name(),
+            'users': args.users,
+            'seed': args.seed,
+            'anchor_date': args.anchor_date.isoformat(),
+            'repeat': args.repeat,
+            'dataset': dataset,
+        },
+        'scenarios': scenarios,
+    }
+
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, results, args.threshold)
+        if regressions and args.fail_on_regression:
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Micro-benchmarks du validateur de sécurité
+Compare la détection de contenu interdit en une passe à l'ancienne boucle
+de re.search, sur des entrées réalistes et des entrées construites pour
+provoquer des retours arrière
+
+Exemple :
+    python -m benchmarks.security_validation --repeat 5 --sizes 1000,10000
+"""
+
+import argparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from security_validation import SecurityValidator
+
+REALISTIC = {
+    'nom': "Marie-Hélène",
+    'ville': "Saint-Étienne",
+    'bio': (
+        "Passionnée de randonnée et de photographie, je cherche quelqu'un avec qui "
+        "partager des week-ends à la montagne, des concerts et des soirées jeux. "
+        "J'aime cuisiner (surtout les desserts !) et je ne dis jamais non à un bon film."
+    ),
+    'message': (
+        "Bonjour ! Merci pour ton message, on se retrouve samedi vers 15h au café "
+        "de la gare ? Sinon dimanche matin, comme tu préfères :)"
+    ),
+    'injection': "Bonjour' UNION SELECT password FROM user -- <script>alert(1)</script>",
+}
+
+
+def adversarial(size):
+    """Entrées où les motifs en ".*?" et "\\w+" reviennent en arrière à chaque occurrence"""
+    return {
+        'select répété': ('select ' * size)[:size],
+        'union répété': ('union ' * size)[:size],
+        'update répété': ('update ' * size)[:size],
+        '<script répété': ('<script ' * size)[:size],
+        '${ répété': ('${ ' * size)[:size],
+        'mot en "on"': ('on' * size)[:size],
+        'espaces après drop': ('drop' + ' ' * size)[:size],
+    }
+
+
+def legacy_contains_forbidden_content(input_string):
+    """Implémentation précédente : un re.search par motif, motifs non compilés"""
+    input_lower = input_string.lower()
+    return [f"Pattern détecté: {pattern}" for pattern in SecurityValidator.FORBIDDEN_PATTERNS
+            if re.search(pattern, input_lower, re.IGNORECASE)]
+
+
+def measure(func, text, repeat):
+    """Meilleur temps par appel, en microsecondes"""
+    timer = timeit.Timer(lambda: func(text))
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help='nombre de mesures (la meilleure est retenue)')
+    parser.add_argument('--sizes', default='1000,10000', help='tailles des entrées adversariales')
+    args = parser.parse_args(argv)
+
+    cases = [(name, text) for name, text in REALISTIC.items()]
+    for size in (int(s) for s in args.sizes.split(',')):
+        cases += [(f"{name} ({size})", text) for name, text in adversarial(size).items()]
+
+    print(f"{'entrée':<28} {'ancien µs':>12} {'une passe µs':>13} {'gain':>8}")
+    for name, text in cases:
+        expected = legacy_contains_forbidden_content(text)
+        if SecurityValidator.contains_forbidden_content(text) != expected:
+            raise SystemExit(f"Résultat différent de l'implémentation précédente pour {name!r}")
+        before = measure(legacy_contains_forbidden_content, text, args.repeat)
+        after = measure(SecurityValidator.contains_forbidden_content, text, args.repeat)
+        print(f"{name:<28} {before:>12.1f} {after:>13.1f} {before / after:>7.1f}x")
+
+    print()
+    print(f"{'validation complète':<28} {'µs':>12}")
+    for label, func, text in (
+        ('validate_name', SecurityValidator.validate_name, REALISTIC['nom']),
+        ('validate_city', SecurityValidator.validate_city, REALISTIC['ville']),
+        ('validate_bio', SecurityValidator.validate_bio, REALISTIC['bio']),
+        ('validate_message', SecurityValidator.validate_message, REALISTIC['message']),
+    ):
+        print(f"{label:<28} {measure(func, text, args.repeat):>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -39,11 +39,49 @@ class ProductionConfig:
     }
     
     # Upload et fichiers
-    UPLOAD_FOLDER = 'static/uploads'
+    UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', 'static/uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
     
+    # Stockage des photos : 'local' (UPLOAD_FOLDER) ou 's3' (UPLOAD_FOLDER sert de dossier de travail)
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'local')
+    UPLOAD_BASE_URL = os.environ.get('UPLOAD_BASE_URL')
+    S3_BUCKET = os.environ.get('S3_BUCKET')
+    S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL')  # ex. http://localhost:9000 pour MinIO
+    S3_REGION = os.environ.get('S3_REGION')
+    S3_ACCESS_KEY_ID = os.environ.get('S3_ACCESS_KEY_ID')
+    S3_SECRET_ACCESS_KEY = os.environ.get('S3_SECRET_ACCESS_KEY')
+    S3_PREFIX = os.environ.get('S3_PREFIX', 'uploads')
+    S3_PUBLIC_BASE_URL = os.environ.get('S3_PUBLIC_BASE_URL')  # CDN devant le bucket (sinon URL signées)
+    S3_URL_EXPIRES = int(os.environ.get('S3_URL_EXPIRES', 7 * 24 * 3600))
+    
+    # Hachage des mots de passe (les anciens hachages sont mis à jour à la connexion)
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+    PASSWORD_HASH_WORKERS = 2
+    PASSWORD_HASH_MAX_PENDING = 16
+    PASSWORD_HASH_TIMEOUT = 10
+    
+    # Rate limiting en fenêtre glissante, compteurs partagés entre workers
+    # (sqlite:// pour un seul hôte, chemin relatif au dossier instance ; redis:// ou valkey:// pour plusieurs)
+    RATELIMIT_STORAGE_URI = os.environ.get('RATELIMIT_STORAGE_URI', 'sqlite://ratelimit.sqlite3')
+    RATELIMIT_STRATEGY = 'moving-window'
+    
+    # Blocage automatique des clients abusifs (seuils sur une fenêtre glissante)
+    AUTO_BLOCK_ENABLED = True
+    AUTO_BLOCK_THRESHOLD = 10
+    AUTO_BLOCK_IP_THRESHOLD = 30
+    AUTO_BLOCK_WINDOW_MINUTES = 5
+    AUTO_BLOCK_SECONDS = 900
+    # Nombre de reverse proxies (nginx) devant l'application : l'adresse du client
+    # est lue dans X-Forwarded-For uniquement pour ces sauts (limites et blocages par IP)
+    TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', 1))
+    
     # Session Flask
     PERMANENT_SESSION_LIFETIME = timedelta(hours=24)
+    # Stockage des sessions : cookie, filesystem, sqlite ou redis
+    SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'filesystem')
+    SESSION_FILE_DIR = os.environ.get('SESSION_FILE_DIR', 'instance/sessions')
+    SESSION_SQLITE_PATH = os.environ.get('SESSION_SQLITE_PATH', 'instance/sessions.sqlite3')
+    SESSION_REDIS_URL = os.environ.get('SESSION_REDIS_URL', 'redis://localhost:6379/0')
     
     # Messages temporaires
     MESSAGE_EXPIRY_HOURS = 24
@@ -51,6 +89,26 @@ class ProductionConfig:
     
     # Performance
     PROFILES_PER_PAGE = 12
+    # Requêtes HTTP journalisées au-delà de ces seuils (en-têtes X-DB-* en debug)
+    SLOW_QUERY_MS = 100
+    QUERY_COUNT_WARNING = 30
+    # Jeton du collecteur Prometheus pour /metrics (sinon réservé aux administrateurs connectés)
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    # Tâches planifiées partagées (nettoyages, agrégations) : un seul processus par déploiement
+    SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', '1') != '0'
+    STATS_RECONCILE_MINUTES = 15
+    ACTIVITY_ROLLUP_MINUTES = 30
+    USER_STATS_REFRESH_MINUTES = 60
+    ADMIN_JOB_STALE_MINUTES = 10
+    IMAGE_PROCESSING_ASYNC = True
+    IMAGE_WORKERS = 2
+    MAX_PHOTO_BYTES = 10 * 1024 * 1024
+    PHOTO_GC_HOURS = 6
+    PHOTO_GC_GRACE_HOURS = 24
+    PHOTO_PROCESSING_TIMEOUT_MINUTES = 15
+    USER_CACHE_TTL_SECONDS = 30
+    LAST_ACTIVE_FLUSH_SECONDS = 15
+    LAST_ACTIVE_INTERVAL_SECONDS = 60
     
     # Logging
     LOG_LEVEL = 'INFO'
@@ -91,7 +149,8 @@ class DevelopmentConfig:
     
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
-    UPLOAD_FOLDER = 'static/uploads'
+    UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', 'static/uploads')
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'local')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024
     
     DEBUG = True
@@ -3,13 +3,17 @@ Routes principales pour l'application Meet
 Toutes les routes de l'application
 """
 
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, current_app
+from flask import (
+    Flask, render_template, request, redirect, url_for, flash, jsonify, session, current_app,
+    Response, stream_with_context
+)
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timezone
 from email_validator import validate_email, EmailNotValidError
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
+import hmac
 import re
 import logging
 
@@ -21,8 +25,11 @@ from model.services import (
     NotificationService, InterestService
 )
 from model.admin_service import AdminService
-from flask_session import Session
-from rate_limit_config import configure_rate_limiter
+from model.export_service import ExportService
+from model.image_pipeline import photo_url, photo_renditions, photo_sources
+from model.photo_service import PhotoService
+from model.password_service import PasswordServiceBusy
+from model.metrics import metrics_response
 from security_validation import validator
 from security_logging import security_logger
 
@@ -109,9 +116,8 @@ def calculate_password_strength(password):
 def register_routes(app):
     """Enregistre toutes les routes de l'application"""
     
-    # Configurer le rate limiter
-    from rate_limit_config import limiter
-    limiter_instance = configure_rate_limiter(app)
+    # Rate limiter partagé, configuré avec les extensions
+    from model.extensions import limiter as limiter_instance
     
     @app.route('/')
     def index():
@@ -216,20 +222,23 @@ def register_routes(app):
                         request.files['profile_photo'], user.id, 'profile'
                     )
                     if profile_photo:
-                        user.profile_photo = profile_photo
+                        PhotoService.assign(user, 'profile', profile_photo)
                 
                 if 'second_photo' in request.files:
                     second_photo = UserService.save_photo(
                         request.files['second_photo'], user.id, 'second'
                     )
                     if second_photo:
-                        user.second_photo = second_photo
+                        PhotoService.assign(user, 'second', second_photo)
                 
                 db.session.commit()
                 
                 flash('Compte créé avec succès ! Vous pouvez maintenant vous connecter.', 'success')
                 return redirect(url_for('login'))
                 
+            except PasswordServiceBusy:
+                flash('Le service est très sollicité, veuillez réessayer dans quelques secondes', 'error')
+                return render_template('register.html'), 503, {'Retry-After': '5'}
             except Exception as e:
                 logger.error(f"Erreur lors de l'inscription: {e}")
                 flash('Une erreur est survenue lors de l\'inscription', 'error')
@@ -259,6 +268,7 @@ def register_routes(app):
                         email=email
                     )
                     
+                    UserService.save_login(user)
                     login_user(user)
                     user.update_last_active()
                     
@@ -282,6 +292,9 @@ def register_routes(app):
                     
                     flash('Email ou mot de passe incorrect', 'error')
                     
+            except PasswordServiceBusy:
+                flash('Trop de connexions en cours, veuillez réessayer dans quelques secondes', 'error')
+                return render_template('login.html'), 503, {'Retry-After': '5'}
             except Exception as e:
                 logger.error(f"Erreur lors de la connexion: {e}")
                 flash('Une erreur est survenue lors de la connexion', 'error')
@@ -402,12 +415,9 @@ def register_routes(app):
             filename = UserService.save_photo(photo, current_user.id, 'profile' if photo_type != 'second' else 'second')
             if not filename:
                 return jsonify({'success': False, 'error': 'Upload échoué'}), 400
-            if photo_type == 'second':
-                current_user.second_photo = filename
-            else:
-                current_user.profile_photo = filename
+            PhotoService.assign(current_user, 'second' if photo_type == 'second' else 'profile', filename)
             db.session.commit()
-            return jsonify({'success': True, 'filename': filename})
+            return jsonify({'success': True, 'filename': filename, 'photo_status': current_user.photo_status})
         except Exception as e:
             logger.error(f"Erreur upload photo: {e}")
             db.session.rollback()
@@ -564,6 +574,8 @@ def register_routes(app):
                     'city': profile.city,
                     'bio': profile.bio,
                     'profile_photo': profile.profile_photo,
+                    'profile_photo_url': photo_url(profile, size=400),
+                    'profile_photo_renditions': photo_renditions(profile),
                     'interests': [i.name for i in profile.interests]
                 })
             
@@ -597,7 +609,9 @@ def register_routes(app):
                     'first_name': matched_user.first_name,
                     'age': matched_user.age,
                     'city': matched_user.city,
-                    'profile_photo': matched_user.profile_photo
+                    'profile_photo': matched_user.profile_photo,
+                    'profile_photo_url': photo_url(matched_user, size=160),
+                    'profile_photo_renditions': photo_renditions(matched_user)
                 })
             
             return jsonify({
@@ -633,6 +647,8 @@ def register_routes(app):
                     'city': user.city,
                     'bio': user.bio,
                     'profile_photo': user.profile_photo,
+                    'profile_photo_url': photo_url(user, size=400),
+                    'profile_photo_renditions': photo_renditions(user),
                     'interests': [i.name for i in user.interests],
                     'created_at': like.created_at.isoformat()
                 })
@@ -665,6 +681,8 @@ def register_routes(app):
                     'city': user.city,
                     'bio': user.bio,
                     'profile_photo': user.profile_photo,
+                    'profile_photo_url': photo_url(user, size=400),
+                    'profile_photo_renditions': photo_renditions(user),
                     'interests': [i.name for i in user.interests],
                     'created_at': like.created_at.isoformat(),
                     'is_match': item['is_match']
@@ -882,6 +900,7 @@ def register_routes(app):
                 
                 if user and user.check_password(password) and user.is_admin and user.is_active:
                     # Utiliser Flask-Login pour l'authentification admin
+                    UserService.save_login(user)
                     login_user(user)
                     user.update_last_active()
                     
@@ -894,6 +913,9 @@ def register_routes(app):
                 else:
                     flash('Identifiants administrateurs invalides', 'error')
                     
+            except PasswordServiceBusy:
+                flash('Trop de connexions en cours, veuillez réessayer dans quelques secondes', 'error')
+                return render_template('admin_login.html'), 503, {'Retry-After': '5'}
             except Exception as e:
                 logger.error(f"Erreur lors de la connexion admin: {e}")
                 flash('Une erreur est survenue lors de la connexion', 'error')
@@ -931,6 +953,10 @@ def register_routes(app):
             # Récupérer les messages récents
             recent_messages = AdminService.get_recent_messages(limit=10)
             
+            # Tentatives d'intrusion de la dernière heure
+            intrusion_attempts = security_logger.get_recent_intrusion_attempts(minutes=60)
+            top_offenders = security_logger.get_top_offenders(minutes=60, limit=10)
+            
             return render_template('admin_dashboard.html',
                                 total_users=stats.get('total_users', 0),
                                 active_users=stats.get('active_users', 0),
@@ -938,8 +964,12 @@ def register_routes(app):
                                 total_messages=stats.get('total_messages', 0),
                                 active_conversations=stats.get('active_conversations', 0),
                                 activity_rate=stats.get('activity_rate', 0),
+                                stats_updated_at=stats.get('updated_at'),
+                                stats_reconciled_at=stats.get('reconciled_at'),
                                 recent_users=recent_users,
-                                recent_messages=recent_messages)
+                                recent_messages=recent_messages,
+                                intrusion_attempts=intrusion_attempts,
+                                top_offenders=top_offenders)
             
         except Exception as e:
             logger.error(f"Erreur sur le dashboard admin: {e}")
@@ -954,13 +984,19 @@ def register_routes(app):
             if not session.get('is_admin') or not current_user.is_admin:
                 return redirect(url_for('admin_login'))
             
-            page = request.args.get('page', 1, type=int)
-            search = request.args.get('search', '')
+            after = request.args.get('after')
+            before = request.args.get('before')
+            search = request.args.get('search', '').strip()
             filter_status = request.args.get('filter', '')
             
-            users = AdminService.get_all_users(page=page, per_page=20, search=search, filter_status=filter_status)
+            users = AdminService.get_users_page(
+                after=after, before=before, per_page=20,
+                search=search, filter_status=filter_status
+            )
+            user_stats = AdminService.get_users_stats([u.id for u in users.items]) if users else {}
             
-            return render_template('admin_users.html', users=users, search=search, filter_status=filter_status)
+            return render_template('admin_users.html', users=users, user_stats=user_stats,
+                                search=search, filter_status=filter_status)
             
         except Exception as e:
             logger.error(f"Erreur sur la page utilisateurs admin: {e}")
@@ -1026,6 +1062,81 @@ def register_routes(app):
             logger.error(f"Erreur lors de la suppression de l'utilisateur: {e}")
             return jsonify({'success': False, 'error': 'Une erreur est survenue'})
     
+    @app.route('/api/admin/users/bulk-delete', methods=['POST'])
+    @login_required
+    def api_admin_bulk_delete_users():
+        """API pour lancer une suppression d'utilisateurs en masse (tâche en arrière-plan)"""
+        try:
+            if not session.get('is_admin') or not current_user.is_admin:
+                return jsonify({'success': False, 'error': 'Accès non autorisé'})
+            
+            body = request.get_json(silent=True) or {}
+            user_ids = body.get('user_ids') or []
+            if not isinstance(user_ids, list):
+                return jsonify({'success': False, 'error': 'Format invalide'}), 400
+            
+            job, error = AdminService.start_bulk_delete(user_ids, requested_by=current_user.id)
+            if not job:
+                return jsonify({'success': False, 'error': error}), 400
+            
+            return jsonify({'success': True, 'job': job.to_dict()}), 202
+            
+        except Exception as e:
+            logger.error(f"Erreur lors du lancement de la suppression en masse: {e}")
+            return jsonify({'success': False, 'error': 'Une erreur est survenue'})
+    
+    @app.route('/api/admin/jobs/<int:job_id>')
+    @login_required
+    def api_admin_job_status(job_id):
+        """API pour suivre la progression d'une tâche d'administration"""
+        try:
+            if not session.get('is_admin') or not current_user.is_admin:
+                return jsonify({'success': False, 'error': 'Accès non autorisé'})
+            
+            job = AdminService.get_job(job_id)
+            if not job:
+                return jsonify({'success': False, 'error': 'Tâche introuvable'}), 404
+            
+            return jsonify({'success': True, 'job': job.to_dict()})
+            
+        except Exception as e:
+            logger.error(f"Erreur lors de la récupération de la tâche {job_id}: {e}")
+            return jsonify({'success': False, 'error': 'Une erreur est survenue'})
+    
+    @app.route('/api/admin/security/intrusions')
+    @login_required
+    def api_admin_intrusions():
+        """API des tentatives d'intrusion récentes (fenêtre glissante en mémoire)"""
+        try:
+            if not session.get('is_admin') or not current_user.is_admin:
+                return jsonify({'success': False, 'error': 'Accès non autorisé'})
+            
+            minutes = min(max(request.args.get('minutes', 60, type=int), 1), 60)
+            limit = min(max(request.args.get('limit', 10, type=int), 1), 100)
+            return jsonify({
+                'success': True,
+                'minutes': minutes,
+                'attempts': security_logger.get_recent_intrusion_attempts(minutes=minutes),
+                'top_offenders': security_logger.get_top_offenders(minutes=minutes, limit=limit)
+            })
+            
+        except Exception as e:
+            logger.error(f"Erreur lors de la récupération des tentatives d'intrusion: {e}")
+            return jsonify({'success': False, 'error': 'Une erreur est survenue'})
+    
+    @app.route('/metrics')
+    def metrics():
+        """Métriques Prometheus (administrateur connecté ou jeton METRICS_TOKEN)"""
+        token = app.config.get('METRICS_TOKEN')
+        authorization = request.headers.get('Authorization', '')
+        if token and hmac.compare_digest(authorization, f"Bearer {token}"):
+            return metrics_response()
+        if current_user.is_authenticated and session.get('is_admin') and current_user.is_admin:
+            return metrics_response()
+        security_logger.log_unauthorized_access_attempt('/metrics',
+                                                        current_user.id if current_user.is_authenticated else None)
+        return jsonify({'success': False, 'error': 'Accès non autorisé'}), 403
+    
     @app.route('/admin/top-users')
     @login_required
     def admin_top_users():
@@ -1071,12 +1182,39 @@ def register_routes(app):
     @app.route('/api/admin/export-data')
     @login_required
     def api_admin_export_data():
-        """API pour exporter les données"""
+        """API pour exporter les données (json complet, ou ndjson/csv en flux)"""
         try:
             if not session.get('is_admin') or not current_user.is_admin:
                 return jsonify({'success': False, 'error': 'Accès non autorisé'})
             
             format_type = request.args.get('format', 'json')
+            
+            if format_type in ExportService.FORMATS:
+                compress = request.args.get('gzip', '0') in ('1', 'true', 'yes')
+                try:
+                    blocks = ExportService.stream(
+                        tables=request.args.get('tables'),
+                        format=format_type,
+                        compress=compress,
+                        after_id=request.args.get('after_id'),
+                        until_id=request.args.get('until_id', type=int),
+                        chunk_size=request.args.get('chunk_size', type=int)
+                    )
+                except ValueError as e:
+                    return jsonify({'success': False, 'error': str(e)}), 400
+                
+                filename = f"meet_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{format_type}"
+                mimetype = 'application/x-ndjson' if format_type == 'ndjson' else 'text/csv'
+                if compress:
+                    filename += '.gz'
+                    mimetype = 'application/gzip'
+                
+                return Response(
+                    stream_with_context(blocks),
+                    mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}'}
+                )
+            
             data = AdminService.export_data(format=format_type)
             
             if not data:
@@ -1111,6 +1249,9 @@ def register_routes(app):
 def register_filters(app):
     """Enregistre les filtres personnalisés"""
     
+    app.add_template_global(photo_url, 'photo_url')
+    app.add_template_global(photo_sources, 'photo_sources')
+    
     @app.template_filter('timeago')
     def timeago_filter(date):
         """Convertir une date en format 'il y a X temps'"""
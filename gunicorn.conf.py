@@ -0,0 +1,69 @@
+"""
+Configuration gunicorn de l'application Meet
+Métriques Prometheus partagées entre workers quand PROMETHEUS_MULTIPROC_DIR est défini.
+Les tâches planifiées partagées (nettoyages, agrégations) ne tournent que dans le
+worker qui détient le verrou du scheduler ; s'il s'arrête, son remplaçant le reprend.
+
+Exemple :
+    PROMETHEUS_MULTIPROC_DIR=/tmp/meet-metrics gunicorn -w 4 -b 0.0.0.0:8000 "app:create_app()"
+"""
+
+import fcntl
+import glob
+import os
+import tempfile
+
+
+def on_starting(server):
+    """Repart de métriques vides à chaque démarrage du maître"""
+    directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, '*.db')):
+        os.remove(path)
+
+
+def _scheduler_lock_path(server):
+    return os.path.join(tempfile.gettempdir(), f'meet-scheduler-{server.pid}.lock')
+
+
+def post_fork(server, worker):
+    """Active les tâches planifiées partagées dans un seul worker (SCHEDULER_ENABLED)
+
+    Le verrou est tenu tant que le worker vit ; à son arrêt, le système le libère
+    et le prochain worker démarré le prend. Sans effet si SCHEDULER_ENABLED=0 est
+    déjà défini (tâches exécutées ailleurs, par exemple sur un autre hôte).
+    """
+    # L'environnement est celui du maître : les valeurs posées ici restent dans ce worker
+    if os.environ.get('SCHEDULER_ENABLED') == '0':
+        return
+    lock = open(_scheduler_lock_path(server), 'a')
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock.close()
+        os.environ['SCHEDULER_ENABLED'] = '0'
+        return
+    worker.scheduler_lock = lock
+    os.environ['SCHEDULER_ENABLED'] = '1'
+    server.log.info("Worker %s : tâches planifiées partagées activées", worker.pid)
+
+
+def on_exit(server):
+    """Supprime le fichier de verrou du scheduler"""
+    try:
+        os.remove(_scheduler_lock_path(server))
+    except OSError:
+        pass
+
+
+def child_exit(server, worker):
+    """Retire les jauges d'un worker arrêté (les compteurs et histogrammes sont conservés)"""
+    if not os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        return
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
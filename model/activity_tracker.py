@@ -0,0 +1,112 @@
+"""
+Suivi de la dernière activité des utilisateurs
+Les dates sont regroupées en mémoire puis écrites en une seule requête UPDATE
+"""
+
+import atexit
+import logging
+import threading
+import time
+from flask import current_app, request
+from flask_login import current_user
+from sqlalchemy import bindparam, or_
+from .database import db
+from .models import User
+from .extensions import get_timezone_aware_datetime
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL_SECONDS = 60
+FLUSH_BATCH_SIZE = 500
+
+# user_id -> date d'activité la plus récente pas encore écrite
+_pending = {}
+# user_id -> instant (monotonic) de la dernière activité retenue
+_recorded = {}
+_lock = threading.Lock()
+
+
+class ActivityTracker:
+    """Tampon des dates de dernière activité, vidé périodiquement par le scheduler"""
+
+    @staticmethod
+    def touch(user_id, seen_at=None):
+        """Enregistre une activité ; ignorée si l'utilisateur a déjà été retenu dans l'intervalle
+
+        Retourne True si l'activité sera écrite au prochain vidage.
+        """
+        interval = current_app.config.get('LAST_ACTIVE_INTERVAL_SECONDS', DEFAULT_INTERVAL_SECONDS)
+        now = time.monotonic()
+        with _lock:
+            last = _recorded.get(user_id)
+            if last is not None and now - last < interval:
+                return False
+            _recorded[user_id] = now
+            _pending[user_id] = seen_at or get_timezone_aware_datetime()
+        return True
+
+    @staticmethod
+    def pending_count():
+        with _lock:
+            return len(_pending)
+
+    @staticmethod
+    def flush():
+        """Écrit les dates en attente ; retourne le nombre d'utilisateurs mis à jour
+
+        Une date plus ancienne que celle déjà en base (écrite par un autre
+        processus) est ignorée. En cas d'erreur, les dates sont remises dans
+        le tampon pour le vidage suivant.
+        """
+        interval = current_app.config.get('LAST_ACTIVE_INTERVAL_SECONDS', DEFAULT_INTERVAL_SECONDS)
+        now = time.monotonic()
+        with _lock:
+            pending = dict(_pending)
+            _pending.clear()
+            # Les utilisateurs hors intervalle seraient de toute façon retenus à nouveau
+            for user_id in [user_id for user_id, last in _recorded.items() if now - last >= interval]:
+                del _recorded[user_id]
+        if not pending:
+            return 0
+
+        table = User.__table__
+        stmt = (
+            table.update()
+            .where(table.c.id == bindparam('user_id'))
+            .where(or_(table.c.last_active.is_(None), table.c.last_active < bindparam('seen_at')))
+            .values(last_active=bindparam('seen_at'))
+        )
+        rows = [{'user_id': user_id, 'seen_at': seen_at} for user_id, seen_at in pending.items()]
+        try:
+            # Connexion dédiée : indépendante de la transaction de la requête en cours
+            with db.engine.begin() as connection:
+                for start in range(0, len(rows), FLUSH_BATCH_SIZE):
+                    connection.execute(stmt, rows[start:start + FLUSH_BATCH_SIZE])
+        except Exception as e:
+            logger.error(f"Erreur lors de l'écriture des dates d'activité: {e}")
+            with _lock:
+                for user_id, seen_at in pending.items():
+                    current = _pending.get(user_id)
+                    if current is None or current < seen_at:
+                        _pending[user_id] = seen_at
+            return 0
+        logger.debug(f"Dates d'activité écrites pour {len(rows)} utilisateurs")
+        return len(rows)
+
+
+def init_activity_tracking(app):
+    """Enregistre l'activité des utilisateurs connectés à chaque requête"""
+
+    @app.before_request
+    def track_last_active():
+        if request.endpoint == 'static':
+            return
+        if current_user.is_authenticated:
+            ActivityTracker.touch(current_user.id)
+
+    def flush_on_exit():
+        with app.app_context():
+            ActivityTracker.flush()
+
+    # Ne pas perdre les dernières activités à l'arrêt du processus
+    atexit.register(flush_on_exit)
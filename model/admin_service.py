@@ -2,64 +2,62 @@
 Service d'administration pour la gestion complète de l'application
 """
 
+import base64
 import logging
+import threading
+import time
 from datetime import datetime, timedelta
+from flask import current_app
 from sqlalchemy import func, desc, and_, or_
+from sqlalchemy.orm import joinedload
 from .database import db
-from .models import User, Message, Like, Match, Notification, Interest, UserInterest
+from .models import User, Message, Like, Match, Notification, Interest, UserInterest, UserStats, AdminJob
 from .extensions import get_timezone_aware_datetime
+from .photo_service import PhotoService
+from .stats_service import StatsService, ActivityRollupService, UserStatsService
+from .metrics import record_cleanup
 
 logger = logging.getLogger(__name__)
 
+
+class KeysetPage:
+    """Page de résultats paginée par clé (sans COUNT ni OFFSET)"""
+    def __init__(self, items, next_cursor, prev_cursor, total, total_is_estimate):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+        self.total_is_estimate = total_is_estimate
+    
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+    
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+# Cache des totaux de recherche : (recherche, statut) -> (expiration, total)
+_search_count_cache = {}
+SEARCH_COUNT_TTL_SECONDS = 300
+SEARCH_COUNT_CACHE_SIZE = 256
+
+# Suppression en masse : taille des lots et nombre maximal d'utilisateurs par tâche
+BULK_DELETE_CHUNK_SIZE = 500
+BULK_DELETE_MAX_USERS = 1000
+# Tâche sans progression au-delà de ce délai : considérée comme interrompue
+ADMIN_JOB_STALE_MINUTES = 10
+
+
 class AdminService:
     """Service central pour toutes les opérations d'administration"""
     
     @staticmethod
     def get_dashboard_stats():
-        """Récupère les statistiques générales du dashboard"""
+        """Récupère les statistiques générales du dashboard depuis les compteurs matérialisés"""
         try:
-            # Statistiques de base
-            total_users = User.query.count()
-            active_users = User.query.filter(User.is_active == True).count()
-            total_matches = Match.query.count()
-            total_messages = Message.query.count()
-            total_likes = Like.query.count()
-            
-            # Utilisateurs récents (7 derniers jours)
-            week_ago = get_timezone_aware_datetime() - timedelta(days=7)
-            recent_users = User.query.filter(User.created_at >= week_ago).count()
-            
-            # Messages récents (24h)
-            day_ago = get_timezone_aware_datetime() - timedelta(days=1)
-            recent_messages = Message.query.filter(Message.created_at >= day_ago).count()
-            
-            # Matches récents (7 jours)
-            recent_matches = Match.query.filter(Match.created_at >= week_ago).count()
-            
-            # Conversations actives (utilisateurs avec messages des dernières 24h)
-            active_conversations = db.session.query(Message.sender_id).filter(
-                Message.created_at >= day_ago
-            ).union(
-                db.session.query(Message.receiver_id).filter(
-                    Message.created_at >= day_ago
-                )
-            ).distinct().count()
-            
-            # Taux d'activité
-            activity_rate = (active_users / total_users * 100) if total_users > 0 else 0
-            
-            return {
-                'total_users': total_users,
-                'active_users': active_users,
-                'total_matches': total_matches,
-                'total_messages': total_messages,
-                'total_likes': total_likes,
-                'recent_users': recent_users,
-                'recent_messages': recent_messages,
-                'recent_matches': recent_matches,
-                'active_conversations': active_conversations,
-                'activity_rate': round(activity_rate, 1)
-            }
+            return StatsService.get_dashboard_stats()
         except Exception as e:
             logger.error(f"Erreur lors de la récupération des stats: {e}")
             return {}
@@ -75,9 +73,11 @@ class AdminService:
     
     @staticmethod
     def get_recent_messages(limit=10):
-        """Récupère les messages récents"""
+        """Récupère les messages récents, avec leur expéditeur et leur destinataire"""
         try:
-            return Message.query.order_by(desc(Message.created_at)).limit(limit).all()
+            return (Message.query
+                    .options(joinedload(Message.sender), joinedload(Message.receiver))
+                    .order_by(desc(Message.created_at)).limit(limit).all())
         except Exception as e:
             logger.error(f"Erreur lors de la récupération des messages récents: {e}")
             return []
@@ -116,34 +116,176 @@ class AdminService:
             logger.error(f"Erreur lors de la récupération des utilisateurs: {e}")
             return None
     
+    @staticmethod
+    def encode_cursor(user):
+        """Encode la position (created_at, id) d'un utilisateur en curseur opaque"""
+        raw = f"{user.created_at.isoformat()}|{user.id}"
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+    
+    @staticmethod
+    def decode_cursor(cursor):
+        """Décode un curseur ; retourne None s'il est invalide"""
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            created_at, user_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+            return datetime.fromisoformat(created_at), int(user_id)
+        except Exception:
+            return None
+    
+    @staticmethod
+    def _user_search_filter(search):
+        """Filtre de recherche par préfixe, compatible avec les index des colonnes"""
+        escaped = search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        prefix = f"{escaped}%"
+        return or_(
+            User.email.like(prefix, escape='\\'),
+            User.first_name.like(prefix, escape='\\'),
+            User.last_name.like(prefix, escape='\\'),
+            User.city.like(prefix, escape='\\')
+        )
+    
+    @staticmethod
+    def _approximate_user_total(search, filter_status):
+        """Total approximatif : compteurs matérialisés, ou COUNT mis en cache pour une recherche"""
+        if not search:
+            stats = StatsService.get_dashboard_stats()
+            if filter_status == 'active':
+                return stats['active_users']
+            if filter_status == 'inactive':
+                return max(stats['total_users'] - stats['active_users'], 0)
+            return stats['total_users']
+        
+        key = (search.lower(), filter_status or '')
+        now = time.monotonic()
+        cached = _search_count_cache.get(key)
+        if cached and cached[0] > now:
+            return cached[1]
+        
+        query = User.query.filter(AdminService._user_search_filter(search))
+        if filter_status == 'active':
+            query = query.filter(User.is_active == True)
+        elif filter_status == 'inactive':
+            query = query.filter(User.is_active == False)
+        total = query.count()
+        
+        if len(_search_count_cache) >= SEARCH_COUNT_CACHE_SIZE:
+            _search_count_cache.clear()
+        _search_count_cache[key] = (now + SEARCH_COUNT_TTL_SECONDS, total)
+        return total
+    
+    @staticmethod
+    def get_users_page(after=None, before=None, per_page=20, search=None, filter_status=None, with_total=True):
+        """Récupère une page d'utilisateurs par pagination par clé sur (created_at, id)
+
+        Le coût d'une page est constant quelle que soit sa profondeur : pas
+        d'OFFSET, et pas de COUNT(*) à chaque page (total approximatif optionnel).
+        """
+        try:
+            query = User.query
+            
+            if search:
+                query = query.filter(AdminService._user_search_filter(search))
+            
+            if filter_status == 'active':
+                query = query.filter(User.is_active == True)
+            elif filter_status == 'inactive':
+                query = query.filter(User.is_active == False)
+            
+            position = AdminService.decode_cursor(before or after) if (before or after) else None
+            backwards = bool(before) and position is not None
+            
+            if position:
+                created_at, user_id = position
+                if backwards:
+                    query = query.filter(or_(
+                        User.created_at > created_at,
+                        and_(User.created_at == created_at, User.id > user_id)
+                    )).order_by(User.created_at.asc(), User.id.asc())
+                else:
+                    query = query.filter(or_(
+                        User.created_at < created_at,
+                        and_(User.created_at == created_at, User.id < user_id)
+                    )).order_by(User.created_at.desc(), User.id.desc())
+            else:
+                query = query.order_by(User.created_at.desc(), User.id.desc())
+            
+            # Une ligne de plus pour savoir s'il existe une page suivante
+            rows = query.limit(per_page + 1).all()
+            has_more = len(rows) > per_page
+            rows = rows[:per_page]
+            if backwards:
+                rows.reverse()
+            
+            if backwards:
+                has_next, has_prev = True, has_more
+            else:
+                has_next, has_prev = has_more, position is not None
+            
+            next_cursor = AdminService.encode_cursor(rows[-1]) if rows and has_next else None
+            prev_cursor = AdminService.encode_cursor(rows[0]) if rows and has_prev else None
+            
+            total = AdminService._approximate_user_total(search, filter_status) if with_total else None
+            
+            return KeysetPage(rows, next_cursor, prev_cursor, total, total_is_estimate=True)
+        except Exception as e:
+            logger.error(f"Erreur lors de la récupération des utilisateurs: {e}")
+            return None
+    
+    @staticmethod
+    def _user_stats_columns():
+        """Sous-requêtes scalaires corrélées sur User.id pour les compteurs d'un utilisateur
+
+        Chaque sous-requête s'appuie sur l'index de sa colonne de clé étrangère ;
+        les matches sont comptés en deux sous-requêtes plutôt qu'avec un OR.
+        """
+        def count(model, *criteria):
+            return db.session.query(func.count(model.id)).filter(*criteria).correlate(User).scalar_subquery()
+        
+        return [
+            count(Like, Like.liker_id == User.id).label('likes_sent'),
+            count(Like, Like.liked_id == User.id).label('likes_received'),
+            (
+                count(Match, Match.user1_id == User.id) +
+                count(Match, Match.user2_id == User.id)
+            ).label('matches'),
+            count(Message, Message.sender_id == User.id).label('messages_sent'),
+            count(Message, Message.receiver_id == User.id).label('messages_received'),
+            count(UserInterest, UserInterest.user_id == User.id).label('interests_count'),
+        ]
+    
     @staticmethod
     def get_user_details(user_id):
-        """Récupère les détails complets d'un utilisateur"""
+        """Récupère les détails complets d'un utilisateur (une seule requête)"""
         try:
-            user = User.query.get(user_id)
-            if not user:
+            row = db.session.query(User, *AdminService._user_stats_columns()).filter(
+                User.id == user_id
+            ).first()
+            if not row:
                 return None
             
-            # Statistiques de l'utilisateur
-            stats = {
-                'likes_sent': Like.query.filter_by(liker_id=user_id).count(),
-                'likes_received': Like.query.filter_by(liked_id=user_id).count(),
-                'matches': Match.query.filter(
-                    or_(Match.user1_id == user_id, Match.user2_id == user_id)
-                ).count(),
-                'messages_sent': Message.query.filter_by(sender_id=user_id).count(),
-                'messages_received': Message.query.filter_by(receiver_id=user_id).count(),
-                'interests_count': UserInterest.query.filter_by(user_id=user_id).count()
-            }
-            
+            user, *counts = row
             return {
                 'user': user,
-                'stats': stats
+                'stats': dict(zip(row._fields[1:], counts))
             }
         except Exception as e:
             logger.error(f"Erreur lors de la récupération des détails utilisateur: {e}")
             return None
     
+    @staticmethod
+    def get_users_stats(user_ids):
+        """Récupère les compteurs d'une page d'utilisateurs en une requête groupée"""
+        try:
+            if not user_ids:
+                return {}
+            rows = db.session.query(User.id, *AdminService._user_stats_columns()).filter(
+                User.id.in_(list(user_ids))
+            ).all()
+            return {row[0]: dict(zip(row._fields[1:], row[1:])) for row in rows}
+        except Exception as e:
+            logger.error(f"Erreur lors de la récupération des compteurs utilisateurs: {e}")
+            return {}
+    
     @staticmethod
     def toggle_user_status(user_id):
         """Active/désactive un utilisateur"""
@@ -153,6 +295,7 @@ class AdminService:
                 return False, "Utilisateur non trouvé"
             
             user.is_active = not user.is_active
+            StatsService.on_user_status_changed(user.is_active)
             db.session.commit()
             
             status = "activé" if user.is_active else "désactivé"
@@ -162,40 +305,252 @@ class AdminService:
             db.session.rollback()
             return False, "Erreur lors du changement de statut"
     
+    @staticmethod
+    def _delete_in_chunks(model, criterion, chunk_size, counterpart=None, on_chunk=None, commit=True):
+        """Supprime les lignes correspondant au critère par lots, un commit par lot
+
+        Chaque transaction reste courte : les verrous sur les tables de
+        messagerie ne sont jamais tenus pendant toute la suppression.
+        `on_chunk(count, counterparts)` est appelé avant chaque commit avec le
+        nombre de lignes du lot et, si `counterpart` est une colonne, le nombre
+        de lignes par valeur de cette colonne : les compteurs sont ainsi mis à
+        jour dans la même transaction que la suppression. Avec commit=False,
+        les lots restent dans la transaction de l'appelant.
+        """
+        columns = [model.id] if counterpart is None else [model.id, counterpart]
+        deleted = 0
+        while True:
+            rows = db.session.query(*columns).filter(criterion).limit(chunk_size).all()
+            if not rows:
+                return deleted
+            count = model.query.filter(model.id.in_([row[0] for row in rows])).delete(synchronize_session=False)
+            if on_chunk is not None:
+                counterparts = {}
+                if counterpart is not None:
+                    for row in rows:
+                        counterparts[row[1]] = counterparts.get(row[1], 0) + 1
+                on_chunk(count, counterparts)
+            if commit:
+                db.session.commit()
+            deleted += count
+    
+    @staticmethod
+    def purge_user(user_id, chunk_size=None, heartbeat=None, atomic=False):
+        """Supprime un utilisateur et ses données dépendantes par lots bornés
+
+        Les compteurs globaux et ceux des autres utilisateurs (likes reçus,
+        matches, messages envoyés) sont décrémentés avec chaque lot : une
+        interruption laisse des compteurs cohérents et la purge peut être
+        relancée. `heartbeat()` est appelé dans la transaction de chaque lot.
+        Avec atomic=True, tous les lots sont validés ensemble par le dernier
+        commit : une erreur ne laisse pas d'utilisateur à moitié supprimé.
+        Retourne le nombre de lignes supprimées, ou None si l'utilisateur n'existe pas.
+        """
+        chunk_size = chunk_size or BULK_DELETE_CHUNK_SIZE
+        commit = not atomic
+        user = User.query.get(user_id)
+        if not user:
+            return None
+        was_active = user.is_active
+        
+        def on_chunk(key, column=None):
+            def apply(count, counterparts):
+                StatsService.increment(key, -count)
+                for other_id, other_count in counterparts.items():
+                    if other_id != user_id:
+                        UserStatsService.increment(other_id, column, -other_count)
+                if heartbeat is not None:
+                    heartbeat()
+            return apply
+        
+        def touch(count, counterparts):
+            if heartbeat is not None:
+                heartbeat()
+        
+        def delete(model, criterion, counterpart=None, apply=touch):
+            return AdminService._delete_in_chunks(model, criterion, chunk_size, counterpart, apply, commit)
+        
+        # Un critère par colonne indexée plutôt qu'un OR ; les compteurs de
+        # l'utilisateur supprimé disparaissent avec sa ligne UserStats
+        likes_deleted = (
+            delete(Like, Like.liker_id == user_id, Like.liked_id,
+                   on_chunk(StatsService.TOTAL_LIKES, UserStats.likes_received_count)) +
+            delete(Like, Like.liked_id == user_id, apply=on_chunk(StatsService.TOTAL_LIKES))
+        )
+        matches_deleted = (
+            delete(Match, Match.user1_id == user_id, Match.user2_id,
+                   on_chunk(StatsService.TOTAL_MATCHES, UserStats.matches_count)) +
+            delete(Match, Match.user2_id == user_id, Match.user1_id,
+                   on_chunk(StatsService.TOTAL_MATCHES, UserStats.matches_count))
+        )
+        messages_deleted = (
+            delete(Message, Message.sender_id == user_id, apply=on_chunk(StatsService.TOTAL_MESSAGES)) +
+            delete(Message, Message.receiver_id == user_id, Message.sender_id,
+                   on_chunk(StatsService.TOTAL_MESSAGES, UserStats.messages_sent_count))
+        )
+        other_deleted = (
+            delete(Notification, Notification.user_id == user_id) +
+            delete(UserInterest, UserInterest.user_id == user_id)
+        )
+        UserStats.query.filter_by(user_id=user_id).delete()
+        PhotoService.release_user(user)
+        
+        # Supprimer l'utilisateur (les lignes dépendantes ont déjà été décomptées)
+        StatsService.on_user_deleted(was_active)
+        User.query.filter_by(id=user_id).delete(synchronize_session=False)
+        db.session.commit()
+        
+        return likes_deleted + matches_deleted + messages_deleted + other_deleted + 1
+    
     @staticmethod
     def delete_user(user_id):
-        """Supprime un utilisateur et toutes ses données"""
+        """Supprime un utilisateur et toutes ses données, en une seule transaction"""
         try:
-            user = User.query.get(user_id)
-            if not user:
+            if AdminService.purge_user(user_id, atomic=True) is None:
                 return False, "Utilisateur non trouvé"
             
-            # Supprimer les données associées
-            Like.query.filter(
-                or_(Like.liker_id == user_id, Like.liked_id == user_id)
-            ).delete()
-            
-            Match.query.filter(
-                or_(Match.user1_id == user_id, Match.user2_id == user_id)
-            ).delete()
-            
-            Message.query.filter(
-                or_(Message.sender_id == user_id, Message.receiver_id == user_id)
-            ).delete()
-            
-            Notification.query.filter_by(user_id=user_id).delete()
-            UserInterest.query.filter_by(user_id=user_id).delete()
-            
-            # Supprimer l'utilisateur
-            db.session.delete(user)
-            db.session.commit()
-            
             return True, "Utilisateur supprimé avec succès"
         except Exception as e:
             logger.error(f"Erreur lors de la suppression de l'utilisateur: {e}")
             db.session.rollback()
             return False, "Erreur lors de la suppression"
     
+    @staticmethod
+    def start_bulk_delete(user_ids, requested_by=None):
+        """Crée une tâche de suppression en masse et la lance en arrière-plan"""
+        try:
+            ids = []
+            for user_id in user_ids:
+                user_id = int(user_id)
+                if user_id != requested_by and user_id not in ids:
+                    ids.append(user_id)
+            if not ids:
+                return None, "Aucun utilisateur à supprimer"
+            if len(ids) > BULK_DELETE_MAX_USERS:
+                return None, f"Maximum {BULK_DELETE_MAX_USERS} utilisateurs par tâche"
+            
+            job = AdminJob(job_type='bulk_delete_users', status='pending', total=len(ids), created_by=requested_by)
+            db.session.add(job)
+            db.session.commit()
+            
+            app = current_app._get_current_object()
+            thread = threading.Thread(
+                target=AdminService._run_bulk_delete,
+                args=(app, job.id, ids),
+                name=f'bulk-delete-{job.id}',
+                daemon=True
+            )
+            thread.start()
+            
+            logger.info(f"Suppression en masse lancée: tâche {job.id}, {len(ids)} utilisateurs")
+            return job, None
+        except (TypeError, ValueError):
+            return None, "Identifiants utilisateurs invalides"
+        except Exception as e:
+            logger.error(f"Erreur lors du lancement de la suppression en masse: {e}")
+            db.session.rollback()
+            return None, "Erreur lors du lancement de la suppression"
+    
+    @staticmethod
+    def _run_bulk_delete(app, job_id, user_ids):
+        """Exécute une suppression en masse en mettant à jour la progression"""
+        with app.app_context():
+            try:
+                # Conditionnel : une tâche déjà déclarée interrompue n'est pas relancée ici
+                started = AdminJob.query.filter_by(id=job_id, status='pending').update({
+                    AdminJob.status: 'running', AdminJob.updated_at: get_timezone_aware_datetime()
+                }, synchronize_session=False)
+                db.session.commit()
+                if not started:
+                    logger.warning(f"Tâche {job_id} non lancée: elle n'est plus en attente")
+                    return
+                
+                def heartbeat():
+                    AdminJob.query.filter_by(id=job_id).update(
+                        {AdminJob.updated_at: get_timezone_aware_datetime()}, synchronize_session=False
+                    )
+                
+                for user_id in user_ids:
+                    try:
+                        deleted = AdminService.purge_user(user_id, heartbeat=heartbeat)
+                        failed = 0 if deleted is not None else 1
+                    except Exception as e:
+                        logger.error(f"Tâche {job_id}: échec de la suppression de l'utilisateur {user_id}: {e}")
+                        db.session.rollback()
+                        deleted, failed = None, 1
+                    
+                    running = AdminJob.query.filter_by(id=job_id, status='running').update({
+                        AdminJob.processed: AdminJob.processed + 1,
+                        AdminJob.failed: AdminJob.failed + failed,
+                        AdminJob.rows_deleted: AdminJob.rows_deleted + (deleted or 0),
+                        AdminJob.updated_at: get_timezone_aware_datetime()
+                    }, synchronize_session=False)
+                    db.session.commit()
+                    if not running:
+                        # Déclarée interrompue par fail_stale_jobs (lot trop lent) : elle reste en échec
+                        logger.warning(f"Tâche {job_id} arrêtée: marquée en échec pendant son exécution")
+                        return
+                
+                # Ne passe à "done" que si la tâche est toujours en cours
+                finished = AdminJob.query.filter_by(id=job_id, status='running').update({
+                    AdminJob.status: 'done',
+                    AdminJob.finished_at: get_timezone_aware_datetime()
+                }, synchronize_session=False)
+                db.session.commit()
+                if finished:
+                    logger.info(f"Suppression en masse terminée: tâche {job_id}")
+                else:
+                    logger.warning(f"Tâche {job_id} terminée après avoir été marquée en échec")
+            except Exception as e:
+                logger.error(f"Erreur lors de la suppression en masse (tâche {job_id}): {e}")
+                db.session.rollback()
+                AdminJob.query.filter_by(id=job_id).update({
+                    AdminJob.status: 'failed',
+                    AdminJob.error: str(e)[:1000],
+                    AdminJob.finished_at: get_timezone_aware_datetime()
+                }, synchronize_session=False)
+                db.session.commit()
+            finally:
+                db.session.remove()
+    
+    @staticmethod
+    def fail_stale_jobs(stale_minutes=ADMIN_JOB_STALE_MINUTES):
+        """Marque en échec les tâches sans progression depuis `stale_minutes` (tâche planifiée)
+
+        Les tâches tournent dans un thread du worker qui les a lancées : un
+        redémarrage du worker les interrompt sans mettre à jour leur statut.
+        `updated_at` sert de battement de cœur (mis à jour à chaque lot). Une
+        tâche interrompue peut être relancée : les utilisateurs déjà supprimés
+        sont ignorés.
+        """
+        try:
+            now = get_timezone_aware_datetime()
+            stale = AdminJob.query.filter(
+                AdminJob.status.in_(('pending', 'running')),
+                AdminJob.updated_at < now - timedelta(minutes=stale_minutes)
+            ).update({
+                AdminJob.status: 'failed',
+                AdminJob.error: "Tâche interrompue (arrêt du worker), à relancer",
+                AdminJob.finished_at: now
+            }, synchronize_session=False)
+            db.session.commit()
+            if stale:
+                logger.warning(f"{stale} tâche(s) d'administration interrompue(s) marquée(s) en échec")
+            return stale
+        except Exception as e:
+            logger.error(f"Erreur lors de la détection des tâches interrompues: {e}")
+            db.session.rollback()
+            return 0
+    
+    @staticmethod
+    def get_job(job_id):
+        """Récupère l'état d'une tâche d'administration"""
+        try:
+            return AdminJob.query.get(job_id)
+        except Exception as e:
+            logger.error(f"Erreur lors de la récupération de la tâche {job_id}: {e}")
+            return None
+    
     @staticmethod
     def get_system_logs(level='INFO', limit=100):
         """Récupère les logs système"""
@@ -212,8 +567,10 @@ class AdminService:
         try:
             now = get_timezone_aware_datetime()
             
-            # Nettoyer les messages expirés
-            expired_messages = Message.query.filter(Message.expires_at < now).delete()
+            # Nettoyer les messages expirés (compteurs par utilisateur dans la même transaction)
+            expired = Message.expires_at < now
+            UserStatsService.decrement_matching(Message, expired, Message.sender_id, UserStats.messages_sent_count)
+            expired_messages = Message.query.filter(expired).delete(synchronize_session=False)
             
             # Nettoyer les notifications expirées
             expired_notifications = Notification.query.filter(
@@ -222,9 +579,16 @@ class AdminService:
             
             # Nettoyer les likes orphelins (plus de 30 jours)
             month_ago = now - timedelta(days=30)
-            old_likes = Like.query.filter(Like.created_at < month_ago).delete()
+            old = Like.created_at < month_ago
+            UserStatsService.decrement_matching(Like, old, Like.liked_id, UserStats.likes_received_count)
+            old_likes = Like.query.filter(old).delete(synchronize_session=False)
             
+            StatsService.on_messages_deleted(expired_messages)
+            StatsService.on_likes_removed(old_likes)
             db.session.commit()
+            record_cleanup('message', expired_messages)
+            record_cleanup('notification', expired_notifications)
+            record_cleanup('like', old_likes)
             
             return {
                 'success': True,
@@ -243,47 +607,15 @@ class AdminService:
     
     @staticmethod
     def get_activity_stats(days=30):
-        """Récupère les statistiques d'activité sur une période"""
+        """Récupère les statistiques d'activité sur une période depuis les agrégats journaliers"""
         try:
-            start_date = get_timezone_aware_datetime() - timedelta(days=days)
-            
-            # Nouveaux utilisateurs par jour
-            daily_users = db.session.query(
-                func.date(User.created_at),
-                func.count(User.id)
-            ).filter(User.created_at >= start_date).group_by(
-                func.date(User.created_at)
-            ).all()
-            
-            # Messages par jour
-            daily_messages = db.session.query(
-                func.date(Message.created_at),
-                func.count(Message.id)
-            ).filter(Message.created_at >= start_date).group_by(
-                func.date(Message.created_at)
-            ).all()
-            
-            # Matches par jour
-            daily_matches = db.session.query(
-                func.date(Match.created_at),
-                func.count(Match.id)
-            ).filter(Match.created_at >= start_date).group_by(
-                func.date(Match.created_at)
-            ).all()
-            
-            # Likes par jour
-            daily_likes = db.session.query(
-                func.date(Like.created_at),
-                func.count(Like.id)
-            ).filter(Like.created_at >= start_date).group_by(
-                func.date(Like.created_at)
-            ).all()
+            daily = ActivityRollupService.get_daily_counts(days=days)
             
             return {
-                'daily_users': dict(daily_users),
-                'daily_messages': dict(daily_messages),
-                'daily_matches': dict(daily_matches),
-                'daily_likes': dict(daily_likes),
+                'daily_users': daily['users'],
+                'daily_messages': daily['messages'],
+                'daily_matches': daily['matches'],
+                'daily_likes': daily['likes'],
                 'period_days': days
             }
         except Exception as e:
@@ -292,42 +624,9 @@ class AdminService:
     
     @staticmethod
     def get_top_users(metric='matches', limit=10):
-        """Récupère les top utilisateurs selon différentes métriques"""
+        """Récupère les top utilisateurs selon différentes métriques (compteurs précalculés)"""
         try:
-            if metric == 'matches':
-                # Utilisateurs avec le plus de matches
-                query = db.session.query(
-                    User,
-                    func.count(Match.id).label('count')
-                ).outerjoin(
-                    Match,
-                    or_(Match.user1_id == User.id, Match.user2_id == User.id)
-                ).group_by(User.id).order_by(desc('count')).limit(limit)
-                
-            elif metric == 'likes_received':
-                # Utilisateurs avec le plus de likes reçus
-                query = db.session.query(
-                    User,
-                    func.count(Like.id).label('count')
-                ).outerjoin(
-                    Like,
-                    Like.liked_id == User.id
-                ).group_by(User.id).order_by(desc('count')).limit(limit)
-                
-            elif metric == 'messages_sent':
-                # Utilisateurs avec le plus de messages envoyés
-                query = db.session.query(
-                    User,
-                    func.count(Message.id).label('count')
-                ).outerjoin(
-                    Message,
-                    Message.sender_id == User.id
-                ).group_by(User.id).order_by(desc('count')).limit(limit)
-                
-            else:
-                return []
-            
-            return query.all()
+            return UserStatsService.get_top_users(metric=metric, limit=limit)
         except Exception as e:
             logger.error(f"Erreur lors de la récupération des top utilisateurs: {e}")
             return []
@@ -396,7 +695,7 @@ class AdminService:
                 data['interests'].append({
                     'id': interest.id,
                     'name': interest.name,
-                    'description': interest.description
+                    'category': interest.category
                 })
             
             return data
@@ -0,0 +1,195 @@
+"""
+Export en flux des données de l'application
+NDJSON ou CSV par blocs de taille fixe, compression gzip optionnelle
+"""
+
+import csv
+import io
+import json
+import logging
+import zlib
+from datetime import date, datetime
+from .database import db
+from .models import User, Message, Like, Match, Interest
+
+logger = logging.getLogger(__name__)
+
+
+def _age(birth_date):
+    """Calcule l'âge à partir d'une date de naissance"""
+    if not birth_date:
+        return None
+    today = date.today()
+    return today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
+
+
+class ExportService:
+    """Exporteur en flux : la mémoire reste constante quelle que soit la taille de la base"""
+
+    # Table exportée -> (modèle, colonnes sélectionnées)
+    TABLES = {
+        'users': (User, [
+            User.id, User.email, User.first_name, User.last_name, User.birth_date,
+            User.city, User.gender, User.interested_in, User.bio, User.is_active,
+            User.created_at, User.updated_at
+        ]),
+        'matches': (Match, [Match.id, Match.user1_id, Match.user2_id, Match.created_at]),
+        'messages': (Message, [
+            Message.id, Message.sender_id, Message.receiver_id, Message.content,
+            Message.created_at, Message.expires_at
+        ]),
+        'likes': (Like, [Like.id, Like.liker_id, Like.liked_id, Like.created_at]),
+        'interests': (Interest, [Interest.id, Interest.name, Interest.category]),
+    }
+
+    FORMATS = ('ndjson', 'csv')
+    DEFAULT_CHUNK_SIZE = 1000
+    MAX_CHUNK_SIZE = 10000
+
+    @staticmethod
+    def parse_tables(tables):
+        """Valide une sélection de tables (liste ou chaîne séparée par des virgules)"""
+        if not tables:
+            return list(ExportService.TABLES)
+        if isinstance(tables, str):
+            tables = [t.strip() for t in tables.split(',') if t.strip()]
+        unknown = [t for t in tables if t not in ExportService.TABLES]
+        if unknown:
+            raise ValueError(f"Tables inconnues: {', '.join(unknown)}")
+        return tables
+
+    @staticmethod
+    def parse_cursor(after_id, until_id, tables):
+        """Valide les bornes d'un export et retourne (index de la table de reprise, after_id)
+
+        Avec une seule table, `after_id` est un id. Avec plusieurs tables, il
+        prend la forme `table:id` (dernière ligne reçue) : les tables précédentes
+        sont ignorées, la table nommée reprend après l'id et les suivantes sont
+        exportées en entier. `until_id` n'a de sens que pour une seule table.
+        """
+        if until_id is not None and len(tables) != 1:
+            raise ValueError("until_id nécessite exactement une table")
+        if after_id is None or after_id == '':
+            return 0, None
+
+        table, sep, value = str(after_id).rpartition(':')
+        if not sep:
+            if len(tables) != 1:
+                raise ValueError("Avec plusieurs tables, after_id doit être de la forme table:id")
+            table = tables[0]
+        if table not in tables:
+            raise ValueError(f"Table de reprise absente de l'export: {table}")
+        try:
+            return tables.index(table), int(value)
+        except ValueError:
+            raise ValueError(f"after_id invalide: {after_id}") from None
+
+    @staticmethod
+    def _serialize(row, columns):
+        """Convertit une ligne de résultat en dictionnaire sérialisable"""
+        record = {column.key: value for column, value in zip(columns, row)}
+        if 'birth_date' in record:
+            # Compatibilité avec l'ancien export qui exposait l'âge
+            record['age'] = _age(record['birth_date'])
+        for key, value in record.items():
+            if isinstance(value, (datetime, date)):
+                record[key] = value.isoformat()
+        return record
+
+    @staticmethod
+    def iter_chunks(table, after_id=None, until_id=None, chunk_size=None):
+        """Itère sur une table par blocs ordonnés par id (pagination par clé)
+
+        Chaque bloc est lu avec un curseur côté serveur ; seul le bloc courant
+        est en mémoire. `after_id` (exclu) et `until_id` (inclus) permettent
+        de reprendre ou de découper un export.
+        """
+        model, columns = ExportService.TABLES[table]
+        chunk_size = max(1, min(chunk_size or ExportService.DEFAULT_CHUNK_SIZE, ExportService.MAX_CHUNK_SIZE))
+        last_id = after_id or 0
+
+        while True:
+            query = db.session.query(*columns).filter(model.id > last_id)
+            if until_id is not None:
+                query = query.filter(model.id <= until_id)
+            result = query.order_by(model.id).limit(chunk_size).execution_options(
+                stream_results=True, yield_per=chunk_size
+            )
+
+            chunk = [ExportService._serialize(row, columns) for row in result]
+            if not chunk:
+                return
+            yield chunk
+            last_id = chunk[-1]['id']
+            if len(chunk) < chunk_size:
+                return
+
+    @staticmethod
+    def _ndjson_blocks(tables, start, after_id, until_id, chunk_size):
+        """Produit un bloc NDJSON par bloc de lignes lu, chaque ligne portant sa table
+
+        `after_id` ne s'applique qu'à la table de reprise `tables[start]`.
+        """
+        for index in range(start, len(tables)):
+            table = tables[index]
+            table_after_id = after_id if index == start else None
+            for chunk in ExportService.iter_chunks(table, table_after_id, until_id, chunk_size):
+                lines = [
+                    json.dumps(dict(table=table, **record), ensure_ascii=False)
+                    for record in chunk
+                ]
+                yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+    @staticmethod
+    def _csv_blocks(table, after_id, until_id, chunk_size):
+        """Produit l'en-tête puis un bloc CSV par bloc de lignes lu"""
+        _, columns = ExportService.TABLES[table]
+        fieldnames = [c.key for c in columns]
+        if table == 'users':
+            fieldnames.append('age')
+
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+        writer.writeheader()
+        for chunk in ExportService.iter_chunks(table, after_id, until_id, chunk_size):
+            writer.writerows(chunk)
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate(0)
+        if buffer.tell():
+            yield buffer.getvalue().encode('utf-8')
+
+    @staticmethod
+    def stream(tables=None, format='ndjson', compress=False, after_id=None, until_id=None, chunk_size=None):
+        """Génère l'export sous forme de blocs d'octets prêts à être envoyés
+
+        Le CSV n'accepte qu'une seule table (un en-tête par fichier). Voir
+        parse_cursor pour la reprise d'un export multi-tables.
+        """
+        tables = ExportService.parse_tables(tables)
+        if format not in ExportService.FORMATS:
+            raise ValueError(f"Format non supporté: {format}")
+        if format == 'csv' and len(tables) != 1:
+            raise ValueError("L'export CSV nécessite exactement une table")
+        if chunk_size is not None and chunk_size < 1:
+            raise ValueError("chunk_size doit être un entier positif")
+        start, after_id = ExportService.parse_cursor(after_id, until_id, tables)
+
+        if format == 'csv':
+            blocks = ExportService._csv_blocks(tables[0], after_id, until_id, chunk_size)
+        else:
+            blocks = ExportService._ndjson_blocks(tables, start, after_id, until_id, chunk_size)
+
+        if not compress:
+            return blocks
+        return ExportService._gzip(blocks)
+
+    @staticmethod
+    def _gzip(blocks):
+        """Compresse un flux de blocs au format gzip, de façon incrémentale"""
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for block in blocks:
+            data = compressor.compress(block)
+            if data:
+                yield data
+        yield compressor.flush()
@@ -3,13 +3,14 @@ Extensions Flask pour l'application Meet
 Initialise toutes les extensions nécessaires
 """
 
-from flask import Flask
+from flask import Flask, has_request_context, request
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_wtf.csrf import CSRFProtect, generate_csrf
 from flask_migrate import Migrate
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
+from .image_pipeline import UploadRequest
 import logging
 from datetime import datetime, timezone
 import os
@@ -30,10 +31,8 @@ db = SQLAlchemy()
 login_manager = LoginManager()
 csrf = CSRFProtect()
 migrate = Migrate()
-limiter = Limiter(
-    key_func=get_remote_address,
-    default_limits=["500 per day", "200 per hour"]
-)
+# Limiteur unique ; limites par défaut, stockage et stratégie : voir rate_limit_config
+limiter = Limiter(key_func=get_remote_address)
 
 
 def init_extensions(app):
@@ -46,19 +45,23 @@ def init_extensions(app):
         app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     
     # Configuration des uploads
-    app.config['UPLOAD_FOLDER'] = 'static/uploads'
+    app.config.setdefault('UPLOAD_FOLDER', os.getenv('UPLOAD_FOLDER', 'static/uploads'))
     app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB
     app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg', 'gif'}
     
     # Créer le dossier uploads s'il n'existe pas
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     
+    # Photos reçues écrites directement sur disque avec contrôles de taille et de signature
+    app.request_class = UploadRequest
+    
     # Initialiser les extensions
     db.init_app(app)
     login_manager.init_app(app)
     csrf.init_app(app)
     migrate.init_app(app, db)
-    limiter.init_app(app)
+    from rate_limit_config import configure_rate_limiter
+    configure_rate_limiter(app)
     
     # Configuration de Flask-Login
     login_manager.login_view = 'login'
@@ -71,9 +74,12 @@ def init_extensions(app):
     # Définir le user_loader
     @login_manager.user_loader
     def load_user(user_id):
-        from .models import User
+        from .user_cache import UserCache, CACHED_METHODS
         try:
-            return User.query.get(int(user_id))
+            # Colonnes d'authentification seulement, en cache quelques secondes
+            # pour les lectures ; relues en base pour les requêtes qui modifient
+            fresh = has_request_context() and request.method not in CACHED_METHODS
+            return UserCache.load(int(user_id), fresh=fresh)
         except Exception as e:
             logger.error(f"Erreur lors du chargement de l'utilisateur {user_id}: {e}")
             return None
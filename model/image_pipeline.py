@@ -0,0 +1,587 @@
+"""
+Traitement asynchrone des photos de profil
+Le fichier brut est stocké immédiatement, le décodage et l'encodage
+sont délégués à un pool de processus
+"""
+
+import hashlib
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import Request, current_app, has_request_context, url_for
+from markupsafe import Markup, escape
+from PIL import Image, features
+
+from .storage import create_storage, get_storage, storage_config
+from .metrics import PHOTO_PROCESSING_SECONDS
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Statuts de traitement des photos d'un utilisateur
+PHOTO_STATUS_READY = 'ready'
+PHOTO_STATUS_PROCESSING = 'processing'
+PHOTO_STATUS_FAILED = 'failed'
+
+# Sous-dossier des fichiers bruts en attente de traitement
+RAW_SUBFOLDER = 'raw'
+
+# Image affichée tant que le traitement n'est pas terminé
+PLACEHOLDER_PHOTO = 'img/photo-processing.svg'
+
+# Déclinaisons générées pour chaque photo (côté le plus long, en pixels)
+RENDITION_SIZES = (64, 160, 400, 800)
+MAX_PHOTO_SIZE = (RENDITION_SIZES[-1], RENDITION_SIZES[-1])
+
+# Formats modernes disponibles avec ce build de Pillow, du plus compact au moins compact ;
+# le JPEG reste toujours généré en repli
+MODERN_FORMATS = tuple(fmt for fmt in ('avif', 'webp') if features.check(fmt))
+
+# Format -> (extension, type MIME, options d'encodage Pillow)
+ENCODINGS = {
+    'avif': ('avif', 'image/avif', {'quality': 60, 'speed': 6}),
+    'webp': ('webp', 'image/webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('jpg', 'image/jpeg', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+DEFAULT_IMAGE_WORKERS = 2
+
+# Taille maximale d'une photo reçue (octets)
+DEFAULT_MAX_PHOTO_BYTES = 10 * 1024 * 1024
+
+# Formats acceptés, reconnus par leurs premiers octets
+ACCEPTED_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+SNIFF_BYTES = 12
+
+# Routes dont les fichiers reçus sont des photos, écrits directement dans le dossier brut
+IMAGE_UPLOAD_ENDPOINTS = {'register', 'api_upload_photo'}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Stockage utilisé dans un processus du pool (créé à la première photo)
+_worker_storage = None
+
+# Nombre de soumissions d'un traitement perdu avant abandon
+MAX_PHOTO_ATTEMPTS = 3
+DEFAULT_PHOTO_TIMEOUT_MINUTES = 15
+
+# Présence des déclinaisons mémorisée par processus (secondes) ; une absence est
+# revérifiée plus tôt, les déclinaisons pouvant être publiées par un autre worker
+RENDITION_CACHE_SECONDS = 60
+RENDITION_CACHE_MISS_SECONDS = 5
+RENDITION_CACHE_SIZE = 4096
+
+
+def sniff_image_format(header):
+    """Format d'image d'après les premiers octets du fichier, None si non reconnu"""
+    if header.startswith(b'\xff\xd8\xff'):
+        return 'JPEG'
+    if header.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'PNG'
+    if header[:6] in (b'GIF87a', b'GIF89a'):
+        return 'GIF'
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'WEBP'
+    return None
+
+
+class UploadSpool:
+    """Fichier de réception d'une photo, écrit au fil de l'eau dans le dossier brut
+
+    Le format est vérifié sur les premiers octets et la taille à chaque
+    bloc : dès qu'une limite est franchie, le fichier est tronqué et la
+    suite du corps est ignorée au lieu d'être stockée. L'empreinte SHA-256
+    est calculée pendant l'écriture.
+    """
+
+    def __init__(self, folder, max_bytes, declared_length=None):
+        fd, self.path = tempfile.mkstemp(suffix='.upload', dir=folder)
+        self._file = os.fdopen(fd, 'w+b')
+        self._digest = hashlib.sha256()
+        self._header = b''
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.image_format = None
+        self.rejected = None
+        self.claimed = False
+        if declared_length and declared_length > max_bytes:
+            self._reject(f"Fichier trop volumineux: {declared_length} bytes")
+
+    def _reject(self, reason):
+        self.rejected = reason
+        self._file.seek(0)
+        self._file.truncate()
+
+    def write(self, data):
+        if self.rejected:
+            return len(data)
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            self._reject(f"Fichier trop volumineux: plus de {self.max_bytes} bytes")
+            return len(data)
+        if self.image_format is None:
+            self._header += data[:SNIFF_BYTES]
+            if len(self._header) >= SNIFF_BYTES:
+                self.image_format = sniff_image_format(self._header)
+                if self.image_format is None:
+                    self._reject("Signature de fichier non reconnue")
+                    return len(data)
+        self._digest.update(data)
+        return self._file.write(data)
+
+    def claim(self):
+        """Transfère le fichier au pipeline ; retourne (chemin, SHA-256 hexadécimal)
+
+        Le fichier n'est plus supprimé à la fermeture.
+        """
+        if self.rejected:
+            raise ValueError(self.rejected)
+        if self.image_format is None:
+            # Fichier plus court que la signature
+            self.image_format = sniff_image_format(self._header)
+            if self.image_format is None:
+                raise ValueError("Signature de fichier non reconnue")
+        self._file.close()
+        self.claimed = True
+        return self.path, self._digest.hexdigest()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+        if not self.claimed:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def __getattr__(self, name):
+        # read, seek, tell, flush... sont ceux du fichier sous-jacent
+        return getattr(self._file, name)
+
+
+class UploadRequest(Request):
+    """Requête dont les photos reçues sont écrites directement sur disque, avec contrôles en flux"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if self.endpoint not in IMAGE_UPLOAD_ENDPOINTS:
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        return UploadSpool(
+            ImagePipeline.raw_folder(current_app.config['UPLOAD_FOLDER']),
+            current_app.config.get('MAX_PHOTO_BYTES', DEFAULT_MAX_PHOTO_BYTES),
+            declared_length=content_length
+        )
+
+
+def rendition_name(filename, size, fmt='jpeg'):
+    """Nom de fichier d'une déclinaison
+
+    La déclinaison JPEG de taille maximale garde le nom d'origine, ce qui
+    laisse les anciens liens valides.
+    """
+    if fmt == 'jpeg' and size == RENDITION_SIZES[-1]:
+        return filename
+    stem = filename.rsplit('.', 1)[0]
+    return f"{stem}_{size}.{ENCODINGS[fmt][0]}"
+
+
+def rendition_names(filename):
+    """Noms de toutes les déclinaisons d'une photo"""
+    return [rendition_name(filename, size, fmt)
+            for size in RENDITION_SIZES for fmt in MODERN_FORMATS + ('jpeg',)]
+
+
+def process_image(raw_path, dest_path, storage_settings=None, max_size=MAX_PHOTO_SIZE):
+    """Valide une photo et génère toutes ses déclinaisons (exécuté dans un processus du pool)
+
+    Le fichier est ouvert une seule fois : le décodage complet sert de
+    validation. Pour un JPEG, `draft` demande au décodeur une réduction
+    d'échelle (1/2 à 1/8) proche de la taille maximale, ce qui évite de
+    décompresser en mémoire une photo de téléphone en pleine résolution.
+    L'image est ensuite réduite de la plus grande à la plus petite taille.
+    Chaque fichier est écrit sous un nom temporaire puis renommé ; le JPEG
+    principal est renommé en dernier, sa présence signifie donc que toutes
+    les déclinaisons existent. Les fichiers sont ensuite publiés dans le
+    stockage décrit par `storage_settings`. Le fichier brut est supprimé
+    dans tous les cas.
+    """
+    global _worker_storage
+    folder = os.path.dirname(dest_path)
+    filename = os.path.basename(dest_path)
+    written = []
+    try:
+        with Image.open(raw_path) as image:
+            if image.format not in ACCEPTED_FORMATS:
+                raise ValueError(f"Format d'image non autorisé: {image.format}")
+            image.draft('RGB', max_size)
+            image.load()
+            image = image.convert('RGB')
+            image.thumbnail(max_size, Image.Resampling.LANCZOS)
+            for size in sorted(RENDITION_SIZES, reverse=True):
+                image.thumbnail((size, size), Image.Resampling.LANCZOS)
+                for fmt in MODERN_FORMATS + ('jpeg',):
+                    final_path = os.path.join(folder, rendition_name(filename, size, fmt))
+                    tmp_path = f"{final_path}.{os.getpid()}.tmp"
+                    # Sauvegarder avec des métadonnées minimales
+                    image.save(tmp_path, fmt.upper(), **ENCODINGS[fmt][2])
+                    written.append((tmp_path, final_path))
+        written.sort(key=lambda paths: paths[1] == dest_path)
+        for tmp_path, final_path in written:
+            os.replace(tmp_path, final_path)
+        written = []
+        if storage_settings is not None:
+            if _worker_storage is None:
+                _worker_storage = create_storage(storage_settings)
+            # Photo principale en dernier, comme sur disque
+            names = rendition_names(filename)
+            names.sort(key=lambda name: name == filename)
+            _worker_storage.publish(names)
+        forget_renditions(filename)
+        return filename
+    finally:
+        for tmp_path, _ in written:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        try:
+            os.remove(raw_path)
+        except OSError:
+            pass
+
+
+_rendition_cache = {}
+_rendition_cache_lock = threading.Lock()
+
+
+def _has_renditions(storage, filename):
+    """Indique si une photo possède ses déclinaisons (les photos antérieures n'en ont pas)"""
+    now = time.monotonic()
+    cached = _rendition_cache.get(filename)
+    if cached is not None and cached[1] > now:
+        return cached[0]
+    exists = storage.exists(rendition_name(filename, RENDITION_SIZES[0]))
+    with _rendition_cache_lock:
+        if len(_rendition_cache) >= RENDITION_CACHE_SIZE:
+            _rendition_cache.clear()
+        _rendition_cache[filename] = (
+            exists, now + (RENDITION_CACHE_SECONDS if exists else RENDITION_CACHE_MISS_SECONDS)
+        )
+    return exists
+
+
+def forget_renditions(filename):
+    """Oublie la présence mémorisée des déclinaisons d'une photo (publiée ou supprimée)"""
+    with _rendition_cache_lock:
+        _rendition_cache.pop(filename, None)
+
+
+def _static_url(path):
+    if has_request_context():
+        return url_for('static', filename=path)
+    return '/static/' + path
+
+
+def _pick_size(size):
+    """Plus petite déclinaison couvrant la taille demandée"""
+    if size is None:
+        return RENDITION_SIZES[-1]
+    return next((s for s in RENDITION_SIZES if s >= size), RENDITION_SIZES[-1])
+
+
+def _photo_filename(user, kind):
+    return user.second_photo if kind == 'second' else user.profile_photo
+
+
+def _renditions_ready(user, kind):
+    """Nom de la photo si ses déclinaisons sont disponibles, sinon None"""
+    filename = _photo_filename(user, kind)
+    if (not filename or user.photo_status == PHOTO_STATUS_PROCESSING
+            or not _has_renditions(get_storage(), filename)):
+        return None
+    return filename
+
+
+def photo_url(user, kind='profile', size=None, fmt='jpeg'):
+    """URL de la déclinaison adaptée à `size` pixels d'affichage
+
+    Retourne le visuel d'attente pendant le traitement, et None si
+    l'utilisateur n'a pas de photo de ce type.
+    """
+    filename = _photo_filename(user, kind)
+    if not filename:
+        return None
+    if user.photo_status == PHOTO_STATUS_PROCESSING:
+        return _static_url(PLACEHOLDER_PHOTO)
+    storage = get_storage()
+    if not _has_renditions(storage, filename):
+        return storage.url(filename)
+    return storage.url(rendition_name(filename, _pick_size(size), fmt))
+
+
+def photo_renditions(user, kind='profile'):
+    """Toutes les déclinaisons d'une photo par format puis par taille, pour les API JSON
+
+    Retourne None tant que la photo n'est pas disponible en plusieurs tailles.
+    """
+    filename = _renditions_ready(user, kind)
+    if not filename:
+        return None
+    storage = get_storage()
+    return {
+        fmt: {str(size): storage.url(rendition_name(filename, size, fmt))
+              for size in RENDITION_SIZES}
+        for fmt in MODERN_FORMATS + ('jpeg',)
+    }
+
+
+def photo_sources(user, size, kind='profile'):
+    """Balises <source> (formats modernes, 1x et 2x) à placer dans un <picture>"""
+    filename = _renditions_ready(user, kind)
+    if not filename:
+        return Markup('')
+    storage = get_storage()
+    sources = []
+    for fmt in MODERN_FORMATS + ('jpeg',):
+        srcset = ', '.join(
+            f"{storage.url(rendition_name(filename, _pick_size(size * density), fmt))} {density}x"
+            for density in (1, 2)
+        )
+        sources.append(f'<source type="{ENCODINGS[fmt][1]}" srcset="{escape(srcset)}">')
+    return Markup(''.join(sources))
+
+
+def _get_executor(workers):
+    """Crée le pool de processus à la première utilisation"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # "spawn" évite de dupliquer les threads (scheduler, pool SQL) du processus parent
+            _executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _executor
+
+
+def shutdown(wait=True):
+    """Arrête le pool de processus"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait)
+            _executor = None
+
+
+class ImagePipeline:
+    """Pipeline d'upload : stockage brut rapide puis traitement en arrière-plan"""
+
+    @staticmethod
+    def raw_folder(upload_folder):
+        """Dossier des fichiers bruts, créé si nécessaire"""
+        folder = os.path.join(upload_folder, RAW_SUBFOLDER)
+        os.makedirs(folder, exist_ok=True)
+        return folder
+
+    @staticmethod
+    def store_raw(file, upload_folder, chunk_size=64 * 1024):
+        """Écrit le fichier reçu tel quel sur disque en calculant son empreinte
+
+        Retourne (chemin du fichier brut, SHA-256 hexadécimal du contenu).
+        """
+        digest = hashlib.sha256()
+        fd, raw_path = tempfile.mkstemp(suffix='.upload', dir=ImagePipeline.raw_folder(upload_folder))
+        try:
+            file.seek(0)
+            with os.fdopen(fd, 'wb') as raw:
+                for chunk in iter(lambda: file.read(chunk_size), b''):
+                    digest.update(chunk)
+                    raw.write(chunk)
+        except Exception:
+            try:
+                os.remove(raw_path)
+            except OSError:
+                pass
+            raise
+        return raw_path, digest.hexdigest()
+
+    @staticmethod
+    def is_processed(storage, filename):
+        """Indique si une photo a déjà été traitée (déduplication)"""
+        return storage.exists(filename)
+
+    @staticmethod
+    def enqueue(session, app, user_id, photo_type, raw_path, dest_path):
+        """Enregistre un traitement dans la session SQL courante
+
+        Le traitement n'est lancé qu'après le commit, pour que le nom du
+        fichier et le statut "processing" soient visibles du callback. La
+        ligne photo_job permet de le reprendre si le worker est perdu ; elle
+        garde une référence vers la photo remplacée pour pouvoir la rétablir
+        en cas d'échec.
+        """
+        from .models import User, PhotoJob
+        from .photo_service import PhotoService
+
+        user = session.get(User, user_id)
+        previous = (user.second_photo if photo_type == 'second' else user.profile_photo) if user else None
+        job = PhotoJob(
+            user_id=user_id, photo_type=photo_type, filename=os.path.basename(dest_path),
+            raw_path=raw_path, previous_photo=previous
+        )
+        session.add(job)
+        PhotoService.acquire(previous)
+        session.flush()
+        session.info.setdefault('pending_photo_jobs', []).append(
+            (app, job.id, raw_path, dest_path)
+        )
+
+    @staticmethod
+    def submit(app, job_id, raw_path, dest_path):
+        """Soumet une photo au pool et met à jour l'utilisateur à la fin"""
+        started = time.perf_counter()
+        try:
+            executor = _get_executor(app.config.get('IMAGE_WORKERS', DEFAULT_IMAGE_WORKERS))
+            future = executor.submit(process_image, raw_path, dest_path, storage_config(app.config))
+        except Exception as e:
+            ImagePipeline._finish(app, job_id, e)
+            return
+
+        def done(f):
+            error = f.exception()
+            PHOTO_PROCESSING_SECONDS.labels('error' if error else 'ok').observe(time.perf_counter() - started)
+            ImagePipeline._finish(app, job_id, error)
+
+        future.add_done_callback(done)
+
+    @staticmethod
+    def _finish(app, job_id, error):
+        """Enregistre le résultat du traitement sur l'utilisateur
+
+        Sans effet si le traitement a déjà été clos (reprise concurrente,
+        utilisateur supprimé). Le statut ne repasse à "ready" que lorsque
+        toutes les photos envoyées ensemble sont traitées.
+        """
+        from .database import db
+
+        with app.app_context():
+            try:
+                ImagePipeline._close_job(job_id, error)
+            finally:
+                db.session.remove()
+
+    @staticmethod
+    def _close_job(job_id, error):
+        from .database import db
+        from .models import User, PhotoJob
+        from .photo_service import PhotoService
+
+        try:
+            job = db.session.get(PhotoJob, job_id)
+            if job is None:
+                return
+            # Suppression conditionnelle : un seul processus clôt le traitement
+            if not PhotoJob.query.filter_by(id=job_id).delete(synchronize_session=False):
+                db.session.rollback()
+                return
+
+            user = db.session.get(User, job.user_id)
+            column = 'second_photo' if job.photo_type == 'second' else 'profile_photo'
+            if user is not None:
+                if error is not None:
+                    logger.error(f"Fichier image invalide pour l'utilisateur {job.user_id}: {error}")
+                    # Ne pas laisser pointer le profil vers un fichier qui n'existera pas
+                    if getattr(user, column) == job.filename:
+                        PhotoService.assign(user, job.photo_type, job.previous_photo)
+                    user.photo_status = PHOTO_STATUS_FAILED
+                else:
+                    remaining = PhotoJob.query.filter_by(user_id=job.user_id).count()
+                    if remaining == 0 and user.photo_status != PHOTO_STATUS_FAILED:
+                        user.photo_status = PHOTO_STATUS_READY
+                    # Publiées par un processus du pool : une absence a pu être mémorisée ici
+                    forget_renditions(job.filename)
+                    logger.info(f"Photo traitée avec succès: {job.filename}")
+            PhotoService.release(job.previous_photo)
+            db.session.commit()
+        except Exception as e:
+            logger.error(f"Erreur lors de la mise à jour du statut photo: {e}")
+            db.session.rollback()
+
+    @staticmethod
+    def recover_stalled(app, timeout_minutes=DEFAULT_PHOTO_TIMEOUT_MINUTES, max_attempts=MAX_PHOTO_ATTEMPTS):
+        """Reprend les traitements sans résultat depuis `timeout_minutes` (tâche planifiée)
+
+        Un traitement est perdu si le processus s'arrête entre le commit et
+        la soumission, si un processus du pool est tué ou si le pool est
+        inutilisable. Selon l'état des fichiers, le traitement est clos avec
+        succès (photo déjà publiée), soumis à nouveau (fichier brut présent),
+        ou clos en échec : la photo précédente est alors rétablie.
+        Retourne le nombre de traitements repris.
+        """
+        from .database import db
+        from .extensions import get_timezone_aware_datetime
+        from .models import PhotoJob
+
+        cutoff = get_timezone_aware_datetime() - timedelta(minutes=timeout_minutes)
+        recovered = 0
+        with app.app_context():
+            try:
+                stalled = db.session.query(
+                    PhotoJob.id, PhotoJob.filename, PhotoJob.raw_path, PhotoJob.attempts
+                ).filter(PhotoJob.started_at < cutoff).order_by(PhotoJob.id).all()
+                storage = get_storage()
+                for job_id, filename, raw_path, attempts in stalled:
+                    # Réservation conditionnelle : un seul worker reprend chaque traitement
+                    claimed = PhotoJob.query.filter_by(id=job_id, attempts=attempts).update(
+                        {PhotoJob.attempts: attempts + 1,
+                         PhotoJob.started_at: get_timezone_aware_datetime()},
+                        synchronize_session=False
+                    )
+                    db.session.commit()
+                    if not claimed:
+                        continue
+                    recovered += 1
+                    if ImagePipeline.is_processed(storage, filename):
+                        logger.warning(f"Traitement photo {job_id} perdu après publication, clos")
+                        ImagePipeline._close_job(job_id, None)
+                    elif os.path.exists(raw_path) and attempts < max_attempts:
+                        logger.warning(f"Traitement photo {job_id} perdu, nouvelle tentative")
+                        ImagePipeline.submit(app, job_id, raw_path, os.path.join(storage.local_folder, filename))
+                    else:
+                        ImagePipeline._close_job(job_id, RuntimeError("traitement perdu"))
+                        try:
+                            os.remove(raw_path)
+                        except OSError:
+                            pass
+            except Exception as e:
+                logger.error(f"Erreur lors de la reprise des traitements photo: {e}")
+                db.session.rollback()
+            finally:
+                db.session.remove()
+        return recovered
+
+
+@event.listens_for(Session, 'after_commit')
+def _dispatch_pending_jobs(session):
+    """Lance les traitements mis en attente une fois la transaction validée"""
+    jobs = session.info.pop('pending_photo_jobs', None)
+    for job in jobs or ():
+        ImagePipeline.submit(*job)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending_jobs(session):
+    """Abandonne les traitements d'une transaction annulée et leurs fichiers bruts"""
+    jobs = session.info.pop('pending_photo_jobs', None)
+    for job in jobs or ():
+        try:
+            os.remove(job[2])
+        except OSError:
+            pass
@@ -0,0 +1,178 @@
+"""
+Métriques Prometheus de l'application Meet
+Latence des requêtes, pool de connexions, requêtes SQL, caches, activité
+(likes, matches, messages), nettoyages et traitement des photos
+
+Sous gunicorn, définir PROMETHEUS_MULTIPROC_DIR (voir gunicorn.conf.py) :
+chaque worker écrit ses valeurs dans ce dossier et /metrics les agrège.
+"""
+
+import logging
+import os
+import time
+from contextlib import ContextDecorator
+from flask import Response, request
+
+try:
+    import prometheus_client
+    from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram
+    from prometheus_client import generate_latest, multiprocess
+except ImportError:  # dépendance optionnelle, requise uniquement pour /metrics
+    prometheus_client = None
+    Counter = Gauge = Histogram = None
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+PHOTO_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class _NoopMetric(ContextDecorator):
+    """Métrique sans effet, utilisée quand prometheus_client n'est pas installé"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def observe(self, value):
+        pass
+
+    def time(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def _metric(kind, name, documentation, labelnames=(), **options):
+    if prometheus_client is None:
+        return _NoopMetric()
+    return kind(name, documentation, labelnames, **options)
+
+
+def multiprocess_enabled():
+    return prometheus_client is not None and bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+
+# Requêtes HTTP
+REQUEST_LATENCY = _metric(Histogram, 'meet_http_request_duration_seconds',
+                          "Durée de traitement des requêtes HTTP", ('endpoint', 'method'),
+                          buckets=LATENCY_BUCKETS)
+REQUESTS_TOTAL = _metric(Counter, 'meet_http_requests_total',
+                         "Requêtes HTTP traitées", ('endpoint', 'method', 'status'))
+
+# Base de données
+DB_QUERIES = _metric(Histogram, 'meet_db_queries_per_request',
+                     "Nombre de requêtes SQL par requête HTTP", ('endpoint',), buckets=QUERY_COUNT_BUCKETS)
+DB_TIME = _metric(Histogram, 'meet_db_time_per_request_seconds',
+                  "Temps passé en base par requête HTTP", ('endpoint',), buckets=LATENCY_BUCKETS)
+DB_POOL_CHECKED_OUT = _metric(Gauge, 'meet_db_pool_checked_out',
+                              "Connexions SQL empruntées au pool", multiprocess_mode='livesum')
+DB_POOL_SIZE = _metric(Gauge, 'meet_db_pool_size',
+                       "Taille du pool de connexions SQL", multiprocess_mode='livesum')
+DB_POOL_OVERFLOW = _metric(Gauge, 'meet_db_pool_overflow',
+                           "Connexions SQL ouvertes au-delà de la taille du pool", multiprocess_mode='livesum')
+
+# Caches
+CACHE_REQUESTS = _metric(Counter, 'meet_cache_requests_total',
+                         "Consultations des caches (hit ou miss)", ('cache', 'result'))
+
+# Activité
+LIKES_TOTAL = _metric(Counter, 'meet_likes_total', "Likes créés")
+MATCHES_TOTAL = _metric(Counter, 'meet_matches_total', "Matches créés")
+MESSAGES_TOTAL = _metric(Counter, 'meet_messages_total', "Messages envoyés")
+
+# Nettoyages
+CLEANUP_DELETED_ROWS = _metric(Counter, 'meet_cleanup_deleted_rows_total',
+                               "Lignes supprimées par les nettoyages de données expirées", ('table',))
+
+# Photos
+PHOTO_SAVE_SECONDS = _metric(Histogram, 'meet_photo_save_seconds',
+                             "Durée de save_photo dans la requête", buckets=PHOTO_BUCKETS)
+PHOTO_PROCESSING_SECONDS = _metric(Histogram, 'meet_photo_processing_seconds',
+                                   "Durée du traitement d'une photo (attente comprise)", ('result',),
+                                   buckets=PHOTO_BUCKETS)
+
+
+def cache_lookup(cache, hit):
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def record_cleanup(table, deleted):
+    if deleted:
+        CLEANUP_DELETED_ROWS.labels(table).inc(deleted)
+
+
+def _update_pool_gauges(engine):
+    pool = engine.pool
+    if hasattr(pool, 'checkedout'):
+        DB_POOL_CHECKED_OUT.set(pool.checkedout())
+    if hasattr(pool, 'size'):
+        DB_POOL_SIZE.set(pool.size())
+    if hasattr(pool, 'overflow'):
+        DB_POOL_OVERFLOW.set(max(pool.overflow(), 0))
+
+
+def render_metrics():
+    """Corps et type de contenu de /metrics, agrégés sur tous les workers en mode multiprocessus"""
+    if prometheus_client is None:
+        return None, None
+    if multiprocess_enabled():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def metrics_response():
+    body, content_type = render_metrics()
+    if body is None:
+        return Response("prometheus_client n'est pas installé (pip install prometheus-client)\n",
+                        status=503, mimetype='text/plain')
+    return Response(body, content_type=content_type)
+
+
+def init_metrics(app):
+    """Mesure la latence, le statut et les requêtes SQL de chaque requête HTTP"""
+    app.config.setdefault('METRICS_TOKEN', os.getenv('METRICS_TOKEN'))
+    if prometheus_client is None:
+        logger.info("prometheus_client absent : métriques désactivées")
+        return
+    from .database import db
+
+    @app.before_request
+    def start_request_timer():
+        request.environ['meet.request_start'] = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = request.environ.get('meet.request_start')
+        if started is None:
+            return response
+        endpoint = request.endpoint or 'not_found'
+        REQUEST_LATENCY.labels(endpoint, request.method).observe(time.perf_counter() - started)
+        REQUESTS_TOTAL.labels(endpoint, request.method, str(response.status_code)).inc()
+
+        active = request.environ.get('meet.query_stats')
+        if active is not None:
+            stats = active[0]
+            DB_QUERIES.labels(endpoint).observe(stats.count)
+            DB_TIME.labels(endpoint).observe(stats.total_seconds)
+            if stats.count:
+                _update_pool_gauges(db.engine)
+        return response
+
+    logger.info(f"Métriques Prometheus activées{' (multiprocessus)' if multiprocess_enabled() else ''}")
@@ -5,8 +5,9 @@ Relations entre les différentes entités
 
 from .database import db
 from .extensions import get_timezone_aware_datetime
+from .image_pipeline import photo_url, photo_renditions
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from .password_service import PasswordService, PasswordServiceBusy
 from datetime import datetime, timezone
 import logging
 
@@ -29,6 +30,8 @@ class User(UserMixin, db.Model):
     bio = db.Column(db.Text)
     profile_photo = db.Column(db.String(255))
     second_photo = db.Column(db.String(255))
+    # Traitement des photos : ready, processing ou failed
+    photo_status = db.Column(db.String(20), default='ready', server_default='ready', nullable=False)
     is_active = db.Column(db.Boolean, default=True)
     is_verified = db.Column(db.Boolean, default=False)
     is_admin = db.Column(db.Boolean, default=False)
@@ -50,6 +53,10 @@ class User(UserMixin, db.Model):
     __table_args__ = (
         db.Index('idx_user_search', 'city', 'gender', 'interested_in'),
         db.Index('idx_user_active', 'is_active', 'created_at'),
+        # Pagination par clé (created_at, id) et recherche par préfixe dans l'admin
+        db.Index('idx_user_created_id', 'created_at', 'id'),
+        db.Index('idx_user_first_name', 'first_name'),
+        db.Index('idx_user_last_name', 'last_name'),
     )
     
     @property
@@ -69,21 +76,26 @@ class User(UserMixin, db.Model):
         return f"{self.first_name} {self.last_name}"
     
     def set_password(self, password):
-        """Définit le mot de passe hashé"""
-        self.password_hash = generate_password_hash(password)
+        """Définit le mot de passe hashé (calculé dans le pool de PasswordService)"""
+        self.password_hash = PasswordService.hash(password)
     
     def check_password(self, password):
-        """Vérifie le mot de passe"""
+        """Vérifie le mot de passe ; peut lever PasswordServiceBusy en cas de surcharge
+
+        Un re-hachage éventuel est laissé dans la session, sans commit.
+        """
         try:
-            return check_password_hash(self.password_hash, password)
+            return PasswordService.verify(self, password)
+        except PasswordServiceBusy:
+            raise
         except Exception as e:
             logger.error(f"Erreur de vérification du mot de passe pour l'utilisateur {self.id}: {e}")
             return False
     
     def update_last_active(self):
-        """Met à jour la date de dernière activité"""
-        self.last_active = get_timezone_aware_datetime()
-        db.session.commit()
+        """Enregistre une activité ; la date est écrite par lots (voir ActivityTracker)"""
+        from .activity_tracker import ActivityTracker
+        ActivityTracker.touch(self.id)
     
     def to_dict(self):
         """Convertit l'utilisateur en dictionnaire pour l'API"""
@@ -97,6 +109,11 @@ class User(UserMixin, db.Model):
             'bio': self.bio,
             'profile_photo': self.profile_photo,
             'second_photo': self.second_photo,
+            'photo_status': self.photo_status,
+            'profile_photo_url': photo_url(self),
+            'second_photo_url': photo_url(self, 'second'),
+            'profile_photo_renditions': photo_renditions(self),
+            'second_photo_renditions': photo_renditions(self, 'second'),
             'interests': [{'id': i.id, 'name': i.name} for i in self.interests],
             'last_active': self.last_active.isoformat() if self.last_active else None
         }
@@ -253,4 +270,120 @@ class Notification(db.Model):
         pass
     
     def __repr__(self):
-        return f'<Notification {self.id} for user {self.user_id}>'
\ No newline at end of file
+        return f'<Notification {self.id} for user {self.user_id}>'
+
+class AppStat(db.Model):
+    """Compteur agrégé matérialisé pour le tableau de bord d'administration"""
+    __tablename__ = 'app_stat'
+    
+    key = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=get_timezone_aware_datetime, nullable=False)
+    
+    def __repr__(self):
+        return f'<AppStat {self.key}={self.value}>'
+
+
+class DailyActivity(db.Model):
+    """Agrégat journalier d'activité (une ligne par jour et par métrique)"""
+    __tablename__ = 'daily_activity'
+    
+    day = db.Column(db.Date, primary_key=True)
+    metric = db.Column(db.String(32), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=get_timezone_aware_datetime, nullable=False)
+    
+    def __repr__(self):
+        return f'<DailyActivity {self.day} {self.metric}={self.count}>'
+
+
+class UserStats(db.Model):
+    """Compteurs matérialisés par utilisateur pour les classements d'administration"""
+    __tablename__ = 'user_stats'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    matches_count = db.Column(db.Integer, nullable=False, default=0, index=True)
+    likes_received_count = db.Column(db.Integer, nullable=False, default=0, index=True)
+    messages_sent_count = db.Column(db.Integer, nullable=False, default=0, index=True)
+    updated_at = db.Column(db.DateTime, default=get_timezone_aware_datetime, nullable=False)
+    
+    def __repr__(self):
+        return f'<UserStats user_id={self.user_id}>'
+
+
+class AdminJob(db.Model):
+    """Tâche d'administration exécutée en arrière-plan (suivi de progression)"""
+    __tablename__ = 'admin_job'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    job_type = db.Column(db.String(50), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True)  # pending, running, done, failed
+    total = db.Column(db.Integer, nullable=False, default=0)
+    processed = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    rows_deleted = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+    created_by = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, default=get_timezone_aware_datetime, index=True)
+    updated_at = db.Column(db.DateTime, default=get_timezone_aware_datetime, onupdate=get_timezone_aware_datetime)
+    finished_at = db.Column(db.DateTime)
+    
+    @property
+    def progress(self):
+        """Pourcentage d'avancement"""
+        return round(self.processed / self.total * 100, 1) if self.total else 100.0
+    
+    def to_dict(self):
+        """Convertit la tâche en dictionnaire pour l'API"""
+        return {
+            'id': self.id,
+            'type': self.job_type,
+            'status': self.status,
+            'total': self.total,
+            'processed': self.processed,
+            'failed': self.failed,
+            'rows_deleted': self.rows_deleted,
+            'progress': self.progress,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+    
+    def __repr__(self):
+        return f'<AdminJob {self.id} {self.job_type} {self.status}>'
+
+
+class PhotoBlob(db.Model):
+    """Fichier photo adressé par son contenu (SHA-256), partagé entre utilisateurs"""
+    __tablename__ = 'photo_blob'
+    
+    hash = db.Column(db.String(64), primary_key=True)
+    refcount = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=get_timezone_aware_datetime)
+    updated_at = db.Column(db.DateTime, default=get_timezone_aware_datetime, onupdate=get_timezone_aware_datetime)
+    
+    # Recherche des fichiers non référencés par le ramasse-miettes
+    __table_args__ = (
+        db.Index('idx_photo_blob_gc', 'refcount', 'updated_at'),
+    )
+    
+    def __repr__(self):
+        return f'<PhotoBlob {self.hash[:12]} x{self.refcount}>'
+
+
+class PhotoJob(db.Model):
+    """Traitement de photo en attente ou en cours (reprise après la perte d'un worker)"""
+    __tablename__ = 'photo_job'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    photo_type = db.Column(db.String(20), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    raw_path = db.Column(db.String(500), nullable=False)
+    # Photo remplacée, conservée (référence comptée) jusqu'à la fin du traitement
+    previous_photo = db.Column(db.String(255))
+    attempts = db.Column(db.Integer, nullable=False, default=1)
+    started_at = db.Column(db.DateTime, default=get_timezone_aware_datetime, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<PhotoJob {self.id} user={self.user_id} {self.filename}>'
@@ -0,0 +1,115 @@
+"""
+Hachage des mots de passe hors du thread de la requête
+Pool de threads borné, rejet immédiat en cas de surcharge et re-hachage à la connexion
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from functools import lru_cache
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_METHOD = 'scrypt'
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_PENDING = 16
+DEFAULT_TIMEOUT_SECONDS = 10
+
+_executor = None
+_slots = None
+_lock = threading.Lock()
+
+
+class PasswordServiceBusy(RuntimeError):
+    """Trop de hachages en attente : la demande est rejetée sans calculer le hachage"""
+
+
+def _pool():
+    """Pool de hachage et places disponibles, créés à la première utilisation"""
+    global _executor, _slots
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                config = current_app.config
+                workers = config.get('PASSWORD_HASH_WORKERS', DEFAULT_WORKERS)
+                # scrypt et pbkdf2 libèrent le GIL : les threads occupent réellement les cœurs
+                _slots = threading.BoundedSemaphore(config.get('PASSWORD_HASH_MAX_PENDING', DEFAULT_MAX_PENDING))
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+    return _executor, _slots
+
+
+def shutdown(wait=True):
+    """Arrête le pool (tests, rechargement de configuration)"""
+    global _executor, _slots
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait)
+        _executor = None
+        _slots = None
+
+
+@lru_cache(maxsize=8)
+def _method_prefix(method):
+    """Paramètres complets d'une méthode tels qu'écrits dans le hachage ("scrypt:32768:8:1")"""
+    return generate_password_hash('', method=method).split('$', 1)[0]
+
+
+class PasswordService:
+    """Hachage et vérification des mots de passe dans un pool borné"""
+
+    @staticmethod
+    def _run(func, *args):
+        """Exécute un calcul dans le pool ; lève PasswordServiceBusy si la file est pleine"""
+        if current_app.config.get('PASSWORD_HASH_WORKERS', DEFAULT_WORKERS) <= 0:
+            return func(*args)
+        executor, slots = _pool()
+        if not slots.acquire(blocking=False):
+            raise PasswordServiceBusy("File de hachage des mots de passe pleine")
+        try:
+            future = executor.submit(func, *args)
+        except Exception:
+            slots.release()
+            raise
+        # La place est rendue à la fin du calcul, même si la requête a abandonné
+        future.add_done_callback(lambda _: slots.release())
+        try:
+            return future.result(timeout=current_app.config.get('PASSWORD_HASH_TIMEOUT', DEFAULT_TIMEOUT_SECONDS))
+        except FutureTimeoutError:
+            raise PasswordServiceBusy("Délai de hachage du mot de passe dépassé")
+
+    @staticmethod
+    def method():
+        return current_app.config.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD)
+
+    @staticmethod
+    def hash(password):
+        """Hache un mot de passe avec la méthode configurée"""
+        return PasswordService._run(generate_password_hash, password, PasswordService.method())
+
+    @staticmethod
+    def needs_rehash(password_hash):
+        """Indique si un hachage a été produit avec d'autres paramètres que ceux configurés"""
+        return password_hash.split('$', 1)[0] != _method_prefix(PasswordService.method())
+
+    @staticmethod
+    def verify(user, password):
+        """Vérifie le mot de passe d'un utilisateur
+
+        Si le mot de passe est correct mais haché avec d'anciens paramètres,
+        le nouveau hachage est affecté à l'utilisateur sans être validé :
+        c'est à l'appelant de faire le commit, avec le reste de sa transaction.
+        """
+        if not user.password_hash:
+            return False
+        if not PasswordService._run(check_password_hash, user.password_hash, password):
+            return False
+        if PasswordService.needs_rehash(user.password_hash):
+            try:
+                user.password_hash = PasswordService.hash(password)
+                logger.info(f"Mot de passe re-haché pour l'utilisateur {user.id}")
+            except PasswordServiceBusy:
+                # Le re-hachage sera fait à une prochaine connexion
+                pass
+        return True
@@ -0,0 +1,191 @@
+"""
+Stockage des photos adressé par le contenu
+Comptage des références en base et ramasse-miettes des fichiers orphelins
+"""
+
+import logging
+import os
+import re
+from datetime import timedelta
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from .database import db
+from .models import User, PhotoBlob, PhotoJob
+from .extensions import get_timezone_aware_datetime
+from .image_pipeline import ENCODINGS, RENDITION_SIZES, RAW_SUBFOLDER, forget_renditions, rendition_name
+from .storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+# Nom d'une photo adressée par son contenu : "<sha256>.jpg"
+CONTENT_HASH_FILENAME = re.compile(r'^([0-9a-f]{64})\.jpg$')
+
+# Nom d'un fichier du dossier uploads : photo principale ou déclinaison "<base>_<taille>.<ext>"
+UPLOAD_FILENAME = re.compile(
+    r'^(?P<stem>.+?)(?:_(?:%s))?\.(?:%s)$' % (
+        '|'.join(str(size) for size in RENDITION_SIZES),
+        '|'.join(ext for ext, _, _ in ENCODINGS.values())
+    )
+)
+
+DEFAULT_GC_GRACE_HOURS = 24
+GC_BATCH_SIZE = 500
+
+
+class PhotoService:
+    """Références des utilisateurs vers les photos et nettoyage des fichiers"""
+
+    @staticmethod
+    def content_hash(filename):
+        """Empreinte d'une photo adressée par son contenu, None pour les anciens noms"""
+        match = CONTENT_HASH_FILENAME.match(filename or '')
+        return match.group(1) if match else None
+
+    @staticmethod
+    def acquire(filename):
+        """Ajoute une référence vers une photo (crée l'entrée au premier usage)"""
+        digest = PhotoService.content_hash(filename)
+        if not digest:
+            return
+        updated = PhotoBlob.query.filter_by(hash=digest).update(
+            {PhotoBlob.refcount: PhotoBlob.refcount + 1,
+             PhotoBlob.updated_at: get_timezone_aware_datetime()},
+            synchronize_session=False
+        )
+        if updated:
+            return
+        try:
+            with db.session.begin_nested():
+                db.session.add(PhotoBlob(hash=digest, refcount=1))
+        except IntegrityError:
+            # Créée entre-temps par une requête concurrente
+            PhotoBlob.query.filter_by(hash=digest).update(
+                {PhotoBlob.refcount: PhotoBlob.refcount + 1,
+                 PhotoBlob.updated_at: get_timezone_aware_datetime()},
+                synchronize_session=False
+            )
+
+    @staticmethod
+    def release(filename):
+        """Retire une référence vers une photo ; les fichiers sont supprimés par le ramasse-miettes"""
+        digest = PhotoService.content_hash(filename)
+        if not digest:
+            return
+        PhotoBlob.query.filter(PhotoBlob.hash == digest, PhotoBlob.refcount > 0).update(
+            {PhotoBlob.refcount: PhotoBlob.refcount - 1,
+             PhotoBlob.updated_at: get_timezone_aware_datetime()},
+            synchronize_session=False
+        )
+
+    @staticmethod
+    def assign(user, photo_type, filename):
+        """Remplace une photo de l'utilisateur en tenant les compteurs de références à jour
+
+        Ne valide pas la transaction.
+        """
+        column = 'second_photo' if photo_type == 'second' else 'profile_photo'
+        previous = getattr(user, column)
+        if previous == filename:
+            return
+        setattr(user, column, filename)
+        PhotoService.acquire(filename)
+        PhotoService.release(previous)
+
+    @staticmethod
+    def release_user(user):
+        """Retire les références d'un utilisateur supprimé, y compris celles de ses traitements en cours"""
+        PhotoService.release(user.profile_photo)
+        PhotoService.release(user.second_photo)
+        for job in PhotoJob.query.filter_by(user_id=user.id).all():
+            PhotoService.release(job.previous_photo)
+            db.session.delete(job)
+
+    @staticmethod
+    def _remove_files(storage, filename):
+        """Supprime une photo et toutes ses déclinaisons ; retourne le nombre de fichiers supprimés"""
+        names = {rendition_name(filename, size, fmt) for size in RENDITION_SIZES for fmt in ENCODINGS}
+        removed = sum(1 for name in names if storage.delete(name))
+        forget_renditions(filename)
+        return removed
+
+    @staticmethod
+    def collect_garbage(grace_hours=DEFAULT_GC_GRACE_HOURS):
+        """Supprime les photos qui ne sont plus référencées
+
+        Deux passes :
+        - les photos adressées par contenu dont le compteur est à zéro depuis
+          plus de `grace_hours` ;
+        - les fichiers qui ne sont référencés ni par un utilisateur ni par
+          photo_blob (ancien nommage aléatoire, traitements abandonnés).
+
+        Retourne le nombre de fichiers supprimés.
+        """
+        storage = get_storage()
+        cutoff = get_timezone_aware_datetime() - timedelta(hours=grace_hours)
+        removed = 0
+
+        while True:
+            digests = [row.hash for row in db.session.query(PhotoBlob.hash).filter(
+                PhotoBlob.refcount <= 0, PhotoBlob.updated_at < cutoff
+            ).limit(GC_BATCH_SIZE)]
+            if not digests:
+                break
+            for digest in digests:
+                # La condition sur le compteur protège d'une réutilisation concurrente
+                deleted = PhotoBlob.query.filter(
+                    PhotoBlob.hash == digest, PhotoBlob.refcount <= 0
+                ).delete(synchronize_session=False)
+                db.session.commit()
+                if deleted:
+                    removed += PhotoService._remove_files(storage, f"{digest}.jpg")
+            if len(digests) < GC_BATCH_SIZE:
+                break
+
+        removed += PhotoService._sweep_legacy_files(storage, cutoff.timestamp())
+        if removed:
+            logger.info(f"Ramasse-miettes des photos: {removed} fichiers supprimés")
+        return removed
+
+    @staticmethod
+    def _sweep_legacy_files(storage, cutoff_ts):
+        """Supprime les fichiers non référencés et absents de photo_blob, et les fichiers bruts abandonnés"""
+        referenced = set()
+        for profile_photo, second_photo in db.session.query(User.profile_photo, User.second_photo):
+            referenced.update(name for name in (profile_photo, second_photo) if name)
+
+        removed = 0
+        tracked = {}
+        for name, modified in storage.iter_files():
+            match = UPLOAD_FILENAME.match(name)
+            if not match:
+                continue
+            base = match.group('stem') + '.jpg'
+            if base in referenced:
+                continue
+            digest = PhotoService.content_hash(base)
+            if digest:
+                # Les photos suivies en base sont traitées par la première passe
+                if digest not in tracked:
+                    tracked[digest] = db.session.get(PhotoBlob, digest) is not None
+                if tracked[digest]:
+                    continue
+            if modified < cutoff_ts and storage.delete(name):
+                forget_renditions(base)
+                removed += 1
+
+        # Fichiers bruts abandonnés ; ceux d'un traitement en attente sont
+        # laissés à ImagePipeline.recover_stalled
+        raw_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], RAW_SUBFOLDER)
+        if os.path.isdir(raw_folder):
+            pending = {os.path.basename(row.raw_path) for row in db.session.query(PhotoJob.raw_path)}
+            with os.scandir(raw_folder) as entries:
+                for entry in entries:
+                    if entry.name in pending:
+                        continue
+                    try:
+                        if entry.is_file() and entry.stat().st_mtime < cutoff_ts:
+                            os.remove(entry.path)
+                            removed += 1
+                    except FileNotFoundError:
+                        pass
+        return removed
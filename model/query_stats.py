@@ -0,0 +1,174 @@
+"""
+Instrumentation des requêtes SQL
+Nombre de requêtes, temps passé en base et requêtes les plus lentes pour
+chaque requête HTTP, mesurés via les événements du moteur SQLAlchemy
+"""
+
+import contextvars
+import heapq
+import json
+import logging
+import time
+from contextlib import contextmanager
+from flask import current_app, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SLOW_QUERY_MS = 100
+DEFAULT_QUERY_COUNT_WARNING = 30
+DEFAULT_SLOWEST_KEPT = 3
+STATEMENT_MAX_LENGTH = 300
+
+# Collecteurs actifs dans le contexte courant (requête HTTP, assert_max_queries...)
+_collectors = contextvars.ContextVar('query_stats_collectors', default=())
+_listening = False
+
+
+class QueryStats:
+    """Statistiques SQL d'une requête HTTP ou d'un bloc de code"""
+
+    def __init__(self, slowest_kept=DEFAULT_SLOWEST_KEPT, keep_statements=False):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.slowest_kept = slowest_kept
+        self.slowest = []  # tas (durée, ordre, requête) des requêtes les plus lentes
+        self.statements = [] if keep_statements else None
+
+    def record(self, statement, seconds):
+        self.count += 1
+        self.total_seconds += seconds
+        if self.statements is not None:
+            self.statements.append(statement)
+        entry = (seconds, self.count, statement)
+        if len(self.slowest) < self.slowest_kept:
+            heapq.heappush(self.slowest, entry)
+        elif seconds > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, entry)
+
+    @property
+    def total_ms(self):
+        return self.total_seconds * 1000
+
+    def slowest_statements(self):
+        """Requêtes les plus lentes, de la plus lente à la plus rapide"""
+        return [{'ms': round(seconds * 1000, 2), 'statement': statement}
+                for seconds, _, statement in sorted(self.slowest, reverse=True)]
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _collectors.get():
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    collectors = _collectors.get()
+    starts = conn.info.get('query_start')
+    if not collectors or not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    # Texte seul, sans paramètres (données personnelles)
+    statement = ' '.join(statement.split())[:STATEMENT_MAX_LENGTH]
+    for collector in collectors:
+        collector.record(statement, elapsed)
+
+
+def _listen():
+    """Branche les événements sur tous les moteurs (base principale et connexions dédiées)"""
+    global _listening
+    if not _listening:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        _listening = True
+
+
+@contextmanager
+def collect_queries(**options):
+    """Collecte les requêtes SQL exécutées dans le bloc"""
+    _listen()
+    stats = QueryStats(**options)
+    token = _collectors.set(_collectors.get() + (stats,))
+    try:
+        yield stats
+    finally:
+        _collectors.reset(token)
+
+
+@contextmanager
+def assert_max_queries(max_queries):
+    """Échoue (AssertionError) si le bloc exécute plus de `max_queries` requêtes SQL
+
+    Exemple :
+        with assert_max_queries(5):
+            client.get('/dashboard')
+    """
+    with collect_queries(keep_statements=True) as stats:
+        yield stats
+    if stats.count > max_queries:
+        listing = '\n'.join(f"  {i}. {statement}" for i, statement in enumerate(stats.statements, 1))
+        raise AssertionError(f"{stats.count} requêtes SQL exécutées pour {max_queries} autorisées:\n{listing}")
+
+
+def init_query_stats(app):
+    """Mesure les requêtes SQL de chaque requête HTTP
+
+    En debug (ou QUERY_STATS_HEADERS), les mesures sont ajoutées aux en-têtes de
+    réponse ; sinon les requêtes HTTP trop coûteuses sont journalisées en JSON.
+    QUERY_BUDGET_PER_REQUEST fait échouer les tests qui dépassent ce nombre de requêtes.
+    """
+    if not app.config.get('QUERY_STATS_ENABLED', True):
+        return
+    _listen()
+
+    @app.before_request
+    def start_query_stats():
+        if request.endpoint == 'static':
+            return
+        stats = QueryStats(current_app.config.get('QUERY_STATS_SLOWEST', DEFAULT_SLOWEST_KEPT))
+        request.environ['meet.query_stats'] = (stats, _collectors.set(_collectors.get() + (stats,)))
+
+    @app.after_request
+    def report_query_stats(response):
+        active = request.environ.get('meet.query_stats')
+        if active is None:
+            return response
+        stats = active[0]
+        config = current_app.config
+
+        if config.get('QUERY_STATS_HEADERS', current_app.debug):
+            response.headers['X-DB-Query-Count'] = str(stats.count)
+            response.headers['X-DB-Time-Ms'] = f"{stats.total_ms:.1f}"
+
+        slow_ms = config.get('SLOW_QUERY_MS', DEFAULT_SLOW_QUERY_MS)
+        slowest = stats.slowest_statements()
+        if stats.count > config.get('QUERY_COUNT_WARNING', DEFAULT_QUERY_COUNT_WARNING) or \
+                (slowest and slowest[0]['ms'] >= slow_ms):
+            logger.warning(json.dumps({
+                'event': 'SLOW_DB_REQUEST',
+                'route': request.url_rule.rule if request.url_rule else request.path,
+                'endpoint': request.endpoint,
+                'method': request.method,
+                'status': response.status_code,
+                'queries': stats.count,
+                'db_ms': round(stats.total_ms, 2),
+                'slowest': slowest,
+            }, ensure_ascii=False))
+
+        budget = config.get('QUERY_BUDGET_PER_REQUEST')
+        if budget is not None and stats.count > budget:
+            message = f"{request.method} {request.path}: {stats.count} requêtes SQL pour {budget} autorisées"
+            if current_app.testing:
+                raise AssertionError(message)
+            logger.warning(message)
+        return response
+
+    @app.teardown_request
+    def stop_query_stats(exc):
+        active = request.environ.pop('meet.query_stats', None)
+        if active is not None:
+            try:
+                _collectors.reset(active[1])
+            except ValueError:
+                # Contexte différent (requête terminée dans un autre contexte) : on repart de zéro
+                _collectors.set(())
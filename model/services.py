@@ -4,13 +4,21 @@ Services métier pour l'application Meet
 Logique métier séparée des routes
 """
 
-from .models import User, Message, Like, Match, Notification, Interest, UserInterest
+from .models import User, Message, Like, Match, Notification, Interest, UserInterest, UserStats
 from .database import db
 from .extensions import get_timezone_aware_datetime
+from .stats_service import StatsService, UserStatsService
+from .metrics import (
+    LIKES_TOTAL, MATCHES_TOTAL, MESSAGES_TOTAL, PHOTO_SAVE_SECONDS, record_cleanup
+)
+from .storage import get_storage, storage_config
+from .image_pipeline import (
+    ImagePipeline, UploadSpool, process_image, sniff_image_format, SNIFF_BYTES,
+    PHOTO_STATUS_PROCESSING, PHOTO_STATUS_READY, DEFAULT_MAX_PHOTO_BYTES
+)
 from datetime import datetime, timedelta
 from sqlalchemy import exists
 from sqlalchemy.exc import IntegrityError
-from PIL import Image
 import os
 import logging
 from werkzeug.utils import secure_filename
@@ -56,6 +64,7 @@ class UserService:
             
             db.session.add(user)
             db.session.flush()  # Pour obtenir l'ID
+            StatsService.on_user_created(user)
             
             logger.info(f"Nouvel utilisateur créé: {user.id}")
             return user
@@ -65,6 +74,19 @@ class UserService:
             db.session.rollback()
             raise
     
+    @staticmethod
+    def save_login(user):
+        """Valide les changements faits à la connexion (re-hachage du mot de passe)
+
+        Un échec est journalisé sans empêcher la connexion : le re-hachage
+        sera refait à la prochaine.
+        """
+        try:
+            db.session.commit()
+        except Exception as e:
+            logger.error(f"Erreur lors de l'enregistrement de la connexion de l'utilisateur {user.id}: {e}")
+            db.session.rollback()
+    
     @staticmethod
     def get_user_by_email(email):
         """Récupère un utilisateur par son email"""
@@ -168,68 +190,93 @@ class UserService:
             return []
     
     @staticmethod
+    @PHOTO_SAVE_SECONDS.time()
     def save_photo(file, user_id, photo_type):
-        """Sauvegarde une photo de profil avec sécurité renforcée"""
+        """Sauvegarde une photo de profil avec sécurité renforcée
+
+        Le fichier est stocké brut puis traité en arrière-plan après le commit
+        de la requête ; `photo_status` passe à "processing" jusqu'à la fin.
+        Le nom retourné doit être affecté avec `PhotoService.assign` pour
+        tenir à jour les compteurs de références.
+        """
         try:
             if not file or not UserService.allowed_file(file.filename):
                 logger.error(f"Fichier non autorisé: {file.filename if file else 'None'}")
                 return None
                 
-            # Vérifier la taille du fichier (max 10MB)
-            file.seek(0, os.SEEK_END)
-            file_size = file.tell()
-            file.seek(0)
-            
-            if file_size > 10 * 1024 * 1024:  # 10MB
-                logger.error(f"Fichier trop volumineux: {file_size} bytes")
-                return None
-            
-            # Vérifier le type MIME réel du fichier
+            # Vérifier le type MIME déclaré par l'extension
             import mimetypes
             mime_type, _ = mimetypes.guess_type(file.filename)
             if mime_type not in ['image/jpeg', 'image/jpg', 'image/png', 'image/gif', 'image/webp']:
                 logger.error(f"Type MIME non autorisé: {mime_type}")
                 return None
             
-            # Générer un nom de fichier unique et sécurisé
-            import secrets
-            random_token = secrets.token_hex(8)
-            filename = f"{user_id}_{photo_type}_{random_token}.jpg"
-            filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+            upload_folder = current_app.config['UPLOAD_FOLDER']
             
-            # Vérifier que le chemin est bien dans le dossier uploads
-            if not os.path.abspath(filepath).startswith(os.path.abspath(current_app.config['UPLOAD_FOLDER'])):
-                logger.error("Tentative de path traversal détectée")
-                return None
-            
-            # Ouvrir et valider l'image
-            try:
-                image = Image.open(file)
-                # Vérifier que c'est bien une image
-                image.verify()
-                # Rouvrir l'image après verification
+            if isinstance(file.stream, UploadSpool):
+                # Reçu directement sur disque : taille, signature et empreinte
+                # ont été contrôlées pendant la réception
+                try:
+                    raw_path, digest = file.stream.claim()
+                except ValueError as rejected:
+                    logger.error(f"Fichier refusé: {rejected}")
+                    return None
+            else:
+                # Vérifier la taille du fichier
+                max_bytes = current_app.config.get('MAX_PHOTO_BYTES', DEFAULT_MAX_PHOTO_BYTES)
+                file.seek(0, os.SEEK_END)
+                file_size = file.tell()
                 file.seek(0)
-                image = Image.open(file)
-                image = image.convert('RGB')
                 
-                # Redimensionner si trop grande
-                max_size = (800, 800)
-                image.thumbnail(max_size, Image.Resampling.LANCZOS)
+                if file_size > max_bytes:
+                    logger.error(f"Fichier trop volumineux: {file_size} bytes")
+                    return None
                 
-                # Sauvegarder avec des métadonnées minimales
-                image.save(filepath, 'JPEG', quality=85, optimize=True)
+                if sniff_image_format(file.read(SNIFF_BYTES)) is None:
+                    logger.error("Signature de fichier non reconnue")
+                    return None
+                file.seek(0)
                 
-                # Vérifier que le fichier a bien été créé
-                if not os.path.exists(filepath):
-                    logger.error("Le fichier n'a pas été créé correctement")
+                # Stocker le fichier brut en calculant son empreinte ; le décodage et
+                # l'encodage sont faits hors requête
+                try:
+                    raw_path, digest = ImagePipeline.store_raw(file, upload_folder)
+                except Exception as io_error:
+                    logger.error(f"Impossible d'enregistrer le fichier reçu: {io_error}")
                     return None
-                    
+            
+            # Le nom est l'empreinte du contenu : une même image n'est stockée qu'une fois
+            filename = f"{digest}.jpg"
+            storage = get_storage()
+            filepath = os.path.join(storage.local_folder, filename)
+            
+            if ImagePipeline.is_processed(storage, filename):
+                os.remove(raw_path)
+                logger.info(f"Photo déjà stockée, réutilisée: {filename}")
+                return filename
+
+            if not current_app.config.get('IMAGE_PROCESSING_ASYNC', True):
+                # Traitement synchrone (développement, tests)
+                try:
+                    process_image(raw_path, filepath, storage_config(current_app.config))
+                except Exception as img_error:
+                    logger.error(f"Fichier image invalide: {img_error}")
+                    return None
+                user = db.session.get(User, user_id)
+                if user:
+                    user.photo_status = PHOTO_STATUS_READY
                 logger.info(f"Photo sauvegardée avec succès: {filename}")
                 return filename
-                
-            except Exception as img_error:
-                logger.error(f"Fichier image invalide: {img_error}")
-                return None
+
+            user = db.session.get(User, user_id)
+            if user:
+                user.photo_status = PHOTO_STATUS_PROCESSING
+            ImagePipeline.enqueue(
+                db.session(), current_app._get_current_object(),
+                user_id, photo_type, raw_path, filepath
+            )
+            logger.info(f"Photo reçue, traitement planifié: {filename}")
+            return filename
             
         except Exception as e:
             logger.error(f"Erreur lors de la sauvegarde de la photo: {e}")
@@ -290,7 +337,11 @@ class LikeService:
                 NotificationService.create_notification(liked_id, "Vous avez un nouveau match !", 'match')
                 NotificationService.create_notification(liker_id, "Vous avez un nouveau match !", 'match')
             
+            StatsService.on_like_created(liker_id, liked_id, is_match)
             db.session.commit()
+            LIKES_TOTAL.inc()
+            if is_match:
+                MATCHES_TOTAL.inc()
             
             logger.info(f"Like créé: {liker_id} -> {liked_id}, match: {is_match}")
             return like, is_match
@@ -307,6 +358,7 @@ class LikeService:
             like = Like.query.filter_by(liker_id=liker_id, liked_id=liked_id).first()
             if like:
                 db.session.delete(like)
+                StatsService.on_likes_removed(liked_id=liked_id)
                 db.session.commit()
                 return True
             return False
@@ -369,7 +421,9 @@ class MessageService:
             db.session.add(message)
             # Créer une notification (sans commit interne)
             NotificationService.create_notification(receiver_id, "Vous avez reçu un nouveau message", 'message')
+            StatsService.on_message_sent(sender_id)
             db.session.commit()
+            MESSAGES_TOTAL.inc()
             
             logger.info(f"Message envoyé: {sender_id} -> {receiver_id}")
             return message
@@ -430,13 +484,18 @@ class MessageService:
         """Supprime les messages expirés"""
         try:
             now = get_timezone_aware_datetime()
-            deleted = Message.query.filter(Message.expires_at < now).delete(synchronize_session=False)
+            expired = Message.expires_at < now
+            UserStatsService.decrement_matching(Message, expired, Message.sender_id, UserStats.messages_sent_count)
+            deleted = Message.query.filter(expired).delete(synchronize_session=False)
+            StatsService.on_messages_deleted(deleted)
             db.session.commit()
+            record_cleanup('message', deleted)
             logger.info(f"Nettoyage de {deleted} messages expirés")
             return deleted
             
         except Exception as e:
             logger.error(f"Erreur lors du nettoyage des messages: {e}")
+            db.session.rollback()
             return 0
 
 
@@ -532,8 +591,8 @@ class MatchService:
         """Supprime un match entre deux utilisateurs"""
         try:
             # Supprimer les likes mutuels
-            Like.query.filter_by(liker_id=user1_id, liked_id=user2_id).delete()
-            Like.query.filter_by(liker_id=user2_id, liked_id=user1_id).delete()
+            likes_to_user2 = Like.query.filter_by(liker_id=user1_id, liked_id=user2_id).delete()
+            likes_to_user1 = Like.query.filter_by(liker_id=user2_id, liked_id=user1_id).delete()
             
             # Supprimer le match
             match = Match.query.filter(
@@ -544,12 +603,21 @@ class MatchService:
             if match:
                 db.session.delete(match)
             
-            # Supprimer tous les messages échangés
-            Message.query.filter(
-                ((Message.sender_id == user1_id) & (Message.receiver_id == user2_id)) |
-                ((Message.sender_id == user2_id) & (Message.receiver_id == user1_id))
+            # Supprimer tous les messages échangés (par sens, pour les compteurs)
+            messages_from_user1 = Message.query.filter(
+                (Message.sender_id == user1_id) & (Message.receiver_id == user2_id)
+            ).delete()
+            messages_from_user2 = Message.query.filter(
+                (Message.sender_id == user2_id) & (Message.receiver_id == user1_id)
             ).delete()
             
+            if match:
+                StatsService.on_match_removed(user1_id, user2_id)
+            StatsService.on_likes_removed(likes_to_user2, liked_id=user2_id)
+            StatsService.on_likes_removed(likes_to_user1, liked_id=user1_id)
+            StatsService.on_messages_deleted(messages_from_user1, sender_id=user1_id)
+            StatsService.on_messages_deleted(messages_from_user2, sender_id=user2_id)
+            
             db.session.commit()
             
             logger.info(f"Match supprimé entre {user1_id} et {user2_id}")
@@ -606,6 +674,7 @@ class NotificationService:
             now = get_timezone_aware_datetime()
             deleted = Notification.query.filter(Notification.expires_at < now).delete(synchronize_session=False)
             db.session.commit()
+            record_cleanup('notification', deleted)
             logger.info(f"Nettoyage de {deleted} notifications expirées")
             return deleted
             
@@ -0,0 +1,440 @@
+"""
+Compteurs matérialisés et agrégats d'activité pour l'administration
+Mis à jour incrémentalement par la couche service et réconciliés périodiquement
+"""
+
+import logging
+from datetime import datetime, time, timedelta
+from sqlalchemy import func, select
+from .database import db
+from .models import User, Message, Like, Match, AppStat, DailyActivity, UserStats
+from .extensions import get_timezone_aware_datetime
+
+logger = logging.getLogger(__name__)
+
+
+class StatsService:
+    """Service de lecture et de maintenance des compteurs du tableau de bord"""
+
+    # Compteurs maintenus à chaque écriture par la couche service
+    TOTAL_USERS = 'total_users'
+    ACTIVE_USERS = 'active_users'
+    TOTAL_MATCHES = 'total_matches'
+    TOTAL_MESSAGES = 'total_messages'
+    TOTAL_LIKES = 'total_likes'
+
+    # Fenêtres glissantes recalculées uniquement lors de la réconciliation
+    RECENT_USERS = 'recent_users'
+    RECENT_MESSAGES = 'recent_messages'
+    RECENT_MATCHES = 'recent_matches'
+    ACTIVE_CONVERSATIONS = 'active_conversations'
+
+    # Horodatage de la dernière réconciliation complète
+    RECONCILED_AT = 'reconciled_at'
+
+    ALL_KEYS = (
+        TOTAL_USERS, ACTIVE_USERS, TOTAL_MATCHES, TOTAL_MESSAGES, TOTAL_LIKES,
+        RECENT_USERS, RECENT_MESSAGES, RECENT_MATCHES, ACTIVE_CONVERSATIONS,
+        RECONCILED_AT
+    )
+
+    @staticmethod
+    def increment(key, delta=1):
+        """Applique un delta à un compteur dans la transaction courante (sans commit)
+
+        Un compteur absent n'est pas créé ici : la réconciliation le matérialisera
+        avec la valeur exacte. Une erreur est propagée à l'appelant, qui annule
+        sa transaction : l'écriture métier et le compteur restent cohérents.
+        """
+        if not delta:
+            return
+        AppStat.query.filter_by(key=key).update(
+            {
+                AppStat.value: AppStat.value + delta,
+                AppStat.updated_at: get_timezone_aware_datetime()
+            },
+            synchronize_session=False
+        )
+
+    @staticmethod
+    def on_user_created(user):
+        """Enregistre la création d'un utilisateur"""
+        StatsService.increment(StatsService.TOTAL_USERS)
+        if user.is_active is not False:
+            StatsService.increment(StatsService.ACTIVE_USERS)
+        db.session.add(UserStats(user_id=user.id))
+
+    @staticmethod
+    def on_user_status_changed(is_active):
+        """Enregistre l'activation ou la désactivation d'un utilisateur"""
+        StatsService.increment(StatsService.ACTIVE_USERS, 1 if is_active else -1)
+
+    @staticmethod
+    def on_user_deleted(was_active, likes=0, matches=0, messages=0):
+        """Enregistre la suppression d'un utilisateur et de ses données associées"""
+        StatsService.increment(StatsService.TOTAL_USERS, -1)
+        if was_active:
+            StatsService.increment(StatsService.ACTIVE_USERS, -1)
+        StatsService.increment(StatsService.TOTAL_LIKES, -likes)
+        StatsService.increment(StatsService.TOTAL_MATCHES, -matches)
+        StatsService.increment(StatsService.TOTAL_MESSAGES, -messages)
+
+    @staticmethod
+    def on_like_created(liker_id, liked_id, is_match):
+        """Enregistre un like et, le cas échéant, le match qu'il a créé"""
+        StatsService.increment(StatsService.TOTAL_LIKES)
+        UserStatsService.increment(liked_id, UserStats.likes_received_count)
+        if is_match:
+            StatsService.increment(StatsService.TOTAL_MATCHES)
+            UserStatsService.increment(liker_id, UserStats.matches_count)
+            UserStatsService.increment(liked_id, UserStats.matches_count)
+
+    @staticmethod
+    def on_likes_removed(count=1, liked_id=None):
+        """Enregistre la suppression de likes"""
+        StatsService.increment(StatsService.TOTAL_LIKES, -count)
+        if liked_id is not None:
+            UserStatsService.increment(liked_id, UserStats.likes_received_count, -count)
+
+    @staticmethod
+    def on_match_removed(user1_id, user2_id):
+        """Enregistre la suppression d'un match"""
+        StatsService.increment(StatsService.TOTAL_MATCHES, -1)
+        for user_id in (user1_id, user2_id):
+            UserStatsService.increment(user_id, UserStats.matches_count, -1)
+
+    @staticmethod
+    def on_message_sent(sender_id):
+        """Enregistre l'envoi d'un message"""
+        StatsService.increment(StatsService.TOTAL_MESSAGES)
+        UserStatsService.increment(sender_id, UserStats.messages_sent_count)
+
+    @staticmethod
+    def on_messages_deleted(count, sender_id=None):
+        """Enregistre la suppression de messages (expiration, nettoyage)"""
+        StatsService.increment(StatsService.TOTAL_MESSAGES, -count)
+        if sender_id is not None:
+            UserStatsService.increment(sender_id, UserStats.messages_sent_count, -count)
+
+    @staticmethod
+    def compute_live_stats():
+        """Calcule toutes les statistiques directement depuis les tables (coûteux)"""
+        now = get_timezone_aware_datetime()
+        week_ago = now - timedelta(days=7)
+        day_ago = now - timedelta(days=1)
+
+        active_conversations = db.session.query(Message.sender_id).filter(
+            Message.created_at >= day_ago
+        ).union(
+            db.session.query(Message.receiver_id).filter(
+                Message.created_at >= day_ago
+            )
+        ).distinct().count()
+
+        return {
+            StatsService.TOTAL_USERS: User.query.count(),
+            StatsService.ACTIVE_USERS: User.query.filter(User.is_active == True).count(),
+            StatsService.TOTAL_MATCHES: Match.query.count(),
+            StatsService.TOTAL_MESSAGES: Message.query.count(),
+            StatsService.TOTAL_LIKES: Like.query.count(),
+            StatsService.RECENT_USERS: User.query.filter(User.created_at >= week_ago).count(),
+            StatsService.RECENT_MESSAGES: Message.query.filter(Message.created_at >= day_ago).count(),
+            StatsService.RECENT_MATCHES: Match.query.filter(Match.created_at >= week_ago).count(),
+            StatsService.ACTIVE_CONVERSATIONS: active_conversations,
+        }
+
+    @staticmethod
+    def reconcile():
+        """Recalcule et persiste tous les compteurs (tâche planifiée)"""
+        try:
+            values = StatsService.compute_live_stats()
+            now = get_timezone_aware_datetime()
+            values[StatsService.RECONCILED_AT] = int(now.timestamp())
+
+            existing = {s.key: s for s in AppStat.query.filter(AppStat.key.in_(list(values))).all()}
+            for key, value in values.items():
+                stat = existing.get(key)
+                if stat is None:
+                    db.session.add(AppStat(key=key, value=value, updated_at=now))
+                else:
+                    stat.value = value
+                    stat.updated_at = now
+
+            db.session.commit()
+            logger.info("Compteurs d'administration réconciliés")
+            return values
+        except Exception as e:
+            logger.error(f"Erreur lors de la réconciliation des compteurs: {e}")
+            db.session.rollback()
+            return None
+
+    @staticmethod
+    def get_counters():
+        """Lit les compteurs matérialisés, en les initialisant si nécessaire"""
+        stats = AppStat.query.filter(AppStat.key.in_(StatsService.ALL_KEYS)).all()
+        if len(stats) < len(StatsService.ALL_KEYS):
+            # Premier affichage ou nouveau compteur : matérialiser une fois
+            StatsService.reconcile()
+            stats = AppStat.query.filter(AppStat.key.in_(StatsService.ALL_KEYS)).all()
+        return {s.key: s for s in stats}
+
+    @staticmethod
+    def get_dashboard_stats():
+        """Retourne les statistiques du tableau de bord depuis les compteurs"""
+        stats = StatsService.get_counters()
+
+        def value(key):
+            stat = stats.get(key)
+            return max(stat.value, 0) if stat else 0
+
+        total_users = value(StatsService.TOTAL_USERS)
+        active_users = value(StatsService.ACTIVE_USERS)
+        activity_rate = (active_users / total_users * 100) if total_users > 0 else 0
+
+        reconciled = stats.get(StatsService.RECONCILED_AT)
+        updated_at = max((s.updated_at for s in stats.values() if s.updated_at), default=None)
+
+        return {
+            'total_users': total_users,
+            'active_users': active_users,
+            'total_matches': value(StatsService.TOTAL_MATCHES),
+            'total_messages': value(StatsService.TOTAL_MESSAGES),
+            'total_likes': value(StatsService.TOTAL_LIKES),
+            'recent_users': value(StatsService.RECENT_USERS),
+            'recent_messages': value(StatsService.RECENT_MESSAGES),
+            'recent_matches': value(StatsService.RECENT_MATCHES),
+            'active_conversations': value(StatsService.ACTIVE_CONVERSATIONS),
+            'activity_rate': round(activity_rate, 1),
+            'updated_at': updated_at,
+            'reconciled_at': reconciled.updated_at if reconciled else None
+        }
+
+
+class ActivityRollupService:
+    """Agrégats journaliers d'activité pour la page d'analytique"""
+
+    # Métrique -> (modèle, colonne de date indexée)
+    METRICS = {
+        'users': (User, User.created_at),
+        'messages': (Message, Message.created_at),
+        'matches': (Match, Match.created_at),
+        'likes': (Like, Like.created_at),
+    }
+
+    # Profondeur de l'historique reconstruit lors du premier passage
+    DEFAULT_BACKFILL_DAYS = 90
+
+    @staticmethod
+    def _day_bounds(day):
+        """Retourne l'intervalle [début, fin) d'un jour UTC"""
+        start = datetime.combine(day, time.min)
+        return start, start + timedelta(days=1)
+
+    @staticmethod
+    def count_day(metric, day, until=None):
+        """Compte les lignes d'une métrique sur un jour via un filtre d'intervalle indexable"""
+        model, column = ActivityRollupService.METRICS[metric]
+        start, end = ActivityRollupService._day_bounds(day)
+        if until is not None and until < end:
+            end = until
+        return db.session.query(func.count()).select_from(model).filter(
+            column >= start, column < end
+        ).scalar() or 0
+
+    @staticmethod
+    def last_rolled_day():
+        """Retourne le dernier jour clos présent dans la table d'agrégats"""
+        return db.session.query(func.max(DailyActivity.day)).scalar()
+
+    @staticmethod
+    def rollup(backfill_days=None):
+        """Agrège incrémentalement les jours non encore clos, plus le jour courant
+
+        Les jours déjà présents ne sont jamais diminués : les messages expirés
+        et supprimés restent ainsi comptés dans l'historique.
+        """
+        try:
+            today = get_timezone_aware_datetime().date()
+            if backfill_days is None:
+                backfill_days = ActivityRollupService.DEFAULT_BACKFILL_DAYS
+
+            last_day = ActivityRollupService.last_rolled_day()
+            if last_day is None:
+                start_day = today - timedelta(days=backfill_days)
+            else:
+                # Le dernier jour agrégé a pu être partiel : le recalculer
+                start_day = min(last_day, today)
+
+            rolled = 0
+            day = start_day
+            while day <= today:
+                existing = {
+                    row.metric: row for row in
+                    DailyActivity.query.filter_by(day=day).all()
+                }
+                now = get_timezone_aware_datetime()
+                for metric in ActivityRollupService.METRICS:
+                    count = ActivityRollupService.count_day(metric, day)
+                    row = existing.get(metric)
+                    if row is None:
+                        db.session.add(DailyActivity(day=day, metric=metric, count=count, updated_at=now))
+                    elif count > row.count:
+                        row.count = count
+                        row.updated_at = now
+                db.session.commit()
+                rolled += 1
+                day += timedelta(days=1)
+
+            logger.info(f"Agrégats d'activité mis à jour: {rolled} jour(s)")
+            return rolled
+        except Exception as e:
+            logger.error(f"Erreur lors de l'agrégation de l'activité: {e}")
+            db.session.rollback()
+            return 0
+
+    @staticmethod
+    def get_daily_counts(days=30):
+        """Retourne les comptes journaliers par métrique sur une fenêtre
+
+        Les jours clos sont lus dans la table d'agrégats ; le jour courant
+        est calculé en direct. L'agrégation n'est jamais lancée ici (tâche
+        planifiée et démarrage) : si elle est en retard, les jours manquants
+        sont simplement absents.
+        """
+        now = get_timezone_aware_datetime()
+        today = now.date()
+        start_day = today - timedelta(days=days)
+
+        last_day = ActivityRollupService.last_rolled_day()
+        if last_day is None or last_day < today - timedelta(days=1):
+            logger.warning(f"Agrégats d'activité en retard (dernier jour agrégé: {last_day})")
+
+        result = {metric: {} for metric in ActivityRollupService.METRICS}
+        rows = DailyActivity.query.filter(
+            DailyActivity.day >= start_day,
+            DailyActivity.day < today
+        ).order_by(DailyActivity.day).all()
+        for row in rows:
+            if row.metric in result and row.count:
+                result[row.metric][row.day.isoformat()] = row.count
+
+        # Jour courant partiel, calculé en direct
+        for metric in ActivityRollupService.METRICS:
+            count = ActivityRollupService.count_day(metric, today, until=now.replace(tzinfo=None))
+            if count:
+                result[metric][today.isoformat()] = count
+
+        return result
+
+
+class UserStatsService:
+    """Compteurs par utilisateur pour les classements (top utilisateurs)"""
+
+    # Métrique exposée -> colonne matérialisée
+    METRICS = {
+        'matches': UserStats.matches_count,
+        'likes_received': UserStats.likes_received_count,
+        'messages_sent': UserStats.messages_sent_count,
+    }
+
+    REFRESH_BATCH_SIZE = 1000
+
+    @staticmethod
+    def increment(user_id, column, delta=1):
+        """Applique un delta au compteur d'un utilisateur (sans commit)
+
+        Une ligne absente est ignorée : le rafraîchissement périodique la créera.
+        Comme pour StatsService.increment, une erreur est propagée à l'appelant.
+        """
+        if not delta:
+            return
+        UserStats.query.filter_by(user_id=user_id).update(
+            {column: column + delta},
+            synchronize_session=False
+        )
+
+    @staticmethod
+    def decrement_matching(model, criterion, user_column, column):
+        """Retire du compteur de chaque utilisateur les lignes de `model` qui vont être supprimées
+
+        À appeler avant une suppression groupée (expiration, nettoyage), dans
+        la même transaction : une seule requête UPDATE quel que soit le nombre
+        d'utilisateurs concernés. `user_column` désigne l'utilisateur compté
+        (expéditeur d'un message, destinataire d'un like).
+        """
+        per_user = select(func.count()).select_from(model).where(
+            criterion, user_column == UserStats.user_id
+        ).scalar_subquery()
+        UserStats.query.filter(
+            UserStats.user_id.in_(select(user_column).where(criterion))
+        ).update({column: column - per_user}, synchronize_session=False)
+
+    @staticmethod
+    def refresh():
+        """Recalcule tous les compteurs par utilisateur (tâche planifiée)
+
+        Corrige les dérives dues aux suppressions en masse (expiration des
+        messages, suppressions d'utilisateurs) qui ne sont pas suivies unitairement.
+        """
+        try:
+            matches = dict(
+                db.session.query(Match.user1_id, func.count(Match.id)).group_by(Match.user1_id).all()
+            )
+            for user_id, count in db.session.query(
+                Match.user2_id, func.count(Match.id)
+            ).group_by(Match.user2_id).all():
+                matches[user_id] = matches.get(user_id, 0) + count
+
+            likes_received = dict(
+                db.session.query(Like.liked_id, func.count(Like.id)).group_by(Like.liked_id).all()
+            )
+            messages_sent = dict(
+                db.session.query(Message.sender_id, func.count(Message.id)).group_by(Message.sender_id).all()
+            )
+
+            now = get_timezone_aware_datetime()
+            user_ids = [row[0] for row in db.session.query(User.id).order_by(User.id).all()]
+            batch_size = UserStatsService.REFRESH_BATCH_SIZE
+            for i in range(0, len(user_ids), batch_size):
+                batch = user_ids[i:i + batch_size]
+                existing = {
+                    row[0] for row in
+                    db.session.query(UserStats.user_id).filter(UserStats.user_id.in_(batch)).all()
+                }
+                rows = [
+                    {
+                        'user_id': user_id,
+                        'matches_count': matches.get(user_id, 0),
+                        'likes_received_count': likes_received.get(user_id, 0),
+                        'messages_sent_count': messages_sent.get(user_id, 0),
+                        'updated_at': now
+                    }
+                    for user_id in batch
+                ]
+                db.session.bulk_update_mappings(UserStats, [r for r in rows if r['user_id'] in existing])
+                db.session.bulk_insert_mappings(UserStats, [r for r in rows if r['user_id'] not in existing])
+                db.session.commit()
+
+            logger.info(f"Compteurs par utilisateur rafraîchis: {len(user_ids)} utilisateurs")
+            return len(user_ids)
+        except Exception as e:
+            logger.error(f"Erreur lors du rafraîchissement des compteurs utilisateurs: {e}")
+            db.session.rollback()
+            return 0
+
+    @staticmethod
+    def get_top_users(metric='matches', limit=10):
+        """Retourne les couples (utilisateur, compteur) les mieux classés
+
+        Simple ORDER BY ... LIMIT sur une colonne indexée.
+        """
+        column = UserStatsService.METRICS.get(metric)
+        if column is None:
+            return []
+
+        if UserStats.query.first() is None:
+            UserStatsService.refresh()
+
+        return db.session.query(User, column.label('count')).join(
+            UserStats, UserStats.user_id == User.id
+        ).order_by(column.desc(), UserStats.user_id).limit(limit).all()
@@ -0,0 +1,207 @@
+"""
+Stockage des fichiers envoyés par les utilisateurs
+Disque local ou service compatible S3 (AWS, MinIO...), choisi par STORAGE_BACKEND
+"""
+
+import logging
+import mimetypes
+import os
+import threading
+import time
+
+from flask import current_app, has_request_context, url_for
+from .metrics import cache_lookup
+
+try:
+    import boto3
+    from botocore.config import Config as BotoConfig
+    from botocore.exceptions import ClientError
+except ImportError:  # dépendance optionnelle, requise uniquement pour STORAGE_BACKEND=s3
+    boto3 = None
+
+logger = logging.getLogger(__name__)
+
+# Les fichiers sont adressés par leur contenu : ils ne changent jamais
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+DEFAULT_URL_EXPIRES = 7 * 24 * 3600
+
+# Clés de configuration transmises aux processus de traitement d'images
+STORAGE_CONFIG_KEYS = (
+    'STORAGE_BACKEND', 'UPLOAD_FOLDER', 'UPLOAD_BASE_URL',
+    'S3_BUCKET', 'S3_ENDPOINT_URL', 'S3_REGION', 'S3_ACCESS_KEY_ID',
+    'S3_SECRET_ACCESS_KEY', 'S3_PREFIX', 'S3_PUBLIC_BASE_URL', 'S3_URL_EXPIRES',
+)
+
+
+class LocalStorage:
+    """Fichiers dans un dossier local servi comme fichiers statiques"""
+
+    def __init__(self, root, base_url=None):
+        self.root = root
+        # URL publique du dossier (serveur web ou CDN) ; par défaut la route static de Flask
+        self.base_url = base_url.rstrip('/') if base_url else None
+        os.makedirs(root, exist_ok=True)
+
+    @property
+    def local_folder(self):
+        """Dossier où le pipeline écrit les fichiers produits"""
+        return self.root
+
+    def publish(self, names):
+        """Rend les fichiers produits disponibles (déjà en place sur disque)"""
+
+    def exists(self, name):
+        return os.path.exists(os.path.join(self.root, name))
+
+    def delete(self, name):
+        """Supprime un fichier ; retourne True s'il existait"""
+        try:
+            os.remove(os.path.join(self.root, name))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def iter_files(self):
+        """Itère sur (nom, date de modification en secondes) des fichiers stockés"""
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file():
+                        yield entry.name, entry.stat().st_mtime
+                except FileNotFoundError:
+                    pass
+
+    def url(self, name):
+        if self.base_url:
+            return f"{self.base_url}/{name}"
+        if has_request_context():
+            return url_for('static', filename='uploads/' + name)
+        return '/static/uploads/' + name
+
+
+class S3Storage:
+    """Fichiers dans un bucket compatible S3, servis par URL signée ou par un CDN
+
+    Les fichiers sont produits dans un dossier local de travail puis envoyés
+    dans le bucket. Les URL signées sont réutilisées pendant la moitié de
+    leur durée de validité, pour que navigateurs et proxys puissent les
+    garder en cache.
+    """
+
+    def __init__(self, bucket, staging_folder, endpoint_url=None, region=None,
+                 access_key=None, secret_key=None, prefix='', public_base_url=None,
+                 url_expires=DEFAULT_URL_EXPIRES):
+        if boto3 is None:
+            raise RuntimeError("boto3 est requis pour STORAGE_BACKEND=s3 (pip install boto3)")
+        self.bucket = bucket
+        self.staging_folder = staging_folder
+        self.prefix = prefix.strip('/') + '/' if prefix.strip('/') else ''
+        self.public_base_url = public_base_url.rstrip('/') if public_base_url else None
+        self.url_expires = url_expires
+        self.client = boto3.client(
+            's3',
+            endpoint_url=endpoint_url,
+            region_name=region,
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+            # Adressage par chemin : requis par MinIO et la plupart des services compatibles
+            config=BotoConfig(signature_version='s3v4', s3={'addressing_style': 'path'})
+        )
+        self._url_cache = {}
+        self._url_lock = threading.Lock()
+        os.makedirs(staging_folder, exist_ok=True)
+
+    @property
+    def local_folder(self):
+        return self.staging_folder
+
+    def _key(self, name):
+        return self.prefix + name
+
+    def publish(self, names):
+        """Envoie les fichiers produits dans le bucket puis les retire du dossier de travail"""
+        for name in names:
+            path = os.path.join(self.staging_folder, name)
+            content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+            self.client.upload_file(path, self.bucket, self._key(name), ExtraArgs={
+                'ContentType': content_type,
+                'CacheControl': IMMUTABLE_CACHE_CONTROL,
+            })
+            os.remove(path)
+
+    def exists(self, name):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(name))
+            return True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+
+    def delete(self, name):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(name))
+        return True
+
+    def iter_files(self):
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for obj in page.get('Contents', ()):
+                name = obj['Key'][len(self.prefix):]
+                if name and '/' not in name:
+                    yield name, obj['LastModified'].timestamp()
+
+    def url(self, name):
+        if self.public_base_url:
+            return f"{self.public_base_url}/{self._key(name)}"
+        now = time.time()
+        with self._url_lock:
+            cached = self._url_cache.get(name)
+        if cached and cached[1] > now:
+            cache_lookup('signed_url', True)
+            return cached[0]
+        cache_lookup('signed_url', False)
+        signed = self.client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': self.bucket, 'Key': self._key(name)},
+            ExpiresIn=self.url_expires
+        )
+        with self._url_lock:
+            if len(self._url_cache) > 10000:
+                self._url_cache.clear()
+            self._url_cache[name] = (signed, now + self.url_expires / 2)
+        return signed
+
+
+def create_storage(config):
+    """Construit le stockage décrit par la configuration de l'application"""
+    backend = config.get('STORAGE_BACKEND', 'local')
+    if backend == 'local':
+        return LocalStorage(config['UPLOAD_FOLDER'], base_url=config.get('UPLOAD_BASE_URL'))
+    if backend == 's3':
+        return S3Storage(
+            bucket=config['S3_BUCKET'],
+            staging_folder=config['UPLOAD_FOLDER'],
+            endpoint_url=config.get('S3_ENDPOINT_URL'),
+            region=config.get('S3_REGION'),
+            access_key=config.get('S3_ACCESS_KEY_ID'),
+            secret_key=config.get('S3_SECRET_ACCESS_KEY'),
+            prefix=config.get('S3_PREFIX', ''),
+            public_base_url=config.get('S3_PUBLIC_BASE_URL'),
+            url_expires=int(config.get('S3_URL_EXPIRES', DEFAULT_URL_EXPIRES))
+        )
+    raise ValueError(f"Stockage inconnu: {backend}")
+
+
+def storage_config(config):
+    """Sous-ensemble sérialisable de la configuration décrivant le stockage"""
+    return {key: config[key] for key in STORAGE_CONFIG_KEYS if key in config}
+
+
+def get_storage(app=None):
+    """Stockage de l'application, créé à la première utilisation"""
+    app = app or current_app._get_current_object()
+    storage = app.extensions.get('photo_storage')
+    if storage is None:
+        storage = app.extensions['photo_storage'] = create_storage(app.config)
+    return storage
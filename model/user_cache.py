@@ -0,0 +1,173 @@
+"""
+Chargement de l'utilisateur connecté pour Flask-Login
+Colonnes d'authentification uniquement, mises en cache par processus avec une durée de vie courte
+
+L'invalidation ne touche que le processus courant : avec plusieurs workers,
+une modification (désactivation, retrait des droits d'administration) n'est
+vue des autres workers qu'à l'expiration de l'entrée (USER_CACHE_TTL_SECONDS)
+pour les lectures. Les requêtes qui modifient des données relisent toujours
+la base, et un utilisateur désactivé n'est jamais chargé.
+"""
+
+import logging
+import threading
+import time
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from .database import db
+from .models import User
+from .metrics import cache_lookup
+
+logger = logging.getLogger(__name__)
+
+# Colonnes chargées pour chaque requête authentifiée : contrôles d'accès,
+# barre de navigation et filtres de suggestions. Les autres attributs
+# (bio, date de naissance, relations...) chargent l'utilisateur complet.
+PRINCIPAL_COLUMNS = (
+    User.id, User.email, User.first_name, User.last_name,
+    User.gender, User.interested_in, User.city,
+    User.is_active, User.is_admin, User.is_verified,
+    User.profile_photo, User.second_photo, User.photo_status,
+)
+
+DEFAULT_TTL_SECONDS = 30
+MAX_ENTRIES = 10000
+
+# Méthodes HTTP servies depuis le cache ; les autres relisent la base
+CACHED_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS'))
+
+_cache = {}
+_lock = threading.Lock()
+
+
+class SessionPrincipal:
+    """Utilisateur connecté, construit à partir des colonnes d'authentification
+
+    Les colonnes chargées sont lues directement ; tout autre attribut, et
+    toute écriture, passe par l'utilisateur complet chargé à la demande
+    dans la session SQL de la requête.
+    """
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, data):
+        object.__setattr__(self, '_data', dict(data))
+        object.__setattr__(self, '_user', None)
+
+    def get_id(self):
+        return str(self._data['id'])
+
+    @property
+    def user(self):
+        """Utilisateur complet, chargé à la première utilisation"""
+        if self._user is None:
+            object.__setattr__(self, '_user', db.session.get(User, self._data['id']))
+        return self._user
+
+    def __getattr__(self, name):
+        data = object.__getattribute__(self, '_data')
+        if name in data:
+            return data[name]
+        return getattr(self.user, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.user, name, value)
+        if name in self._data:
+            self._data[name] = value
+
+    def __eq__(self, other):
+        if isinstance(other, (SessionPrincipal, User)):
+            return self.id == other.id
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self._data['id'])
+
+    def __repr__(self):
+        return f"<SessionPrincipal {self._data['id']}>"
+
+
+class UserCache:
+    """Cache par processus des colonnes d'authentification des utilisateurs connectés"""
+
+    @staticmethod
+    def load(user_id, fresh=False):
+        """Retourne le SessionPrincipal d'un utilisateur, ou None s'il n'existe pas ou est désactivé
+
+        `fresh` ignore l'entrée en cache et la remplace par la valeur en base.
+        """
+        now = time.monotonic()
+        if not fresh:
+            with _lock:
+                entry = _cache.get(user_id)
+            if entry and entry[0] > now:
+                cache_lookup('user', True)
+                return SessionPrincipal(entry[1]) if entry[1]['is_active'] is not False else None
+            cache_lookup('user', False)
+
+        row = db.session.query(*PRINCIPAL_COLUMNS).filter(User.id == user_id).first()
+        if row is None:
+            UserCache.invalidate(user_id)
+            return None
+
+        data = row._asdict()
+        if data['is_active'] is False:
+            UserCache.invalidate(user_id)
+            return None
+        ttl = current_app.config.get('USER_CACHE_TTL_SECONDS', DEFAULT_TTL_SECONDS)
+        if ttl > 0:
+            with _lock:
+                if len(_cache) >= MAX_ENTRIES:
+                    for key in [key for key, (expires, _) in _cache.items() if expires <= now]:
+                        del _cache[key]
+                    if len(_cache) >= MAX_ENTRIES:
+                        _cache.clear()
+                _cache[user_id] = (now + ttl, data)
+        return SessionPrincipal(data)
+
+    @staticmethod
+    def invalidate(user_id):
+        """Retire un utilisateur du cache (profil modifié, désactivé ou supprimé)"""
+        with _lock:
+            _cache.pop(user_id, None)
+
+    @staticmethod
+    def clear():
+        with _lock:
+            _cache.clear()
+
+
+@event.listens_for(Session, 'after_flush')
+def _invalidate_flushed_users(session, flush_context):
+    """Invalide les utilisateurs modifiés ou supprimés, puis à nouveau au commit
+
+    La seconde invalidation évite qu'une requête concurrente remette en
+    cache l'ancienne version lue avant le commit.
+    """
+    user_ids = {obj.id for obj in list(session.dirty) + list(session.deleted) if isinstance(obj, User)}
+    if user_ids:
+        for user_id in user_ids:
+            UserCache.invalidate(user_id)
+        session.info.setdefault('invalidated_users', set()).update(user_ids)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed_users(session):
+    for user_id in session.info.pop('invalidated_users', ()):
+        UserCache.invalidate(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_invalidated_users(session):
+    session.info.pop('invalidated_users', None)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _invalidate_bulk_changes(orm_execute_state):
+    """Les UPDATE/DELETE en masse sur les utilisateurs vident le cache"""
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    if orm_execute_state.bind_mapper is User.__mapper__:
+        UserCache.clear()
@@ -3,9 +3,10 @@ Configuration de sécurité avancée pour le rate limiting
 Définit les limites par type de route et fonctionnalités
 """
 
-from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
 import logging
+import os
+from flask import request
+from flask_limiter.util import get_remote_address
 
 logger = logging.getLogger(__name__)
 
@@ -30,83 +31,62 @@ RATE_LIMITS = {
     'default': '100 per minute, 1000 per hour'   # Routes normales : 100/min, 1000/heure
 }
 
+# Stockages partagés : memory:// (un seul processus), sqlite:///chemin (workers d'un même hôte),
+# redis:// ou valkey:// (plusieurs hôtes, nécessite le paquet redis)
+DEFAULT_STORAGE_URI = 'memory://'
+
+# Limite appliquée aux routes sans décorateur : celle du limiter historique de
+# model.extensions (RATE_LIMITS['default'] n'a jamais été appliquée à ces routes)
+DEFAULT_LIMITS = '500 per day, 200 per hour'
+
+
+def resolve_storage_uri(uri, instance_path):
+    """Chemin relatif d'un stockage sqlite:// résolu par rapport au dossier instance de l'application
+
+    sqlite:///chemin/absolu est inchangé ; sqlite://ratelimit.sqlite3 ne dépend plus du
+    répertoire de lancement.
+    """
+    scheme, _, path = uri.partition('://')
+    if scheme != 'sqlite' or not path or os.path.isabs(path):
+        return uri
+    return f"sqlite://{os.path.join(instance_path, path)}"
+
+
 # Configuration du rate limiter
 def configure_rate_limiter(app):
-    """Configure le rate limiter avec des paramètres sécurisés"""
-    
-    # Configuration de stockage selon l'environnement
-    storage_uri = "memory://"
-    if app.config.get('FLASK_ENV') == 'production':
-        # En production, utiliser Redis si disponible
-        storage_uri = "redis://localhost:6379"
-    
-    # Créer l'instance du limiter
-    limiter_instance = Limiter(
-        app=app,
-        key_func=get_remote_address,
-        default_limits=RATE_LIMITS['default'],
-        storage_uri=storage_uri,
-    )
-    
-    # Mettre à jour la variable globale pour les décorateurs
-    global limiter
-    limiter = limiter_instance
+    """Configure l'unique rate limiter de l'application (model.extensions.limiter)
+
+    Les compteurs sont partagés entre workers via RATELIMIT_STORAGE_URI et
+    comptés en fenêtre glissante (RATELIMIT_STRATEGY).
+    """
+    from model.extensions import limiter as limiter_instance
+    from security_logging import security_logger
+    import rate_limit_storage  # noqa: F401 - enregistre le schéma sqlite://
+
+    app.config.setdefault('RATELIMIT_STORAGE_URI', os.getenv('RATELIMIT_STORAGE_URI', DEFAULT_STORAGE_URI))
+    app.config['RATELIMIT_STORAGE_URI'] = resolve_storage_uri(app.config['RATELIMIT_STORAGE_URI'],
+                                                              app.instance_path)
+    app.config.setdefault('RATELIMIT_STRATEGY', os.getenv('RATELIMIT_STRATEGY', 'moving-window'))
+    app.config.setdefault('RATELIMIT_DEFAULT', DEFAULT_LIMITS)
+    app.config.setdefault('RATELIMIT_KEY_PREFIX', 'meet')
+    # Stockage indisponible : les requêtes passent plutôt que d'échouer
+    app.config.setdefault('RATELIMIT_SWALLOW_ERRORS', True)
+    app.config.setdefault('RATELIMIT_IN_MEMORY_FALLBACK_ENABLED', True)
+
+    limiter_instance.init_app(app)
     
     # Logging des violations de rate limiting
     @app.errorhandler(429)
     def ratelimit_handler(e):
         """Handler personnalisé pour les violations de rate limiting"""
-        from flask import request
         logger.warning(f"Rate limit dépassé pour {get_remote_address()} sur {request.endpoint}")
+        security_logger.log_rate_limit_violation(str(e.description))
         return {
             'success': False,
             'error': 'Trop de requêtes. Veuillez réessayer plus tard.',
             'message': str(e.description)
         }, 429
     
-    logger.info("Rate limiter configuré avec sécurité renforcée")
+    logger.info(f"Rate limiter configuré ({app.config['RATELIMIT_STRATEGY']}, "
+                f"{app.config['RATELIMIT_STORAGE_URI'].split('://', 1)[0]})")
     return limiter_instance
-
-
-# Création du limiter global
-limiter = None
-
-# Décorateurs de rate limiting personnalisés
-def strict_rate_limit(limit_string):
-    """Rate limit strict avec logging"""
-    def decorator(f):
-        from functools import wraps
-        
-        @wraps(f)
-        def decorated_function(*args, **kwargs):
-            if limiter:
-                ip = get_remote_address()
-                endpoint = f.__name__
-                logger.info(f"Requête rate-limited: {endpoint} depuis {ip}")
-                return limiter.limit(limit_string)(f)(*args, **kwargs)
-            else:
-                return f(*args, **kwargs)
-        
-        return decorated_function
-    return decorator
-
-
-def critical_rate_limit(limit_string):
-    """Rate limit pour routes critiques avec logging avancé"""
-    def decorator(f):
-        from functools import wraps
-        
-        @wraps(f)
-        def decorated_function(*args, **kwargs):
-            if limiter:
-                ip = get_remote_address()
-                endpoint = f.__name__
-                user_agent = request.headers.get('User-Agent', 'Unknown')
-                
-                logger.warning(f"Requête critique: {endpoint} depuis {ip} - {user_agent}")
-                return limiter.limit(limit_string)(f)(*args, **kwargs)
-            else:
-                return f(*args, **kwargs)
-        
-        return decorated_function
-    return decorator
\ No newline at end of file
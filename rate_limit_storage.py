@@ -0,0 +1,335 @@
+"""
+Stockage partagé des compteurs de rate limiting pour un déploiement sur un seul hôte
+Les workers d'un même serveur partagent un fichier SQLite (mode WAL)
+
+URI : sqlite:///chemin/absolu/ratelimit.sqlite3 ou sqlite://chemin/relatif.sqlite3
+(relatif au dossier instance de l'application, voir rate_limit_config)
+
+Chaque écriture prend le verrou d'écriture unique du fichier. Pour ne pas le
+prendre à chaque requête, les entrées de fenêtre glissante acceptées loin de
+leur limite sont gardées dans le worker et écrites par lots toutes les
+`flush_interval` secondes (RATELIMIT_STORAGE_OPTIONS). Les limites basses
+(connexion, inscription...) et les clés proches de leur limite sont toujours
+vérifiées dans une transaction : elles restent exactes. Pour les autres, les
+lots pas encore écrits des autres workers ne sont pas vus : le dépassement est
+borné par un dixième de la limite par autre worker, pendant au plus
+`flush_interval`. `flush_interval=0` rend toutes les vérifications exactes
+(voir python -m benchmarks.rate_limit).
+"""
+
+import atexit
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from limits.storage import MovingWindowSupport, Storage
+
+logger = logging.getLogger(__name__)
+
+# Les entrées expirées sont supprimées par lots, au plus une fois par intervalle
+CLEANUP_INTERVAL_SECONDS = 30
+
+# Écriture groupée : intervalle par défaut, limites toujours exactes en dessous de
+# BATCH_MIN_LIMIT, et part de la limite au-delà de laquelle une clé est vérifiée exactement
+DEFAULT_FLUSH_INTERVAL = 0.5
+BATCH_MIN_LIMIT = 100
+BATCH_HEADROOM = 2
+BATCH_LOCAL_SHARE = 10
+
+# Durée maximale de mémorisation locale d'une clé refusée (et des réinitialisations)
+MAX_DENY_SECONDS = 3600
+
+
+class SQLiteStorage(Storage, MovingWindowSupport):
+    """Compteurs à fenêtre fixe et journaux de fenêtre glissante dans SQLite
+
+    Une acquisition en fenêtre glissante est soit ajoutée au lot local du
+    worker (clé loin de sa limite), soit vérifiée dans une seule transaction
+    qui écrit aussi le lot en attente. Les clés refusées sont mémorisées
+    localement jusqu'à la libération de leur fenêtre : un client qui insiste
+    ne provoque plus d'écriture ni de verrou sur le fichier partagé. reset()
+    et clear() sont enregistrés en base pour lever ces refus dans tous les workers.
+    """
+
+    STORAGE_SCHEME = ['sqlite']
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, **options):
+        path = uri.split('://', 1)[1]
+        if not path:
+            raise ValueError("Chemin manquant dans l'URI de stockage sqlite://")
+        self.path = path
+        self.timeout = float(options.get('timeout', 5))
+        self.flush_interval = float(options.get('flush_interval', DEFAULT_FLUSH_INTERVAL))
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._denied = {}
+        self._pending = {}
+        self._flusher_pid = None
+        self._last_cleanup = 0.0
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        connection = self._connection()
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS counters ('
+            'key TEXT PRIMARY KEY, value INTEGER NOT NULL, expires_at REAL NOT NULL)'
+        )
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS window_entries ('
+            'key TEXT NOT NULL, at REAL NOT NULL, expires_at REAL NOT NULL)'
+        )
+        connection.execute(
+            'CREATE INDEX IF NOT EXISTS idx_window_entries_key_at ON window_entries (key, at)'
+        )
+        connection.execute(
+            'CREATE INDEX IF NOT EXISTS idx_window_entries_expires_at ON window_entries (expires_at)'
+        )
+        # Dernier reset() ('*') ou clear() par clé, pour invalider les refus mémorisés
+        connection.execute('CREATE TABLE IF NOT EXISTS resets (key TEXT PRIMARY KEY, at REAL NOT NULL)')
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        # Une connexion héritée du processus maître (fork) n'est pas réutilisée
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    # Fenêtre fixe
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        now = time.time()
+        row = self._connection().execute(
+            'INSERT INTO counters (key, value, expires_at) VALUES (?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET '
+            'value = CASE WHEN expires_at <= ? THEN excluded.value ELSE value + excluded.value END, '
+            'expires_at = CASE WHEN expires_at <= ? THEN excluded.expires_at ELSE expires_at END '
+            'RETURNING value',
+            (key, amount, now + expiry, now, now)
+        ).fetchone()
+        return row[0]
+
+    def get(self, key: str) -> int:
+        row = self._connection().execute(
+            'SELECT value FROM counters WHERE key = ? AND expires_at > ?', (key, time.time())
+        ).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key: str) -> float:
+        now = time.time()
+        row = self._connection().execute(
+            'SELECT expires_at FROM counters WHERE key = ? AND expires_at > ?', (key, now)
+        ).fetchone()
+        return row[0] if row else now
+
+    # Fenêtre glissante
+
+    def acquire_entry(self, key: str, limit: int, expiry: int, amount: int = 1) -> bool:
+        if amount > limit:
+            return False
+        now = time.time()
+        if self._is_denied(key, now):
+            return False
+
+        if self.flush_interval > 0 and limit >= BATCH_MIN_LIMIT:
+            with self._lock:
+                local = len(self._pending.get(key, ()))
+            if local + amount <= limit // BATCH_LOCAL_SHARE:
+                shared, = self._connection().execute(
+                    'SELECT COUNT(*) FROM window_entries WHERE key = ? AND at > ?', (key, now - expiry)
+                ).fetchone()
+                if shared + local + amount <= limit // BATCH_HEADROOM:
+                    with self._lock:
+                        self._pending.setdefault(key, []).extend([(now, now + expiry)] * amount)
+                    self._start_flusher()
+                    return True
+        return self._acquire_exact(key, limit, expiry, amount, now)
+
+    def _acquire_exact(self, key, limit, expiry, amount, now):
+        """Vérifie et enregistre une acquisition dans une transaction, avec le lot en attente"""
+        connection = self._connection()
+        pending = self._take_pending()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            self._insert_pending(connection, pending)
+            count, = connection.execute(
+                'SELECT COUNT(*) FROM window_entries WHERE key = ? AND at > ?', (key, now - expiry)
+            ).fetchone()
+            if count + amount > limit:
+                # La fenêtre se libère quand assez d'entrées anciennes auront expiré
+                freed_at, = connection.execute(
+                    'SELECT at FROM window_entries WHERE key = ? AND at > ? ORDER BY at LIMIT 1 OFFSET ?',
+                    (key, now - expiry, count + amount - limit - 1)
+                ).fetchone()
+                connection.execute('COMMIT')
+                self._deny(key, freed_at + expiry, now)
+                return False
+            connection.executemany(
+                'INSERT INTO window_entries (key, at, expires_at) VALUES (?, ?, ?)',
+                [(key, now, now + expiry)] * amount
+            )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            self._restore_pending(pending)
+            raise
+        self._maybe_cleanup(now)
+        return True
+
+    def get_moving_window(self, key: str, limit: int, expiry: int):
+        now = time.time()
+        oldest, count = self._connection().execute(
+            'SELECT MIN(at), COUNT(*) FROM window_entries WHERE key = ? AND at > ?', (key, now - expiry)
+        ).fetchone()
+        with self._lock:
+            local = [at for at, _ in self._pending.get(key, ()) if at > now - expiry]
+        if local:
+            oldest = min(local) if not count else min(oldest, min(local))
+            count += len(local)
+        return (oldest if count else now), count
+
+    # Écriture groupée
+
+    def _take_pending(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+    def _restore_pending(self, pending):
+        with self._lock:
+            for key, entries in pending.items():
+                self._pending.setdefault(key, []).extend(entries)
+
+    @staticmethod
+    def _insert_pending(connection, pending):
+        if pending:
+            connection.executemany(
+                'INSERT INTO window_entries (key, at, expires_at) VALUES (?, ?, ?)',
+                [(key, at, expires_at) for key, entries in pending.items() for at, expires_at in entries]
+            )
+
+    def flush(self) -> int:
+        """Écrit le lot en attente en une transaction ; retourne le nombre d'entrées écrites"""
+        pending = self._take_pending()
+        if not pending:
+            return 0
+        connection = self._connection()
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                self._insert_pending(connection, pending)
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+        except sqlite3.Error as e:
+            self._restore_pending(pending)
+            logger.warning(f"Écriture du lot de rate limiting reportée: {e}")
+            return 0
+        self._maybe_cleanup(time.time())
+        return sum(len(entries) for entries in pending.values())
+
+    def _start_flusher(self):
+        """Thread d'écriture du lot, démarré une fois par processus (après un fork aussi)"""
+        if self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_loop, name='ratelimit-flush', daemon=True).start()
+        atexit.register(self.flush)
+
+    def _flush_loop(self):
+        pid = os.getpid()
+        while self._flusher_pid == pid:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    # Refus mémorisés
+
+    def _deny(self, key, until, now):
+        with self._lock:
+            if len(self._denied) >= 10000:
+                self._denied = {k: v for k, v in self._denied.items() if v[0] > now}
+            self._denied[key] = (min(until, now + MAX_DENY_SECONDS), now)
+
+    def _is_denied(self, key, now):
+        with self._lock:
+            denied = self._denied.get(key)
+        if denied is None or denied[0] <= now:
+            return False
+        # Lecture seule : un reset() ou clear() fait par un autre worker lève le refus
+        reset_at, = self._connection().execute(
+            "SELECT MAX(at) FROM resets WHERE key IN (?, '*')", (key,)
+        ).fetchone()
+        if reset_at is not None and reset_at >= denied[1]:
+            with self._lock:
+                if self._denied.get(key) == denied:
+                    del self._denied[key]
+            return False
+        return True
+
+    def _record_reset(self, connection, key):
+        connection.execute(
+            'INSERT INTO resets (key, at) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET at = excluded.at',
+            (key, time.time())
+        )
+
+    def _maybe_cleanup(self, now):
+        if now - self._last_cleanup < CLEANUP_INTERVAL_SECONDS:
+            return
+        self._last_cleanup = now
+        try:
+            self.cleanup()
+        except sqlite3.OperationalError as e:
+            # Base occupée par un autre worker : le nettoyage sera fait plus tard
+            logger.debug(f"Nettoyage du stockage de rate limiting reporté: {e}")
+
+    def cleanup(self) -> int:
+        """Supprime les compteurs et entrées expirés ; retourne le nombre de lignes supprimées"""
+        now = time.time()
+        connection = self._connection()
+        removed = connection.execute('DELETE FROM window_entries WHERE expires_at <= ?', (now,)).rowcount
+        removed += connection.execute('DELETE FROM counters WHERE expires_at <= ?', (now,)).rowcount
+        connection.execute('DELETE FROM resets WHERE at <= ?', (now - MAX_DENY_SECONDS,))
+        return removed
+
+    # Administration
+
+    def check(self) -> bool:
+        try:
+            self._connection().execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> int:
+        self._take_pending()
+        connection = self._connection()
+        removed = connection.execute('DELETE FROM window_entries').rowcount
+        removed += connection.execute('DELETE FROM counters').rowcount
+        self._record_reset(connection, '*')
+        with self._lock:
+            self._denied.clear()
+        return removed
+
+    def clear(self, key: str) -> None:
+        with self._lock:
+            self._pending.pop(key, None)
+        connection = self._connection()
+        connection.execute('DELETE FROM window_entries WHERE key = ?', (key,))
+        connection.execute('DELETE FROM counters WHERE key = ?', (key,))
+        self._record_reset(connection, key)
+        with self._lock:
+            self._denied.pop(key, None)
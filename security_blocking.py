@@ -0,0 +1,155 @@
+"""
+Blocage automatique des clients abusifs pour l'application Meet
+Les empreintes et adresses IP trop souvent signalées par security_logger sont
+refusées avant tout accès à la base ou calcul de hachage
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Optional
+from flask import Flask, Response, jsonify, request
+from flask_limiter.util import get_remote_address
+from security_logging import security_logger, INTRUSION_CATEGORIES
+
+logger = logging.getLogger(__name__)
+
+# Événements pris en compte pour le blocage
+BLOCKING_EVENTS = frozenset(INTRUSION_CATEGORIES.values())
+
+
+class ExpiringSet:
+    """Ensemble de clés expirant chacune après sa propre durée, borné en taille"""
+
+    def __init__(self, max_size: int = 100000):
+        self.max_size = max_size
+        self._expiry = {}
+        self._lock = threading.Lock()
+
+    def add(self, key, ttl: float):
+        now = time.monotonic()
+        with self._lock:
+            if key not in self._expiry and len(self._expiry) >= self.max_size:
+                self._prune(now)
+            self._expiry[key] = max(self._expiry.get(key, 0), now + ttl)
+
+    def remaining(self, key) -> float:
+        """Secondes restantes avant expiration, 0 si la clé est absente"""
+        expires = self._expiry.get(key)
+        if expires is None:
+            return 0
+        left = expires - time.monotonic()
+        if left <= 0:
+            with self._lock:
+                if self._expiry.get(key) == expires:
+                    del self._expiry[key]
+            return 0
+        return left
+
+    def discard(self, key):
+        with self._lock:
+            self._expiry.pop(key, None)
+
+    def items(self):
+        """Clés actives et secondes restantes"""
+        now = time.monotonic()
+        with self._lock:
+            return [(key, expires - now) for key, expires in self._expiry.items() if expires > now]
+
+    def _prune(self, now):
+        for key in [key for key, expires in self._expiry.items() if expires <= now]:
+            del self._expiry[key]
+        # Toujours plein : on oublie les blocages les plus proches de leur fin
+        overflow = len(self._expiry) - self.max_size + 1
+        if overflow > 0:
+            for key, _ in sorted(self._expiry.items(), key=lambda item: item[1])[:overflow]:
+                del self._expiry[key]
+
+    def __contains__(self, key):
+        return self.remaining(key) > 0
+
+    def __len__(self):
+        return len(self._expiry)
+
+
+class AutoBlocker:
+    """Bloque une empreinte (IP + navigateur + route) ou une IP au-delà d'un seuil d'événements
+
+    ip_threshold=None désactive le blocage par IP (adresse du client inconnue derrière un proxy).
+    """
+
+    def __init__(self, threshold: int, ip_threshold: Optional[int], window_minutes: int, block_seconds: int):
+        self.threshold = threshold
+        self.ip_threshold = ip_threshold
+        self.window_minutes = window_minutes
+        self.block_seconds = block_seconds
+        self.blocked = ExpiringSet()
+
+    def on_security_event(self, event: str, fingerprint: str, ip: str):
+        """Abonné de security_logger.intrusions : décide d'un blocage après chaque événement"""
+        if event not in BLOCKING_EVENTS:
+            return
+        aggregator = security_logger.intrusions
+        if ('fingerprint', fingerprint) not in self.blocked and aggregator.count(
+                fingerprint, self.window_minutes, events=BLOCKING_EVENTS) >= self.threshold:
+            self.block(('fingerprint', fingerprint), ip)
+        if self.ip_threshold and ip and ('ip', ip) not in self.blocked and aggregator.count(
+                minutes=self.window_minutes, events=BLOCKING_EVENTS, ip=ip) >= self.ip_threshold:
+            self.block(('ip', ip), ip)
+
+    def block(self, key, ip=None):
+        self.blocked.add(key, self.block_seconds)
+        logger.warning(f"Blocage automatique de {key[0]} {key[1]} pour {self.block_seconds}s")
+        security_logger.log_suspicious_activity('AUTO_BLOCK', {
+            'scope': key[0], 'key': key[1], 'ip': ip, 'seconds': self.block_seconds
+        })
+
+    def unblock(self, scope: str, key: str):
+        self.blocked.discard((scope, key))
+
+    def retry_after(self) -> float:
+        """Secondes de blocage restantes pour la requête en cours, 0 si elle est autorisée"""
+        if not len(self.blocked):
+            return 0
+        # Même adresse que Flask-Limiter : X-Forwarded-For n'est pris en compte
+        # que derrière un proxy de confiance (ProxyFix, voir TRUSTED_PROXIES)
+        ip = get_remote_address()
+        return max(self.blocked.remaining(('ip', ip)),
+                   self.blocked.remaining(('fingerprint', security_logger.request_fingerprint())))
+
+
+def init_auto_block(app: Flask):
+    """Refuse les clients bloqués avant tout autre traitement de la requête"""
+    if not app.config.get('AUTO_BLOCK_ENABLED', True):
+        return
+
+    # Sans TRUSTED_PROXIES explicite, l'application peut être derrière un proxy non déclaré :
+    # toutes les requêtes auraient alors son adresse et un blocage par IP bloquerait tout le site
+    ip_blocking = app.config.get('TRUSTED_PROXIES', os.getenv('TRUSTED_PROXIES')) is not None
+    if not ip_blocking:
+        logger.warning("TRUSTED_PROXIES non défini : blocage automatique par IP désactivé, "
+                       "seules les empreintes sont bloquées")
+
+    blocker = AutoBlocker(
+        threshold=app.config.get('AUTO_BLOCK_THRESHOLD', 10),
+        ip_threshold=app.config.get('AUTO_BLOCK_IP_THRESHOLD', 30) if ip_blocking else None,
+        window_minutes=app.config.get('AUTO_BLOCK_WINDOW_MINUTES', 5),
+        block_seconds=app.config.get('AUTO_BLOCK_SECONDS', 900)
+    )
+    security_logger.intrusions.subscribe(blocker.on_security_event)
+    app.extensions['auto_block'] = blocker
+
+    # Enregistré avant les autres before_request : aucun accès à l'utilisateur ni à la session
+    @app.before_request
+    def reject_blocked_clients():
+        if request.endpoint == 'static':
+            return None
+        retry_after = blocker.retry_after()
+        if not retry_after:
+            return None
+        headers = {'Retry-After': str(int(retry_after) + 1)}
+        if request.path.startswith('/api/'):
+            return jsonify({'success': False, 'error': 'Trop de requêtes, réessayez plus tard'}), 429, headers
+        return Response('Trop de requêtes, réessayez plus tard', status=429, headers=headers,
+                        mimetype='text/plain')
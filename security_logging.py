@@ -1,41 +1,309 @@
 """
 Module de logging de sécurité pour la détection d'intrusions
 Enregistre les activités suspectes et les tentatives d'attaque
+
+Les événements sont mis en file sur le thread de la requête puis sérialisés
+et écrits au format NDJSON (un objet JSON par ligne) par un thread dédié.
+Le thread de la requête calcule seulement l'empreinte du client (une fois
+par requête), nécessaire à l'agrégation et au blocage automatique. En cas
+d'afflux, les événements répétés d'une même empreinte sont échantillonnés
+et, si la file est pleine, abandonnés plutôt que de bloquer la requête.
 """
 
+import atexit
 import logging
 import json
-from datetime import datetime
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from flask import request
+from flask_limiter.util import get_remote_address
 from typing import Dict, Any, Optional
 import hashlib
 
+LOG_FILE = 'logs/security.log'
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 10
+LOG_ROTATE_SECONDS = 24 * 3600
+QUEUE_SIZE = 10000
+
+# Échantillonnage par (type d'événement, empreinte) : les SAMPLE_BURST premiers
+# événements de chaque fenêtre sont écrits, puis un sur SAMPLE_RATE
+SAMPLE_WINDOW_SECONDS = 60
+SAMPLE_BURST = 5
+SAMPLE_RATE = 100
+SAMPLE_MAX_KEYS = 10000
+
+# Agrégation des tentatives d'intrusion : une case par minute sur la dernière heure
+INTRUSION_BUCKET_SECONDS = 60
+INTRUSION_BUCKETS = 60
+INTRUSION_MAX_KEYS_PER_BUCKET = 10000
+
+# Catégories retournées par get_recent_intrusion_attempts
+INTRUSION_CATEGORIES = {
+    'sql_injection': 'SQL_INJECTION_ATTEMPT',
+    'xss': 'XSS_ATTEMPT',
+    'brute_force': 'BRUTE_FORCE_ATTEMPT',
+    'rate_limit_violations': 'RATE_LIMIT_VIOLATION',
+    'unauthorized_access': 'UNAUTHORIZED_ACCESS',
+}
+
+
+class SecurityLogFileHandler(RotatingFileHandler):
+    """Fichier tourné à la taille (max_bytes) ou au changement de période (rotate_seconds)"""
+    
+    def __init__(self, filename, max_bytes, backup_count, rotate_seconds):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count,
+                         encoding='utf-8', delay=True)
+        self.rotate_seconds = rotate_seconds
+        now = time.time()
+        period_start = now - now % rotate_seconds
+        self.rollover_at = period_start + rotate_seconds
+        # Fichier laissé par un précédent démarrage pendant une période antérieure
+        if os.path.exists(filename) and os.path.getmtime(filename) < period_start:
+            self.rollover_at = now
+    
+    def shouldRollover(self, record):
+        if self.stream is None:
+            self.stream = self._open()
+        size = self.stream.tell()
+        if size == 0:
+            return False
+        return time.time() >= self.rollover_at or (self.maxBytes > 0 and size >= self.maxBytes)
+    
+    def doRollover(self):
+        super().doRollover()
+        now = time.time()
+        self.rollover_at = now - now % self.rotate_seconds + self.rotate_seconds
+
+
+class NDJSONFormatter(logging.Formatter):
+    """Un événement JSON par ligne"""
+    
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+        }
+        if isinstance(record.msg, dict):
+            entry.update(record.msg)
+        else:
+            entry['message'] = record.getMessage()
+        dropped = getattr(record, 'dropped', 0)
+        if dropped:
+            entry['dropped'] = dropped
+        return json.dumps(entry, ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Met les événements en file sans jamais bloquer ; compte ceux abandonnés"""
+    
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+    
+    def prepare(self, record):
+        # La sérialisation est faite par le thread d'écriture
+        return record
+    
+    def take_dropped(self) -> int:
+        """Retourne et remet à zéro le nombre d'événements abandonnés"""
+        with self._dropped_lock:
+            dropped, self.dropped = self.dropped, 0
+        return dropped
+    
+    def enqueue(self, record):
+        # Le compte est pris avant l'envoi et rendu en cas d'échec : aucun abandon n'est perdu
+        # entre threads de requête concurrents
+        dropped = self.take_dropped()
+        if dropped:
+            record.dropped = dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += dropped + 1
+
+
+class _IntrusionBucket:
+    """Événements d'une minute : totaux par type, par (type, empreinte) et par (type, IP)"""
+    
+    __slots__ = ('slot', 'by_event', 'by_key', 'by_ip', 'clients')
+    
+    def __init__(self, slot):
+        self.slot = slot
+        self.by_event = {}
+        self.by_key = {}
+        self.by_ip = {}
+        self.clients = {}
+
+
+class IntrusionAggregator:
+    """Fenêtre glissante des événements de sécurité, en mémoire
+    
+    Anneau de cases d'une minute : l'enregistrement est en O(1) et les
+    requêtes parcourent au plus INTRUSION_BUCKETS cases, sans relire les
+    fichiers de log. Les compteurs sont propres à chaque processus.
+    """
+    
+    def __init__(self, bucket_seconds: int = INTRUSION_BUCKET_SECONDS, buckets: int = INTRUSION_BUCKETS):
+        self.bucket_seconds = bucket_seconds
+        self.buckets = [None] * buckets
+        self._lock = threading.Lock()
+        self._listeners = []
+    
+    def _slot(self, now=None) -> int:
+        return int((time.time() if now is None else now) // self.bucket_seconds)
+    
+    def record(self, event: str, fingerprint: str, ip: Optional[str] = None,
+               user_agent: Optional[str] = None, now: Optional[float] = None):
+        """Compte un événement et prévient les abonnés"""
+        slot = self._slot(now)
+        index = slot % len(self.buckets)
+        key = (event, fingerprint)
+        with self._lock:
+            bucket = self.buckets[index]
+            if bucket is None or bucket.slot != slot:
+                bucket = self.buckets[index] = _IntrusionBucket(slot)
+            bucket.by_event[event] = bucket.by_event.get(event, 0) + 1
+            if key in bucket.by_key or len(bucket.by_key) < INTRUSION_MAX_KEYS_PER_BUCKET:
+                bucket.by_key[key] = bucket.by_key.get(key, 0) + 1
+                bucket.clients[fingerprint] = (ip, user_agent)
+            ip_key = (event, ip)
+            if ip_key in bucket.by_ip or len(bucket.by_ip) < INTRUSION_MAX_KEYS_PER_BUCKET:
+                bucket.by_ip[ip_key] = bucket.by_ip.get(ip_key, 0) + 1
+        for listener in self._listeners:
+            try:
+                listener(event, fingerprint, ip)
+            except Exception as e:
+                logging.getLogger(__name__).error(f"Erreur d'un abonné aux événements de sécurité: {e}")
+    
+    def subscribe(self, listener):
+        """Abonne listener(event, fingerprint, ip), appelé après chaque enregistrement"""
+        self._listeners.append(listener)
+    
+    def _window(self, minutes: int):
+        """Cases des `minutes` dernières minutes (appelé sous verrou)"""
+        current = self._slot()
+        oldest = current - max(1, int(minutes * 60 // self.bucket_seconds)) + 1
+        return [b for b in self.buckets if b is not None and oldest <= b.slot <= current]
+    
+    def counts(self, minutes: int = 60) -> Dict[str, int]:
+        """Nombre d'événements par type sur la fenêtre"""
+        totals = {}
+        with self._lock:
+            for bucket in self._window(minutes):
+                for event, count in bucket.by_event.items():
+                    totals[event] = totals.get(event, 0) + count
+        return totals
+    
+    def count(self, fingerprint: str = None, minutes: int = 60, events=None, ip: str = None) -> int:
+        """Nombre d'événements d'une empreinte (ou d'une IP) sur la fenêtre, éventuellement limités à certains types"""
+        total = 0
+        with self._lock:
+            for bucket in self._window(minutes):
+                counts, client = (bucket.by_key, fingerprint) if ip is None else (bucket.by_ip, ip)
+                for event in (events or bucket.by_event):
+                    total += counts.get((event, client), 0)
+        return total
+    
+    def top_offenders(self, minutes: int = 60, limit: int = 10, events=None):
+        """Empreintes les plus actives sur la fenêtre, avec le détail par type"""
+        offenders = {}
+        with self._lock:
+            for bucket in self._window(minutes):
+                for (event, fingerprint), count in bucket.by_key.items():
+                    if events and event not in events:
+                        continue
+                    offender = offenders.get(fingerprint)
+                    if offender is None:
+                        ip, user_agent = bucket.clients.get(fingerprint, (None, None))
+                        offender = offenders[fingerprint] = {
+                            'fingerprint': fingerprint, 'ip': ip, 'user_agent': user_agent,
+                            'total': 0, 'events': {}
+                        }
+                    offender['total'] += count
+                    offender['events'][event] = offender['events'].get(event, 0) + count
+        return sorted(offenders.values(), key=lambda o: o['total'], reverse=True)[:limit]
+
+
+class SecurityLogListener(QueueListener):
+    """Thread d'écriture ; à l'arrêt, attend de la place dans la file pour la vider entièrement"""
+    
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
 
 class SecurityLogger:
     """Logger spécialisé pour la sécurité et la détection d'intrusions"""
     
-    def __init__(self):
-        # Créer le dossier logs s'il n'existe pas
-        import os
-        os.makedirs('logs', exist_ok=True)
+    def __init__(self, log_file: str = LOG_FILE):
+        self.log_file = log_file
+        os.makedirs(os.path.dirname(log_file) or '.', exist_ok=True)
         
-        # Créer un logger dédié à la sécurité
+        # Créer un logger dédié à la sécurité ; les événements ne remontent pas
+        # aux handlers synchrones du logger racine
         self.logger = logging.getLogger('security')
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
         
-        # Configurer le handler pour les logs de sécurité
-        if not self.logger.handlers:
-            handler = logging.FileHandler('logs/security.log')
-            formatter = logging.Formatter(
-                '%(asctime)s - %(levelname)s - %(message)s'
+        self._pid = None
+        self._listener = None
+        self._queue_handler = None
+        self._start_lock = threading.Lock()
+        self._samples = {}
+        self._sample_lock = threading.Lock()
+        self.intrusions = IntrusionAggregator()
+        atexit.register(self.stop)
+    
+    def _ensure_listener(self):
+        """Démarre le thread d'écriture (à nouveau après un fork, les threads n'étant pas copiés)"""
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            log_queue = queue.Queue(maxsize=QUEUE_SIZE)
+            file_handler = SecurityLogFileHandler(
+                self.log_file, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_ROTATE_SECONDS
             )
-            handler.setFormatter(formatter)
-            self.logger.addHandler(handler)
-            self.logger.setLevel(logging.INFO)
+            file_handler.setFormatter(NDJSONFormatter())
+            if self._queue_handler is not None:
+                self.logger.removeHandler(self._queue_handler)
+            self._queue_handler = NonBlockingQueueHandler(log_queue)
+            self.logger.addHandler(self._queue_handler)
+            self._listener = SecurityLogListener(log_queue, file_handler)
+            self._listener.start()
+            self._pid = os.getpid()
+    
+    def stop(self):
+        """Écrit les événements en attente et arrête le thread d'écriture"""
+        with self._start_lock:
+            if self._queue_handler is not None:
+                self.logger.removeHandler(self._queue_handler)
+            if self._listener is not None and self._pid == os.getpid():
+                dropped = self._queue_handler.take_dropped()
+                if dropped:
+                    # Événements abandonnés depuis le dernier écrit
+                    record = self.logger.makeRecord(self.logger.name, logging.WARNING, __file__, 0,
+                                                    {'event': 'SECURITY_LOG_DROPPED'}, None, None)
+                    record.dropped = dropped
+                    self._queue_handler.queue.put(record)
+                self._listener.stop()
+                for handler in self._listener.handlers:
+                    handler.close()
+            self._listener = None
+            self._queue_handler = None
+            self._pid = None
     
     def _get_client_info(self) -> Dict[str, str]:
         """Récupère les informations sur le client"""
         return {
-            'ip': request.environ.get('HTTP_X_FORWARDED_FOR', request.remote_addr),
+            'ip': get_remote_address(),
             'user_agent': request.headers.get('User-Agent', 'Unknown'),
             'method': request.method,
             'endpoint': request.endpoint,
@@ -43,203 +311,156 @@ class SecurityLogger:
             'timestamp': datetime.utcnow().isoformat()
         }
     
+    def request_fingerprint(self) -> str:
+        """Empreinte de la requête en cours, calculée une seule fois par requête"""
+        fingerprint = request.environ.get('meet.security_fingerprint')
+        if fingerprint is None:
+            fingerprint = request.environ['meet.security_fingerprint'] = self._create_fingerprint({
+                'ip': get_remote_address(),
+                'user_agent': request.headers.get('User-Agent', 'Unknown'),
+                'endpoint': request.endpoint
+            })
+        return fingerprint
+    
     def _create_fingerprint(self, data: Dict[str, Any]) -> str:
         """Crée une empreinte pour identifier les attaques récurrentes"""
         fingerprint_data = f"{data.get('ip')}_{data.get('user_agent')}_{data.get('endpoint')}"
         return hashlib.md5(fingerprint_data.encode()).hexdigest()[:16]
     
-    def log_sql_injection_attempt(self, input_data: str, field_name: str):
-        """Log une tentative d'injection SQL"""
+    def _sample(self, key) -> Optional[int]:
+        """Décide si un événement est écrit ; retourne le nombre d'événements omis depuis le précédent, None s'il est omis"""
+        now = time.monotonic()
+        with self._sample_lock:
+            state = self._samples.get(key)
+            if state is None or now - state[0] >= SAMPLE_WINDOW_SECONDS:
+                if state is None and len(self._samples) >= SAMPLE_MAX_KEYS:
+                    for stale in [k for k, v in self._samples.items() if now - v[0] >= SAMPLE_WINDOW_SECONDS]:
+                        del self._samples[stale]
+                    if len(self._samples) >= SAMPLE_MAX_KEYS:
+                        self._samples.clear()
+                # [début de fenêtre, événements dans la fenêtre, événements omis]
+                suppressed = state[2] if state else 0
+                self._samples[key] = [now, 1, 0]
+                return suppressed
+            state[1] += 1
+            if state[1] <= SAMPLE_BURST or state[1] % SAMPLE_RATE == 0:
+                suppressed, state[2] = state[2], 0
+                return suppressed
+            state[2] += 1
+            return None
+    
+    def _log_event(self, level: int, event: str, event_type: str, severity: str, details: Dict[str, Any]):
+        """Construit et met en file un événement de sécurité"""
         client_info = self._get_client_info()
-        fingerprint = self._create_fingerprint(client_info)
+        fingerprint = self.request_fingerprint()
+        
+        # Compté avant l'échantillonnage : l'agrégation voit tous les événements
+        self.intrusions.record(event_type, fingerprint, client_info['ip'], client_info['user_agent'])
+        
+        suppressed = self._sample((event, fingerprint))
+        if suppressed is None:
+            return
         
         security_event = {
-            'type': 'SQL_INJECTION_ATTEMPT',
-            'severity': 'HIGH',
+            'event': event,
+            'type': event_type,
+            'severity': severity,
             'fingerprint': fingerprint,
             'client': client_info,
-            'details': {
-                'field': field_name,
-                'input_length': len(input_data),
-                'input_preview': input_data[:100] + '...' if len(input_data) > 100 else input_data
-            }
+            'details': details
         }
+        if suppressed:
+            security_event['suppressed'] = suppressed
         
-        self.logger.warning(f"SQL_INJECTION_ATTEMPT: {json.dumps(security_event)}")
+        self._ensure_listener()
+        self.logger.log(level, security_event)
+    
+    def log_sql_injection_attempt(self, input_data: str, field_name: str):
+        """Log une tentative d'injection SQL"""
+        self._log_event(logging.WARNING, 'SQL_INJECTION_ATTEMPT', 'SQL_INJECTION_ATTEMPT', 'HIGH', {
+            'field': field_name,
+            'input_length': len(input_data),
+            'input_preview': input_data[:100] + '...' if len(input_data) > 100 else input_data
+        })
     
     def log_xss_attempt(self, input_data: str, field_name: str):
         """Log une tentative d'attaque XSS"""
-        client_info = self._get_client_info()
-        fingerprint = self._create_fingerprint(client_info)
-        
-        security_event = {
-            'type': 'XSS_ATTEMPT',
-            'severity': 'HIGH',
-            'fingerprint': fingerprint,
-            'client': client_info,
-            'details': {
-                'field': field_name,
-                'input_length': len(input_data),
-                'input_preview': input_data[:100] + '...' if len(input_data) > 100 else input_data
-            }
-        }
-        
-        self.logger.warning(f"XSS_ATTEMPT: {json.dumps(security_event)}")
+        self._log_event(logging.WARNING, 'XSS_ATTEMPT', 'XSS_ATTEMPT', 'HIGH', {
+            'field': field_name,
+            'input_length': len(input_data),
+            'input_preview': input_data[:100] + '...' if len(input_data) > 100 else input_data
+        })
     
     def log_brute_force_attempt(self, email: str, reason: str):
         """Log une tentative de force brute"""
-        client_info = self._get_client_info()
-        fingerprint = self._create_fingerprint(client_info)
-        
-        security_event = {
-            'type': 'BRUTE_FORCE_ATTEMPT',
-            'severity': 'MEDIUM',
-            'fingerprint': fingerprint,
-            'client': client_info,
-            'details': {
-                'email': email,
-                'reason': reason
-            }
-        }
-        
-        self.logger.warning(f"BRUTE_FORCE_ATTEMPT: {json.dumps(security_event)}")
+        self._log_event(logging.WARNING, 'BRUTE_FORCE_ATTEMPT', 'BRUTE_FORCE_ATTEMPT', 'MEDIUM', {
+            'email': email,
+            'reason': reason
+        })
     
     def log_suspicious_activity(self, activity_type: str, details: Dict[str, Any]):
         """Log une activité suspecte générique"""
-        client_info = self._get_client_info()
-        fingerprint = self._create_fingerprint(client_info)
-        
-        security_event = {
-            'type': activity_type,
-            'severity': 'MEDIUM',
-            'fingerprint': fingerprint,
-            'client': client_info,
-            'details': details
-        }
-        
-        self.logger.warning(f"SUSPICIOUS_ACTIVITY: {json.dumps(security_event)}")
+        self._log_event(logging.WARNING, 'SUSPICIOUS_ACTIVITY', activity_type, 'MEDIUM', details)
     
     def log_invalid_input(self, field_name: str, input_data: str, validation_errors: list):
         """Log une entrée invalide qui pourrait être une tentative d'attaque"""
-        client_info = self._get_client_info()
-        fingerprint = self._create_fingerprint(client_info)
-        
         # Vérifier si les erreurs de validation suggèrent une attaque
-        is_potential_attack = any([
-            'injection' in error.lower() for error in validation_errors
-        ] or [
-            'xss' in error.lower() for error in validation_errors
-        ] or [
-            'forbidden' in error.lower() for error in validation_errors
-        ])
+        is_potential_attack = any(
+            keyword in error.lower()
+            for error in validation_errors
+            for keyword in ('injection', 'xss', 'forbidden')
+        )
         
-        severity = 'HIGH' if is_potential_attack else 'LOW'
-        
-        security_event = {
-            'type': 'INVALID_INPUT',
-            'severity': severity,
-            'fingerprint': fingerprint,
-            'client': client_info,
-            'details': {
+        self._log_event(
+            logging.WARNING if is_potential_attack else logging.INFO,
+            'INVALID_INPUT', 'INVALID_INPUT', 'HIGH' if is_potential_attack else 'LOW', {
                 'field': field_name,
                 'input_length': len(input_data),
                 'validation_errors': validation_errors,
                 'potential_attack': is_potential_attack
             }
-        }
-        
-        if is_potential_attack:
-            self.logger.warning(f"INVALID_INPUT: {json.dumps(security_event)}")
-        else:
-            self.logger.info(f"INVALID_INPUT: {json.dumps(security_event)}")
+        )
     
     def log_rate_limit_violation(self, limit_type: str):
         """Log une violation de rate limiting"""
-        client_info = self._get_client_info()
-        fingerprint = self._create_fingerprint(client_info)
-        
-        security_event = {
-            'type': 'RATE_LIMIT_VIOLATION',
-            'severity': 'MEDIUM',
-            'fingerprint': fingerprint,
-            'client': client_info,
-            'details': {
-                'limit_type': limit_type
-            }
-        }
-        
-        self.logger.warning(f"RATE_LIMIT_VIOLATION: {json.dumps(security_event)}")
+        self._log_event(logging.WARNING, 'RATE_LIMIT_VIOLATION', 'RATE_LIMIT_VIOLATION', 'MEDIUM', {
+            'limit_type': limit_type
+        })
     
     def log_unauthorized_access_attempt(self, resource: str, user_id: Optional[int] = None):
         """Log une tentative d'accès non autorisée"""
-        client_info = self._get_client_info()
-        fingerprint = self._create_fingerprint(client_info)
-        
-        security_event = {
-            'type': 'UNAUTHORIZED_ACCESS',
-            'severity': 'HIGH',
-            'fingerprint': fingerprint,
-            'client': client_info,
-            'details': {
-                'resource': resource,
-                'user_id': user_id
-            }
-        }
-        
-        self.logger.warning(f"UNAUTHORIZED_ACCESS: {json.dumps(security_event)}")
+        self._log_event(logging.WARNING, 'UNAUTHORIZED_ACCESS', 'UNAUTHORIZED_ACCESS', 'HIGH', {
+            'resource': resource,
+            'user_id': user_id
+        })
     
     def log_file_upload_attempt(self, filename: str, file_type: str, file_size: int):
         """Log une tentative d'upload de fichier"""
-        client_info = self._get_client_info()
-        fingerprint = self._create_fingerprint(client_info)
-        
-        security_event = {
-            'type': 'FILE_UPLOAD',
-            'severity': 'LOW',
-            'fingerprint': fingerprint,
-            'client': client_info,
-            'details': {
-                'filename': filename,
-                'file_type': file_type,
-                'file_size': file_size
-            }
-        }
-        
-        self.logger.info(f"FILE_UPLOAD: {json.dumps(security_event)}")
+        self._log_event(logging.INFO, 'FILE_UPLOAD', 'FILE_UPLOAD', 'LOW', {
+            'filename': filename,
+            'file_type': file_type,
+            'file_size': file_size
+        })
     
     def log_admin_access_attempt(self, success: bool, email: str):
         """Log une tentative d'accès admin"""
-        client_info = self._get_client_info()
-        fingerprint = self._create_fingerprint(client_info)
-        
-        security_event = {
-            'type': 'ADMIN_ACCESS_ATTEMPT',
-            'severity': 'HIGH' if not success else 'INFO',
-            'fingerprint': fingerprint,
-            'client': client_info,
-            'details': {
+        self._log_event(
+            logging.INFO if success else logging.WARNING,
+            'ADMIN_ACCESS_ATTEMPT', 'ADMIN_ACCESS_ATTEMPT', 'INFO' if success else 'HIGH', {
                 'email': email,
                 'success': success
             }
-        }
-        
-        if success:
-            self.logger.info(f"ADMIN_ACCESS_ATTEMPT: {json.dumps(security_event)}")
-        else:
-            self.logger.warning(f"ADMIN_ACCESS_ATTEMPT: {json.dumps(security_event)}")
+        )
     
     def get_recent_intrusion_attempts(self, minutes: int = 60) -> Dict[str, int]:
-        """Analyse les logs pour détecter des tentatives d'intrusion récentes"""
-        # Cette fonction pourrait être implémentée pour analyser les logs de sécurité
-        # et retourner des statistiques sur les tentatives d'intrusion
-        return {
-            'sql_injection': 0,
-            'xss': 0,
-            'brute_force': 0,
-            'rate_limit_violations': 0,
-            'unauthorized_access': 0
-        }
+        """Nombre de tentatives d'intrusion par catégorie sur les dernières minutes (ce processus)"""
+        counts = self.intrusions.counts(minutes)
+        return {category: counts.get(event, 0) for category, event in INTRUSION_CATEGORIES.items()}
+    
+    def get_top_offenders(self, minutes: int = 60, limit: int = 10):
+        """Clients à l'origine du plus grand nombre de tentatives d'intrusion"""
+        return self.intrusions.top_offenders(minutes, limit, events=set(INTRUSION_CATEGORIES.values()))
 
 
 # Instance globale
-security_logger = SecurityLogger()
\ No newline at end of file
+security_logger = SecurityLogger()
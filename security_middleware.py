@@ -1,13 +1,21 @@
 """
 Middleware de sécurité pour l'application Meet
-Applique les headers de sécurité HTTP
+Applique les headers de sécurité HTTP et surveille les requêtes entrantes
 """
 
-from flask import Flask, request, g
+from flask import Flask, current_app, request, g
+import io
 import logging
+import re
+import time
+from urllib.parse import unquote_to_bytes
 
 logger = logging.getLogger(__name__)
 
+# Photos adressées par leur contenu ("<sha256>.jpg" et déclinaisons "<sha256>_<taille>.<ext>") :
+# le nom change dès que le contenu change, elles peuvent donc être mises en cache indéfiniment
+IMMUTABLE_UPLOAD = re.compile(r'^uploads/[0-9a-f]{64}(?:_\d+)?\.(?:jpg|webp|avif)$')
+
 
 def apply_security_headers(app: Flask):
     """Applique les headers de sécurité à toutes les réponses"""
@@ -34,6 +42,11 @@ def apply_security_headers(app: Flask):
             'fullscreen=(), picture-in-picture=()'
         )
         
+        # Cache long terme pour les fichiers immuables
+        if request.endpoint == 'static' and response.status_code == 200 and \
+                IMMUTABLE_UPLOAD.match((request.view_args or {}).get('filename', '')):
+            response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+        
         # Cache control pour les pages sensibles
         if request.endpoint in ['login', 'register', 'profile']:
             response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, private'
@@ -46,27 +59,115 @@ def apply_security_headers(app: Flask):
     return app
 
 
+# Routes dont le corps est analysé (formulaires et messages ; jamais les envois de photos seules)
+PAYLOAD_SCAN_ENDPOINTS = {
+    'register', 'login', 'admin_login', 'api_update_profile', 'api_update_interests', 'api_send_message'
+}
+
+# Seul le début du corps est analysé
+PAYLOAD_SCAN_BYTES = 16 * 1024
+
+# Corps binaires : jamais analysés
+BINARY_CONTENT_TYPES = ('image/', 'video/', 'audio/', 'application/octet-stream')
+
+SUSPICIOUS_PATTERNS = (
+    '<script', 'javascript:', 'onload=', 'onerror=',
+    '../', '..\\', 'union select', 'drop table',
+    'insert into', 'delete from', 'update set'
+)
+
+# Une seule expression pour tous les motifs, appliquée aux octets sans décodage ni mise en minuscules
+SUSPICIOUS_PAYLOAD = re.compile(
+    b'|'.join(re.escape(pattern.encode()) for pattern in SUSPICIOUS_PATTERNS), re.IGNORECASE
+)
+_OVERLAP = max(len(pattern) for pattern in SUSPICIOUS_PATTERNS) - 1
+
+
+class ScanningInput(io.RawIOBase):
+    """Flux d'entrée WSGI analysé au fil de sa lecture par l'application
+
+    Les octets lus sont passés à SUSPICIOUS_PAYLOAD jusqu'à `limit` octets ;
+    la fin du morceau précédent est conservée pour les motifs à cheval sur
+    deux lectures. Le corps n'est ni copié en entier ni décodé en texte
+    (les formulaires urlencodés sont seulement dé-échappés).
+    """
+
+    def __init__(self, stream, limit, on_match, urlencoded=False):
+        self._stream = stream
+        self._remaining = limit
+        self._tail = b''
+        self._on_match = on_match
+        self._urlencoded = urlencoded
+        # "%3C" occupe trois octets : garder assez de contexte pour un motif entièrement échappé
+        self._overlap = _OVERLAP * 3 if urlencoded else _OVERLAP
+
+    def readable(self):
+        return True
+
+    def _scan(self, data):
+        if self._remaining <= 0 or not data:
+            return
+        chunk = bytes(data[:self._remaining])
+        self._remaining -= len(chunk)
+        window = self._tail + chunk
+        match = SUSPICIOUS_PAYLOAD.search(
+            unquote_to_bytes(window.replace(b'+', b' ')) if self._urlencoded else window
+        )
+        if match:
+            self._remaining = 0
+            self._on_match(match.group().decode('latin-1').lower())
+        self._tail = window[-self._overlap:]
+
+    def readinto(self, buffer):
+        if hasattr(self._stream, 'readinto'):
+            size = self._stream.readinto(buffer)
+        else:
+            data = self._stream.read(len(buffer))
+            size = len(data)
+            buffer[:size] = data
+        if size:
+            self._scan(memoryview(buffer)[:size])
+        return size
+
+    def read(self, size=-1):
+        data = self._stream.read(size)
+        self._scan(data)
+        return data
+
+    def readline(self, size=-1):
+        data = self._stream.readline(size)
+        self._scan(data)
+        return data
+
+
+def _report_suspicious_payload(pattern):
+    logger.warning(f"Pattern suspect détecté: {pattern}")
+    logger.warning(f"Requête suspecte de {request.remote_addr}")
+
+
 def log_request_details():
     """Log les détails des requêtes pour la sécurité"""
     
     # Logger les informations sensibles (sans données confidentielles)
-    logger.info(f"Requête: {request.method} {request.path}")
+    logger.debug(f"Requête: {request.method} {request.path}")
     logger.debug(f"IP: {request.remote_addr}")
     logger.debug(f"User-Agent: {request.headers.get('User-Agent', 'Unknown')}")
     
-    # Détecter des patterns suspects
-    suspicious_patterns = [
-        '<script', 'javascript:', 'onload=', 'onerror=', 
-        '../', '..\\', 'union select', 'drop table',
-        'insert into', 'delete from', 'update set'
-    ]
-    
-    request_data = request.get_data(as_text=True) if request.data else ""
-    for pattern in suspicious_patterns:
-        if pattern.lower() in request_data.lower():
-            logger.warning(f"Pattern suspect détecté: {pattern}")
-            logger.warning(f"Requête suspecte de {request.remote_addr}")
-            break
+    # Détecter des patterns suspects, pendant la lecture du corps par la route
+    endpoints = current_app.config.get('PAYLOAD_SCAN_ENDPOINTS', PAYLOAD_SCAN_ENDPOINTS)
+    if request.endpoint not in endpoints or not request.content_length:
+        return
+    if (request.mimetype or '').startswith(BINARY_CONTENT_TYPES):
+        return
+    if 'stream' in request.__dict__:
+        # Flux déjà ouvert par un autre traitement : trop tard pour l'analyser
+        return
+    request.environ['wsgi.input'] = ScanningInput(
+        request.environ['wsgi.input'],
+        current_app.config.get('PAYLOAD_SCAN_BYTES', PAYLOAD_SCAN_BYTES),
+        _report_suspicious_payload,
+        urlencoded=request.mimetype == 'application/x-www-form-urlencoded'
+    )
 
 
 def security_monitoring():
@@ -79,9 +180,18 @@ def security_monitoring():
     g.client_ip = request.remote_addr
     g.user_agent = request.headers.get('User-Agent', 'Unknown')
     
-    # Détecter les requêtes anormales
-    if len(request.data) > 10 * 1024 * 1024:  # > 10MB
-        logger.warning(f"Requête anormalement grande: {len(request.data)} bytes de {g.client_ip}")
+    # Détecter les requêtes anormales (taille annoncée, sans lire le corps)
+    content_length = request.content_length or 0
+    if content_length > 10 * 1024 * 1024:  # > 10MB
+        logger.warning(f"Requête anormalement grande: {content_length} bytes de {g.client_ip}")
 
 
-import time
\ No newline at end of file
+def init_request_monitoring(app: Flask):
+    """Surveillance des requêtes, avant les extensions qui lisent le corps (CSRF, formulaires)"""
+    
+    @app.before_request
+    def monitor_request():
+        if request.endpoint == 'static':
+            return
+        security_monitoring()
+        log_request_details()
@@ -41,6 +41,51 @@ class SecurityValidator:
         r'\$\{.*?\}',               # Template injection
     ]
     
+    # Patterns de validation compilés une fois pour toutes
+    COMPILED_PATTERNS = {
+        name: re.compile(pattern, re.IGNORECASE) for name, pattern in PATTERNS.items()
+    }
+    
+    # Jetons des listes noires, reconnus en une seule passe sur le texte.
+    # Chaque alternative ne consomme que son premier caractère (ce qui permet
+    # au moteur de sauter directement aux caractères candidats) et vérifie la
+    # suite par une assertion avant : les jetons peuvent donc se chevaucher.
+    _FORBIDDEN_TOKENS = re.compile(r"""
+        \n (?P<newline>)
+      | < (?= (?P<script_open>script) | (?P<script_close>/script>) )
+      | > (?P<gt>)
+      | j (?= (?P<javascript>avascript:) )
+      | o (?= (?P<handler>n\w) )
+      | s (?= (?P<select>elect) | (?P<set>et) | (?P<system>ystem\s*\() )
+      | f (?= (?P<from>rom) )
+      | d (?= (?P<drop>rop\s+table) | (?P<delete>elete\s+from) )
+      | i (?= (?P<insert>nsert\s+into) )
+      | u (?= (?P<update>pdate) | (?P<union>nion) )
+      | e (?= (?P<exec>xec\s*\() )
+      | \$ (?= (?P<template_open>\{) )
+      | \} (?P<template_close>)
+    """, re.VERBOSE)
+    
+    # Jeton -> indice du motif détecté dans FORBIDDEN_PATTERNS
+    _FORBIDDEN_SINGLE = {'javascript': 1, 'drop': 4, 'insert': 5, 'delete': 7, 'exec': 9, 'system': 10}
+    
+    # Motifs "A.*?B" : '.' ne traversant pas les retours à la ligne, il suffit de
+    # retenir les débuts vus sur la ligne courante.
+    # Jeton -> (début requis sur la ligne, indice du motif ou nouvel état de la ligne)
+    _FORBIDDEN_SEQUENCES = {
+        'gt': ('script_open', 'script_tag'),
+        'script_close': ('script_tag', 0),
+        'from': ('select', 3),
+        'set': ('update', 6),
+        'select': ('union', 8),
+        'template_close': ('template_open', 11),
+    }
+    _SEQUENCE_STARTS = frozenset(('script_open', 'select', 'update', 'union', 'template_open'))
+    
+    _WORD_TAIL = re.compile(r'\w*')
+    _ASSIGNMENT = re.compile(r'\s*=')
+    _CONTROL_CHARS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+    
     @classmethod
     def sanitize_string(cls, input_string: str, max_length: int = 1000) -> str:
         """Nettoie une chaîne de caractères"""
@@ -54,30 +99,56 @@ class SecurityValidator:
         sanitized = html.escape(input_string)
         
         # Supprimer les caractères de contrôle
-        sanitized = ''.join(char for char in sanitized if ord(char) >= 32 or char in '\n\r\t')
+        sanitized = cls._CONTROL_CHARS.sub('', sanitized)
         
         return sanitized.strip()
     
     @classmethod
     def validate_pattern(cls, input_string: str, pattern_name: str) -> bool:
         """Valide une chaîne contre un pattern"""
-        if pattern_name not in cls.PATTERNS:
+        pattern = cls.COMPILED_PATTERNS.get(pattern_name)
+        if pattern is None:
             return False
-        
-        pattern = cls.PATTERNS[pattern_name]
-        return bool(re.match(pattern, input_string, re.IGNORECASE | re.UNICODE))
+        return pattern.match(input_string) is not None
     
     @classmethod
     def contains_forbidden_content(cls, input_string: str) -> List[str]:
-        """Détecte du contenu interdit dans une chaîne"""
-        threats = []
-        input_lower = input_string.lower()
-        
-        for forbidden_pattern in cls.FORBIDDEN_PATTERNS:
-            if re.search(forbidden_pattern, input_lower, re.IGNORECASE):
-                threats.append(f"Pattern détecté: {forbidden_pattern}")
-        
-        return threats
+        """Détecte du contenu interdit dans une chaîne
+        
+        Équivalent à une recherche de chaque motif de FORBIDDEN_PATTERNS, mais
+        en une seule passe de durée linéaire : les motifs en ".*?" ne peuvent
+        plus provoquer de retours arrière sur les longues bios ou messages.
+        """
+        text = input_string.lower()
+        detected = set()
+        line_state = set()
+        handler_run_end = -1
+        
+        for match in cls._FORBIDDEN_TOKENS.finditer(text):
+            token = match.lastgroup
+            if token == 'newline':
+                line_state.clear()
+            elif token == 'handler':
+                # on\w+\s*= : le mot doit aller jusqu'au bout, suivi de "=" ;
+                # un seul examen par mot, quel que soit le nombre de "on" qu'il contient
+                start = match.start()
+                if start >= handler_run_end:
+                    handler_run_end = cls._WORD_TAIL.match(text, start + 2).end()
+                    if cls._ASSIGNMENT.match(text, handler_run_end):
+                        detected.add(2)
+            elif token in cls._FORBIDDEN_SINGLE:
+                detected.add(cls._FORBIDDEN_SINGLE[token])
+            else:
+                sequence = cls._FORBIDDEN_SEQUENCES.get(token)
+                if sequence and sequence[0] in line_state:
+                    if isinstance(sequence[1], int):
+                        detected.add(sequence[1])
+                    else:
+                        line_state.add(sequence[1])
+                if token in cls._SEQUENCE_STARTS:
+                    line_state.add(token)
+        
+        return [f"Pattern détecté: {cls.FORBIDDEN_PATTERNS[index]}" for index in sorted(detected)]
     
     @classmethod
     def validate_name(cls, name: str, field_name: str = "nom") -> Dict[str, Any]:
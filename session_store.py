@@ -0,0 +1,347 @@
+"""
+Sessions côté serveur pour l'application Meet
+Le cookie ne contient qu'un identifiant ; les données sont stockées sur disque,
+dans SQLite ou dans un serveur compatible Redis, sérialisées en MessagePack
+"""
+
+import logging
+import os
+import re
+import secrets
+import sqlite3
+import struct
+import threading
+import time
+
+import msgspec
+from flask import Flask, has_request_context, request
+from flask.sessions import SessionInterface, SessionMixin
+from flask_login import user_logged_in
+
+try:
+    import redis
+except ImportError:  # dépendance optionnelle, requise uniquement pour SESSION_BACKEND=redis
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+SESSION_BACKENDS = ('cookie', 'filesystem', 'sqlite', 'redis')
+
+# Identifiant de session : 32 octets aléatoires en base64 URL
+SESSION_ID = re.compile(r'^[A-Za-z0-9_-]{43}$')
+
+_encoder = msgspec.msgpack.Encoder()
+_decoder = msgspec.msgpack.Decoder(dict)
+
+
+class LazySession(SessionMixin):
+    """Session chargée depuis le stockage au premier accès seulement
+
+    Les requêtes qui ne lisent pas la session (fichiers statiques, API
+    publiques...) ne font ni lecture ni désérialisation.
+    """
+
+    def __init__(self, store, sid=None):
+        self.store = store
+        self.sid = sid
+        self.new = sid is None
+        self.modified = False
+        self.accessed = False
+        self.expires_at = None
+        self.previous_sid = None
+        self._data = {} if sid is None else None
+        self._transient = None
+
+    @property
+    def loaded(self):
+        return self._data is not None
+
+    @property
+    def data(self):
+        if self._data is None and has_request_context() and request.endpoint == 'static':
+            # Les fichiers statiques n'utilisent pas la session : contenu temporaire jamais enregistré
+            # (une page d'erreur rendue pour un fichier absent peut y écrire le jeton CSRF)
+            if self._transient is None:
+                self._transient = {}
+            return self._transient
+        self.accessed = True
+        if self._data is None:
+            self._data = {}
+            record = self.store.load(self.sid)
+            if record is not None:
+                payload, self.expires_at = record
+                try:
+                    self._data = _decoder.decode(payload)
+                except msgspec.DecodeError:
+                    logger.warning("Session illisible ignorée")
+        return self._data
+
+    def regenerate(self):
+        """Change d'identifiant en conservant les données (après une connexion)"""
+        data = self.data
+        if self.sid and not self.new:
+            self.previous_sid = self.sid
+        self.sid = None
+        self.new = True
+        self.modified = True
+        self._data = data
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __setitem__(self, key, value):
+        self.data[key] = value
+        self.modified = True
+
+    def __delitem__(self, key):
+        del self.data[key]
+        self.modified = True
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __repr__(self):
+        state = repr(self._data) if self.loaded else 'non chargée'
+        return f"<LazySession {state}>"
+
+
+class FilesystemSessionStore:
+    """Un fichier par session : date d'expiration (8 octets) suivie des données"""
+
+    HEADER = struct.Struct('>d')
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, sid):
+        return os.path.join(self.directory, sid)
+
+    def load(self, sid):
+        try:
+            with open(self._path(sid), 'rb') as f:
+                content = f.read()
+        except FileNotFoundError:
+            return None
+        if len(content) < self.HEADER.size:
+            return None
+        expires_at, = self.HEADER.unpack_from(content)
+        if expires_at <= time.time():
+            self.delete(sid)
+            return None
+        return content[self.HEADER.size:], expires_at
+
+    def save(self, sid, payload, expires_at):
+        path = self._path(sid)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(self.HEADER.pack(expires_at))
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+    def delete(self, sid):
+        try:
+            os.remove(self._path(sid))
+        except FileNotFoundError:
+            pass
+
+    def cleanup(self):
+        """Supprime les sessions expirées ; retourne le nombre de sessions supprimées"""
+        now = time.time()
+        removed = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not SESSION_ID.match(entry.name):
+                    continue
+                try:
+                    with open(entry.path, 'rb') as f:
+                        header = f.read(self.HEADER.size)
+                    if len(header) == self.HEADER.size and self.HEADER.unpack(header)[0] > now:
+                        continue
+                    os.remove(entry.path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+
+class SQLiteSessionStore:
+    """Sessions dans un fichier SQLite dédié, une connexion par thread"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._connection().execute(
+            'CREATE TABLE IF NOT EXISTS sessions ('
+            'sid TEXT PRIMARY KEY, expires_at REAL NOT NULL, data BLOB NOT NULL)'
+        )
+        self._connection().execute(
+            'CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions (expires_at)'
+        )
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def load(self, sid):
+        row = self._connection().execute(
+            'SELECT data, expires_at FROM sessions WHERE sid = ? AND expires_at > ?',
+            (sid, time.time())
+        ).fetchone()
+        return (bytes(row[0]), row[1]) if row else None
+
+    def save(self, sid, payload, expires_at):
+        self._connection().execute(
+            'INSERT OR REPLACE INTO sessions (sid, expires_at, data) VALUES (?, ?, ?)',
+            (sid, expires_at, payload)
+        )
+
+    def delete(self, sid):
+        self._connection().execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+
+    def cleanup(self):
+        return self._connection().execute(
+            'DELETE FROM sessions WHERE expires_at <= ?', (time.time(),)
+        ).rowcount
+
+
+class RedisSessionStore:
+    """Sessions dans un serveur compatible Redis (Redis, Valkey, KeyDB...), expirées par le serveur"""
+
+    def __init__(self, url, prefix='session:'):
+        if redis is None:
+            raise RuntimeError("redis est requis pour SESSION_BACKEND=redis (pip install redis)")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def load(self, sid):
+        pipeline = self.client.pipeline()
+        pipeline.get(self.prefix + sid)
+        pipeline.pttl(self.prefix + sid)
+        payload, ttl_ms = pipeline.execute()
+        if payload is None:
+            return None
+        return payload, time.time() + max(ttl_ms, 0) / 1000
+
+    def save(self, sid, payload, expires_at):
+        ttl_ms = max(int((expires_at - time.time()) * 1000), 1)
+        self.client.set(self.prefix + sid, payload, px=ttl_ms)
+
+    def delete(self, sid):
+        self.client.delete(self.prefix + sid)
+
+    def cleanup(self):
+        return 0
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """Interface de session Flask utilisant un stockage côté serveur"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid and SESSION_ID.match(sid):
+            return LazySession(self.store, sid)
+        return LazySession(self.store)
+
+    def save_session(self, app, session, response):
+        if not session.loaded:
+            return
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.previous_sid:
+            self.store.delete(session.previous_sid)
+            session.previous_sid = None
+
+        if not session:
+            if session.modified and session.sid and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path, secure=secure,
+                                       samesite=samesite, httponly=httponly)
+            return
+
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        now = time.time()
+        # Sans modification, une session n'est réécrite qu'après la moitié de sa durée
+        refresh = (app.config['SESSION_REFRESH_EACH_REQUEST']
+                   and (session.expires_at is None or session.expires_at - now < lifetime / 2))
+        if not (session.modified or refresh):
+            return
+
+        if session.sid is None:
+            session.sid = secrets.token_urlsafe(32)
+        self.store.save(session.sid, _encoder.encode(dict(session._data)), now + lifetime)
+        session.expires_at = now + lifetime
+        response.set_cookie(
+            name, session.sid,
+            expires=self.get_expiration_time(app, session),
+            domain=domain, path=path, secure=secure, samesite=samesite, httponly=httponly
+        )
+
+
+def create_session_store(app: Flask):
+    """Construit le stockage de sessions décrit par SESSION_BACKEND, None pour les cookies signés"""
+    backend = app.config['SESSION_BACKEND']
+    if backend == 'cookie':
+        return None
+    if backend == 'filesystem':
+        return FilesystemSessionStore(app.config['SESSION_FILE_DIR'])
+    if backend == 'sqlite':
+        return SQLiteSessionStore(app.config['SESSION_SQLITE_PATH'])
+    if backend == 'redis':
+        return RedisSessionStore(app.config['SESSION_REDIS_URL'],
+                                 prefix=app.config.get('SESSION_KEY_PREFIX', 'session:'))
+    raise ValueError(f"Stockage de sessions inconnu: {backend} (valeurs possibles: {', '.join(SESSION_BACKENDS)})")
+
+
+def init_session_store(app: Flask):
+    """Remplace les sessions en cookie signé par des sessions côté serveur"""
+    app.config.setdefault('SESSION_BACKEND', os.getenv('SESSION_BACKEND', 'filesystem'))
+    app.config.setdefault('SESSION_FILE_DIR', os.getenv(
+        'SESSION_FILE_DIR', os.path.join(app.instance_path, 'sessions')))
+    app.config.setdefault('SESSION_SQLITE_PATH', os.getenv(
+        'SESSION_SQLITE_PATH', os.path.join(app.instance_path, 'sessions.sqlite3')))
+    app.config.setdefault('SESSION_REDIS_URL', os.getenv('SESSION_REDIS_URL', 'redis://localhost:6379/0'))
+
+    store = create_session_store(app)
+    if store is None:
+        return
+    app.session_interface = ServerSideSessionInterface(store)
+
+    # Nouvel identifiant à chaque connexion (fixation de session)
+    @user_logged_in.connect_via(app)
+    def regenerate_session_id(sender, user, **extra):
+        from flask import session
+        if isinstance(session, LazySession):
+            session.regenerate()
+
+    logger.info(f"Sessions côté serveur: {app.config['SESSION_BACKEND']}")
+
+
+def cleanup_sessions(app: Flask):
+    """Supprime les sessions expirées du stockage ; retourne le nombre de sessions supprimées"""
+    interface = app.session_interface
+    if not isinstance(interface, ServerSideSessionInterface):
+        return 0
+    return interface.store.cleanup()
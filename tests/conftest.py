@@ -0,0 +1,51 @@
+"""
+Fixtures communes : application minimale sur une base SQLite et un dossier
+d'upload temporaires (sans scheduler ni routes)
+"""
+
+from datetime import date
+
+import pytest
+from flask import Flask
+
+from model.database import db
+from model.models import User
+
+
+@pytest.fixture
+def app(tmp_path):
+    upload_folder = tmp_path / 'uploads'
+    upload_folder.mkdir()
+    app = Flask(__name__)
+    app.config.update(
+        TESTING=True,
+        SECRET_KEY='test',
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'test.db'}",
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        UPLOAD_FOLDER=str(upload_folder),
+        IMAGE_PROCESSING_ASYNC=False,
+    )
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def make_user(app):
+    """Crée un utilisateur (mot de passe non haché : inutile ici)"""
+    counter = iter(range(1, 10000))
+
+    def make_user(**fields):
+        n = next(counter)
+        user = User(
+            email=f'user{n}@example.com', password_hash='-', first_name='Test', last_name=str(n),
+            birth_date=date(1990, 1, 1), gender='homme', interested_in='femme', city='Paris', **fields
+        )
+        db.session.add(user)
+        db.session.commit()
+        return user
+
+    return make_user
@@ -0,0 +1,68 @@
+"""Suppression d'utilisateurs : transaction unique et tâches en masse"""
+
+import pytest
+
+from model.admin_service import AdminService
+from model.database import db
+from model.models import AdminJob, Like, User
+from model.photo_service import PhotoService
+from model.stats_service import StatsService
+
+
+@pytest.fixture
+def liked_user(app, make_user):
+    """Utilisateur qui a donné et reçu des likes, compteurs réconciliés"""
+    user, other = make_user(), make_user()
+    db.session.add_all([Like(liker_id=user.id, liked_id=other.id), Like(liker_id=other.id, liked_id=user.id)])
+    db.session.commit()
+    StatsService.reconcile()
+    return user.id
+
+
+def test_delete_user_failure_leaves_user_intact(app, liked_user, monkeypatch):
+    def fail(user):
+        raise RuntimeError('stockage indisponible')
+    monkeypatch.setattr(PhotoService, 'release_user', fail)
+
+    # Lot de 1 : sans transaction unique, le premier like serait déjà supprimé
+    monkeypatch.setattr('model.admin_service.BULK_DELETE_CHUNK_SIZE', 1)
+    assert AdminService.delete_user(liked_user) == (False, "Erreur lors de la suppression")
+
+    db.session.expire_all()
+    assert db.session.get(User, liked_user) is not None
+    assert Like.query.count() == 2
+    assert StatsService.get_counters()[StatsService.TOTAL_LIKES].value == 2
+
+
+def test_stale_job_is_not_flipped_back_to_done(app, liked_user, monkeypatch):
+    job = AdminJob(job_type='bulk_delete_users', status='pending', total=1)
+    db.session.add(job)
+    db.session.commit()
+    job_id = job.id
+
+    purge_user = AdminService.purge_user
+
+    def slow_purge(user_id, **options):
+        # Le balayage passe pendant un lot trop lent et déclare la tâche interrompue
+        assert AdminService.fail_stale_jobs(stale_minutes=-1) == 1
+        return purge_user(user_id, **options)
+    monkeypatch.setattr(AdminService, 'purge_user', slow_purge)
+
+    AdminService._run_bulk_delete(app, job_id, [liked_user])
+
+    db.session.expire_all()
+    job = db.session.get(AdminJob, job_id)
+    assert job.status == 'failed'
+    assert job.processed == 0
+
+
+def test_failed_job_is_not_started(app, liked_user):
+    job = AdminJob(job_type='bulk_delete_users', status='failed', total=1)
+    db.session.add(job)
+    db.session.commit()
+
+    AdminService._run_bulk_delete(app, job.id, [liked_user])
+
+    db.session.expire_all()
+    assert db.session.get(User, liked_user) is not None
+    assert db.session.get(AdminJob, job.id).status == 'failed'
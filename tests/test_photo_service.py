@@ -0,0 +1,175 @@
+"""
+Comptage des références des photos adressées par contenu et ramasse-miettes
+Une décrémentation de trop supprime définitivement la photo d'un autre utilisateur
+"""
+
+import hashlib
+import io
+import os
+
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+
+from model.admin_service import AdminService
+from model.database import db
+from model.image_pipeline import photo_url, rendition_name, rendition_names
+from model.models import PhotoBlob
+from model.photo_service import PhotoService
+from model.services import UserService
+
+
+def _png(color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (120, 80), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def _store(app, content):
+    """Écrit une photo et toutes ses déclinaisons comme le ferait le pipeline"""
+    filename = hashlib.sha256(content).hexdigest() + '.jpg'
+    for name in rendition_names(filename):
+        with open(os.path.join(app.config['UPLOAD_FOLDER'], name), 'wb') as f:
+            f.write(content)
+    return filename
+
+
+def _files(app, filename):
+    return [name for name in rendition_names(filename)
+            if os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], name))]
+
+
+def _refcount(filename):
+    blob = db.session.get(PhotoBlob, PhotoService.content_hash(filename))
+    return None if blob is None else blob.refcount
+
+
+def test_shared_blob_survives_until_last_reference(app, make_user):
+    filename = _store(app, b'shared')
+    alice, bob = make_user(), make_user()
+    PhotoService.assign(alice, 'profile', filename)
+    PhotoService.assign(bob, 'second', filename)
+    db.session.commit()
+    assert _refcount(filename) == 2
+
+    # Réaffecter la même photo ne compte pas de référence supplémentaire
+    PhotoService.assign(alice, 'profile', filename)
+    db.session.commit()
+    assert _refcount(filename) == 2
+
+    PhotoService.assign(alice, 'profile', None)
+    db.session.commit()
+    assert _refcount(filename) == 1
+    PhotoService.collect_garbage(grace_hours=0)
+    assert len(_files(app, filename)) == len(rendition_names(filename))
+
+    PhotoService.assign(bob, 'second', None)
+    db.session.commit()
+    assert _refcount(filename) == 0
+    PhotoService.collect_garbage(grace_hours=0)
+    assert _files(app, filename) == []
+    assert _refcount(filename) is None
+
+
+def test_unreferenced_blob_kept_during_grace_period(app, make_user):
+    filename = _store(app, b'grace')
+    user = make_user()
+    PhotoService.assign(user, 'profile', filename)
+    PhotoService.assign(user, 'profile', None)
+    db.session.commit()
+
+    PhotoService.collect_garbage(grace_hours=24)
+    assert _refcount(filename) == 0
+    assert len(_files(app, filename)) == len(rendition_names(filename))
+
+
+def test_release_never_goes_below_zero(app, make_user):
+    filename = _store(app, b'floor')
+    user = make_user()
+    PhotoService.assign(user, 'profile', filename)
+    db.session.commit()
+
+    PhotoService.release(filename)
+    PhotoService.release(filename)
+    db.session.commit()
+    assert _refcount(filename) == 0
+
+    # Une nouvelle référence remet le compteur à 1, pas à 0
+    PhotoService.acquire(filename)
+    db.session.commit()
+    assert _refcount(filename) == 1
+
+
+def test_purge_releases_only_the_deleted_users_references(app, make_user):
+    shared = _store(app, b'shared')
+    own = _store(app, b'own')
+    kept, purged = make_user(), make_user()
+    PhotoService.assign(kept, 'profile', shared)
+    PhotoService.assign(purged, 'profile', shared)
+    PhotoService.assign(purged, 'second', own)
+    db.session.commit()
+    purged_id = purged.id
+
+    assert AdminService.purge_user(purged_id) is not None
+    assert _refcount(shared) == 1
+    assert _refcount(own) == 0
+
+    PhotoService.collect_garbage(grace_hours=0)
+    assert len(_files(app, shared)) == len(rendition_names(shared))
+    assert _files(app, own) == []
+
+    # Une seconde purge (utilisateur déjà supprimé) ne touche plus aux compteurs
+    assert AdminService.purge_user(purged_id) is None
+    assert _refcount(shared) == 1
+
+
+def test_reupload_after_gc_recreates_files_and_reference(app, make_user):
+    content = _png((200, 30, 30))
+    user = make_user()
+
+    def upload():
+        filename = UserService.save_photo(FileStorage(io.BytesIO(content), filename='photo.png'), user.id, 'profile')
+        PhotoService.assign(user, 'profile', filename)
+        db.session.commit()
+        return filename
+
+    filename = upload()
+    assert _refcount(filename) == 1
+    assert _files(app, filename)
+
+    PhotoService.assign(user, 'profile', None)
+    db.session.commit()
+    PhotoService.collect_garbage(grace_hours=0)
+    assert _files(app, filename) == []
+    assert _refcount(filename) is None
+
+    # Même contenu, même empreinte : la photo est retraitée et de nouveau comptée
+    assert upload() == filename
+    assert _refcount(filename) == 1
+    assert len(_files(app, filename)) == len(rendition_names(filename))
+    PhotoService.collect_garbage(grace_hours=0)
+    assert len(_files(app, filename)) == len(rendition_names(filename))
+
+
+def test_rendition_urls_follow_gc_and_reupload(app, make_user):
+    content = _png((30, 30, 200))
+    user = make_user()
+
+    def upload():
+        filename = UserService.save_photo(FileStorage(io.BytesIO(content), filename='photo.png'), user.id, 'profile')
+        PhotoService.assign(user, 'profile', filename)
+        db.session.commit()
+        return filename
+
+    filename = upload()
+    assert photo_url(user, size=64).endswith(rendition_name(filename, 64))
+
+    # Photo supprimée : plus de lien vers une déclinaison disparue
+    PhotoService.assign(user, 'profile', None)
+    db.session.commit()
+    PhotoService.collect_garbage(grace_hours=0)
+    user.profile_photo = filename
+    assert photo_url(user, size=64).endswith('/' + filename)
+
+    # Retraitée : les déclinaisons sont de nouveau servies sans attendre l'expiration du cache
+    upload()
+    assert photo_url(user, size=64).endswith(rendition_name(filename, 64))
@@ -0,0 +1,78 @@
+"""Budget de requêtes SQL des pages, mesuré sur l'application complète"""
+
+from datetime import date, timedelta
+
+import pytest
+
+import app as app_module
+from model.activity_tracker import ActivityTracker
+from model.database import db
+from model.extensions import get_timezone_aware_datetime
+from model.models import Message, User
+from model.query_stats import assert_max_queries
+from model.stats_service import StatsService
+from security_logging import IntrusionAggregator, security_logger
+
+# Chargement de l'administrateur, compteurs, utilisateurs récents, messages récents
+ADMIN_DASHBOARD_QUERIES = 4
+
+
+@pytest.fixture
+def full_app(tmp_path, monkeypatch):
+    """Application créée par create_app, sans tâches planifiées partagées"""
+    monkeypatch.setattr(security_logger, 'log_file', str(tmp_path / 'security.log'))
+    monkeypatch.setattr(security_logger, 'intrusions', IntrusionAggregator())
+
+    class Config:
+        TESTING = True
+        SECRET_KEY = 'test'
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'test.db'}"
+        SQLALCHEMY_TRACK_MODIFICATIONS = False
+        UPLOAD_FOLDER = str(tmp_path / 'uploads')
+        RATELIMIT_STORAGE_URI = 'memory://'
+        SESSION_BACKEND = 'cookie'
+        SCHEDULER_ENABLED = False
+        QUERY_BUDGET_PER_REQUEST = ADMIN_DASHBOARD_QUERIES
+
+    app = app_module.create_app(Config)
+    yield app
+    app_module.scheduler.shutdown(wait=False)
+    security_logger.stop()
+    with app.app_context():
+        # Rien ne reste à écrire pour le vidage à la sortie du processus
+        ActivityTracker.flush()
+        db.engine.dispose()
+
+
+def _user(n, **fields):
+    return User(email=f'user{n}@example.com', password_hash='-', first_name='Test', last_name=str(n),
+                birth_date=date(1990, 1, 1), gender='homme', interested_in='femme', city='Paris', **fields)
+
+
+def test_admin_dashboard_query_budget(full_app):
+    now = get_timezone_aware_datetime()
+    with full_app.app_context():
+        admin = _user(0, is_admin=True)
+        users = [_user(n) for n in range(1, 31)]
+        db.session.add_all([admin] + users)
+        db.session.flush()
+        # Messages entre les utilisateurs les plus anciens, absents de la liste des inscrits récents
+        db.session.add_all([
+            Message(sender_id=users[i].id, receiver_id=users[i + 10].id, content='Bonjour',
+                    created_at=now - timedelta(minutes=i), expires_at=now + timedelta(hours=1))
+            for i in range(10)
+        ])
+        db.session.commit()
+        admin_id = admin.id
+        StatsService.reconcile()
+
+    client = full_app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(admin_id)
+        session['_fresh'] = True
+        session['is_admin'] = True
+
+    with assert_max_queries(ADMIN_DASHBOARD_QUERIES):
+        response = client.get('/admin/dashboard')
+    assert response.status_code == 200
+    assert b'Test 1' in response.data
@@ -0,0 +1,91 @@
+"""Stockage SQLite du rate limiting partagé entre workers"""
+
+import pytest
+
+import rate_limit_storage
+from rate_limit_config import resolve_storage_uri
+from rate_limit_storage import SQLiteStorage
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def uri(tmp_path):
+    return f"sqlite:///{tmp_path / 'ratelimit.sqlite3'}"
+
+
+def test_limit_is_enforced(uri):
+    storage = SQLiteStorage(uri)
+    assert [storage.acquire_entry('login/1.2.3.4', 3, 60) for _ in range(4)] == [True, True, True, False]
+    assert storage.get_moving_window('login/1.2.3.4', 3, 60)[1] == 3
+    # Le refus est mémorisé : une nouvelle demande n'écrit plus rien
+    assert storage.acquire_entry('login/1.2.3.4', 3, 60) is False
+    assert storage.get_moving_window('login/1.2.3.4', 3, 60)[1] == 3
+
+
+def test_reset_is_visible_to_other_workers(uri):
+    worker_a, worker_b = SQLiteStorage(uri), SQLiteStorage(uri)
+    for _ in range(3):
+        worker_a.acquire_entry('k', 2, 60)
+    assert worker_b.acquire_entry('k', 2, 60) is False
+
+    # clear() dans un worker lève le refus mémorisé par l'autre
+    worker_b.clear('k')
+    assert worker_a.acquire_entry('k', 2, 60) is True
+
+    worker_a.acquire_entry('k', 2, 60)
+    assert worker_a.acquire_entry('k', 2, 60) is False
+    worker_b.reset()
+    assert worker_a.acquire_entry('k', 2, 60) is True
+
+
+def test_window_expiry(uri, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit_storage.time, 'time', clock)
+    storage = SQLiteStorage(uri, flush_interval=0)
+    assert storage.acquire_entry('k', 2, 10)
+    clock.now += 4
+    assert storage.acquire_entry('k', 2, 10)
+    assert storage.acquire_entry('k', 2, 10) is False
+
+    # La première entrée sort de la fenêtre : une place se libère, pas deux
+    clock.now += 6.5
+    assert storage.acquire_entry('k', 2, 10)
+    assert storage.acquire_entry('k', 2, 10) is False
+    clock.now += 4
+    assert storage.get_moving_window('k', 2, 10)[1] == 1
+
+
+def test_batched_writes_stay_within_limit(uri):
+    # Pas d'écriture en arrière-plan pendant le test : flush() explicite
+    worker_a = SQLiteStorage(uri, flush_interval=3600)
+    worker_b = SQLiteStorage(uri, flush_interval=3600)
+
+    assert all(worker_a.acquire_entry('search', 1000, 60) for _ in range(50))
+    assert worker_a.get_moving_window('search', 1000, 60)[1] == 50
+    assert worker_b.get_moving_window('search', 1000, 60)[1] == 0
+    assert worker_a.flush() == 50
+    assert worker_b.get_moving_window('search', 1000, 60)[1] == 50
+
+    # Proche de la limite, chaque vérification est exacte
+    accepted = sum(worker_a.acquire_entry('search', 1000, 60) for _ in range(1100))
+    assert accepted == 950
+    assert worker_b.acquire_entry('search', 1000, 60) is False
+    assert worker_b.get_moving_window('search', 1000, 60)[1] == 1000
+
+    # Les limites basses ne passent jamais par le lot local
+    worker_a.acquire_entry('login', 10, 60)
+    assert worker_b.get_moving_window('login', 10, 60)[1] == 1
+
+
+def test_relative_uri_resolved_in_instance_folder(tmp_path):
+    assert resolve_storage_uri('sqlite://ratelimit.sqlite3', str(tmp_path)) == \
+        f"sqlite://{tmp_path / 'ratelimit.sqlite3'}"
+    assert resolve_storage_uri('sqlite:///var/lib/meet/rl.sqlite3', str(tmp_path)) == 'sqlite:///var/lib/meet/rl.sqlite3'
+    assert resolve_storage_uri('memory://', str(tmp_path)) == 'memory://'
@@ -0,0 +1,59 @@
+"""Blocage automatique : empreintes et adresses IP"""
+
+import pytest
+from flask import Flask
+
+from security_blocking import init_auto_block
+from security_logging import IntrusionAggregator, security_logger
+
+
+@pytest.fixture
+def client_app(tmp_path, monkeypatch):
+    """Application avec une route qui signale un accès non autorisé à chaque appel"""
+    monkeypatch.delenv('TRUSTED_PROXIES', raising=False)
+    monkeypatch.setattr(security_logger, 'log_file', str(tmp_path / 'security.log'))
+    monkeypatch.setattr(security_logger, 'intrusions', IntrusionAggregator())
+
+    def make(**config):
+        app = Flask(__name__)
+        app.config.update(TESTING=True, AUTO_BLOCK_THRESHOLD=3, AUTO_BLOCK_IP_THRESHOLD=5, **config)
+        init_auto_block(app)
+
+        @app.route('/admin/secret')
+        def secret():
+            security_logger.log_unauthorized_access_attempt('/admin/secret')
+            return 'non', 403
+
+        return app
+
+    yield make
+    security_logger.stop()
+
+
+def _hit(client, agent, times=1):
+    return [client.get('/admin/secret', headers={'User-Agent': agent}).status_code for _ in range(times)]
+
+
+def test_fingerprint_blocked_without_ip_block(client_app, caplog):
+    app = client_app()
+    assert 'blocage automatique par IP désactivé' in caplog.text
+    client = app.test_client()
+
+    # Seuil de l'empreinte atteint : ce navigateur est bloqué
+    assert _hit(client, 'attaquant', 4) == [403, 403, 403, 429]
+    # Même adresse (celle du proxy) mais autre navigateur : jamais bloqué par IP
+    assert _hit(client, 'victime-1', 2) + _hit(client, 'victime-2', 2) + _hit(client, 'victime-3', 2) == [403] * 6
+    blocker = app.extensions['auto_block']
+    assert [key[0] for key, _ in blocker.blocked.items()] == ['fingerprint']
+
+
+def test_ip_blocked_when_proxies_configured(client_app):
+    app = client_app(TRUSTED_PROXIES=0)
+    client = app.test_client()
+
+    _hit(client, 'a', 2)
+    _hit(client, 'b', 2)
+    _hit(client, 'c', 1)
+    # Cinq événements pour la même adresse : tous les navigateurs de cette adresse sont bloqués
+    assert _hit(client, 'd') == [429]
+    assert ('ip', '127.0.0.1') in app.extensions['auto_block'].blocked
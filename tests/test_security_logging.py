@@ -0,0 +1,29 @@
+"""Journal de sécurité : file non bloquante"""
+
+import logging
+import queue
+import threading
+
+from security_logging import NonBlockingQueueHandler
+
+
+def test_dropped_events_are_all_counted_under_contention():
+    log_queue = queue.Queue(maxsize=50)
+    handler = NonBlockingQueueHandler(log_queue)
+    threads, per_thread = 8, 500
+
+    def emit():
+        for _ in range(per_thread):
+            handler.enqueue(logging.makeLogRecord({'msg': 'x'}))
+
+    workers = [threading.Thread(target=emit) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    queued = [log_queue.get_nowait() for _ in range(log_queue.qsize())]
+    # Chaque événement est soit en file, soit compté comme abandonné (sur un enregistrement ou en attente)
+    reported = sum(getattr(record, 'dropped', 0) for record in queued)
+    assert len(queued) + reported + handler.take_dropped() == threads * per_thread
+    assert handler.take_dropped() == 0
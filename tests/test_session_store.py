@@ -0,0 +1,124 @@
+"""Sessions côté serveur : sérialisation, régénération à la connexion, expiration, écritures évitées"""
+
+import time
+
+import msgspec
+import pytest
+from flask import Flask, jsonify, session
+from flask_login import LoginManager, UserMixin, login_user
+
+from session_store import cleanup_sessions, init_session_store
+
+
+class FakeUser(UserMixin):
+    id = 1
+
+
+@pytest.fixture(params=['filesystem', 'sqlite'])
+def session_app(request, tmp_path):
+    app = Flask(__name__)
+    app.config.update(
+        TESTING=True,
+        SECRET_KEY='test',
+        SESSION_BACKEND=request.param,
+        SESSION_FILE_DIR=str(tmp_path / 'sessions'),
+        SESSION_SQLITE_PATH=str(tmp_path / 'sessions.sqlite3'),
+    )
+    init_session_store(app)
+    login_manager = LoginManager(app)
+    login_manager.user_loader(lambda user_id: FakeUser())
+
+    @app.route('/set', methods=['POST'])
+    def set_value():
+        session['data'] = {'panier': [1, 2, 3], 'nom': 'Zoé', 'actif': True, 'score': 1.5, 'vide': None}
+        return 'ok'
+
+    @app.route('/get')
+    def get_value():
+        return jsonify(session.get('data'))
+
+    @app.route('/noop')
+    def noop():
+        return 'ok'
+
+    @app.route('/login', methods=['POST'])
+    def login():
+        login_user(FakeUser())
+        return 'ok'
+
+    store = app.session_interface.store
+    saves = []
+    original_save = store.save
+
+    def save(sid, payload, expires_at):
+        saves.append(sid)
+        original_save(sid, payload, expires_at)
+    store.save = save
+    app.saves = saves
+    return app
+
+
+def _sid(client, app):
+    cookie = client.get_cookie(app.config['SESSION_COOKIE_NAME'])
+    return cookie.value if cookie else None
+
+
+def test_msgpack_round_trip(session_app):
+    client = session_app.test_client()
+    client.post('/set')
+    expected = {'panier': [1, 2, 3], 'nom': 'Zoé', 'actif': True, 'score': 1.5, 'vide': None}
+    assert client.get('/get').get_json() == expected
+
+    payload, expires_at = session_app.session_interface.store.load(_sid(client, session_app))
+    assert msgspec.msgpack.decode(payload) == {'data': expected}
+    assert expires_at > time.time()
+
+
+def test_session_id_regenerated_on_login(session_app):
+    client = session_app.test_client()
+    client.post('/set')
+    before = _sid(client, session_app)
+
+    client.post('/login')
+    after = _sid(client, session_app)
+    assert after and after != before
+    store = session_app.session_interface.store
+    # L'ancien identifiant n'ouvre plus de session ; les données suivent le nouveau
+    assert store.load(before) is None
+    assert client.get('/get').get_json()['nom'] == 'Zoé'
+
+
+def test_expired_sessions_are_ignored_and_cleaned(session_app):
+    store = session_app.session_interface.store
+    live, expired = 'a' * 43, 'b' * 43
+    store.save(live, msgspec.msgpack.encode({'k': 1}), time.time() + 3600)
+    store.save(expired, msgspec.msgpack.encode({'k': 2}), time.time() - 1)
+
+    assert cleanup_sessions(session_app) == 1
+    assert cleanup_sessions(session_app) == 0
+    assert store.load(live) is not None
+
+    store.save(expired, msgspec.msgpack.encode({'k': 2}), time.time() - 1)
+    assert store.load(expired) is None
+
+    client = session_app.test_client()
+    client.set_cookie(session_app.config['SESSION_COOKIE_NAME'], expired)
+    assert client.get('/get').get_json() is None
+
+
+def test_unchanged_sessions_are_not_rewritten(session_app):
+    client = session_app.test_client()
+    client.post('/set')
+    assert len(session_app.saves) == 1
+
+    # Ni lecture sans modification, ni requête qui n'utilise pas la session : aucune écriture
+    client.get('/get')
+    client.get('/noop')
+    client.get('/noop')
+    assert len(session_app.saves) == 1
+
+    # Sans cookie, une requête qui n'écrit rien ne crée pas de session
+    other = session_app.test_client()
+    other.get('/get')
+    assert len(session_app.saves) == 1
+    assert _sid(other, session_app) is None
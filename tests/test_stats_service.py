@@ -0,0 +1,70 @@
+"""Agrégats d'activité et compteurs par utilisateur"""
+
+from datetime import timedelta
+
+from model.admin_service import AdminService
+from model.database import db
+from model.extensions import get_timezone_aware_datetime
+from model.models import DailyActivity, Like, Message, UserStats
+from model.query_stats import assert_max_queries
+from model.services import MessageService
+from model.stats_service import ActivityRollupService, StatsService, UserStatsService
+
+
+def test_daily_counts_do_not_backfill_on_read(app, make_user):
+    today = get_timezone_aware_datetime().date()
+    make_user()
+    make_user(created_at=get_timezone_aware_datetime() - timedelta(days=3))
+    # Agrégats en retard : seul un jour ancien a été agrégé
+    db.session.add(DailyActivity(day=today - timedelta(days=10), metric='users', count=4))
+    db.session.commit()
+
+    # Lecture de la table et jour courant en direct, sans rattrapage de l'agrégation
+    with assert_max_queries(6):
+        daily = ActivityRollupService.get_daily_counts(days=30)
+
+    assert daily['users'] == {(today - timedelta(days=10)).isoformat(): 4, today.isoformat(): 1}
+    assert DailyActivity.query.count() == 1
+
+    # Le rattrapage est fait par la tâche planifiée
+    ActivityRollupService.rollup()
+    daily = ActivityRollupService.get_daily_counts(days=30)
+    assert daily['users'][(today - timedelta(days=3)).isoformat()] == 1
+
+
+def _user_stats(user_id):
+    db.session.expire_all()
+    stats = db.session.get(UserStats, user_id)
+    return stats.messages_sent_count, stats.likes_received_count
+
+
+def test_expiry_updates_per_user_counters(app, make_user):
+    now = get_timezone_aware_datetime()
+    alice, bob = make_user(), make_user()
+    for sender, receiver, expires_at in ((alice, bob, now - timedelta(hours=1)),
+                                         (alice, bob, now - timedelta(hours=2)),
+                                         (alice, bob, now + timedelta(hours=1)),
+                                         (bob, alice, now - timedelta(hours=1))):
+        db.session.add(Message(sender_id=sender.id, receiver_id=receiver.id, content='salut', expires_at=expires_at))
+    db.session.add(Like(liker_id=alice.id, liked_id=bob.id, created_at=now - timedelta(days=40)))
+    db.session.add(Like(liker_id=bob.id, liked_id=alice.id))
+    db.session.commit()
+    StatsService.reconcile()
+    UserStatsService.refresh()
+    assert _user_stats(alice.id) == (3, 1)
+    assert _user_stats(bob.id) == (1, 1)
+
+    # Expiration planifiée : compteurs par utilisateur ajustés dans la même transaction
+    assert MessageService.cleanup_expired_messages() == 3
+    assert _user_stats(alice.id) == (1, 1)
+    assert _user_stats(bob.id) == (0, 1)
+
+    # Nettoyage de l'administration : messages expirés et likes de plus de 30 jours
+    db.session.add(Message(sender_id=bob.id, receiver_id=alice.id, content='re', expires_at=now - timedelta(hours=1)))
+    db.session.commit()
+    UserStatsService.increment(bob.id, UserStats.messages_sent_count)
+    db.session.commit()
+    result = AdminService.cleanup_expired_data()
+    assert (result['expired_messages'], result['old_likes']) == (1, 1)
+    assert _user_stats(alice.id) == (1, 1)
+    assert _user_stats(bob.id) == (0, 0)